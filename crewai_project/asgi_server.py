@@ -0,0 +1,240 @@
+"""
+ASGI server exposing the Daily Student Priority Advisor API on an asyncio event loop
+
+Serves the same /health, /metrics, /run, /test, /priority and /deadlines contract as server.py (and
+shares its configuration, crew pool and caches). Uploads are read into memory
+and requests wait for a free model slot on the event loop. CrewAI crews and
+their LLM calls are synchronous, so each request holding a slot runs its crew
+on one of the worker threads (one per slot of MODEL_CONCURRENCY); a single
+process can keep hundreds of requests waiting, but no more crews than that
+run at once. Run with:
+
+    uvicorn asgi_server:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import contextvars
+import datetime
+import functools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import server
+from server import RequestError, allowed_file, run_advisor
+from daily_student_priority_advisor.defaults import build_inputs
+from daily_student_priority_advisor.cassette import llm_cassette
+from daily_student_priority_advisor.concurrency import ModelLimiter, ModelSlotTimeout, parse_limits
+from daily_student_priority_advisor.crew_pool import CrewPoolExhausted
+from daily_student_priority_advisor.resilience import UpstreamUnavailable
+from daily_student_priority_advisor.snapshots import today
+from daily_student_priority_advisor.instrumentation import trace_request
+from daily_student_priority_advisor.metrics import metrics
+
+MAX_CONTENT_LENGTH = server.app.config['MAX_CONTENT_LENGTH']
+
+
+class InMemoryMultiPartParser(MultiPartParser):
+    """Keep uploaded files in memory instead of spooling them to temporary files"""
+
+    # Uploads are bounded by MAX_CONTENT_LENGTH
+    spool_max_size = MAX_CONTENT_LENGTH
+
+# Requests allowed to use each upstream model at once: a number for every
+# model, or "model=N" pairs (e.g. "gemini/gemini-2.5-flash=8")
+MODEL_CONCURRENCY = os.getenv('MODEL_CONCURRENCY', '')
+model_limiter = ModelLimiter(*parse_limits(MODEL_CONCURRENCY, default=server.CREW_POOL_SIZE))
+# Requests hold a slot of the PDF reader's model, the one doing most of the work
+MODEL = server.crew_pool.model
+
+# Crews run synchronously; one thread per model slot keeps them off the event loop
+executor = ThreadPoolExecutor(max_workers=model_limiter.total([MODEL]), thread_name_prefix='advisor-asgi')
+# Snapshot and planning store reads take milliseconds; their own threads keep
+# them from queueing behind crews that hold every worker thread
+STORE_READ_THREADS = 4
+store_executor = ThreadPoolExecutor(max_workers=STORE_READ_THREADS, thread_name_prefix='advisor-store')
+
+
+async def run_in_worker(func, *args, pool=None):
+    """Run a blocking call on the worker threads (or ``pool``), keeping the caller's context"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(pool or executor, functools.partial(context.run, func, *args))
+
+
+def error_response(message, status):
+    return JSONResponse({"success": False, "error": message}, status_code=status)
+
+
+async def parse_run_request(request):
+    """Async counterpart of server.parse_run_request: returns (pdf_bytes, other_data)"""
+    content_length = request.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > MAX_CONTENT_LENGTH:
+        raise RequestError("File too large", 413)
+
+    if not request.headers.get('content-type', '').startswith('multipart/form-data'):
+        raise RequestError("No PDF file provided")
+    try:
+        form = await InMemoryMultiPartParser(request.headers, request.stream()).parse()
+    except MultiPartException as e:
+        raise RequestError(f"Invalid upload: {e}")
+    file = form.get('file')
+    # Check if request has the required parts
+    if not isinstance(file, UploadFile):
+        raise RequestError("No PDF file provided")
+
+    # Check if file is selected
+    if not file.filename:
+        raise RequestError("No file selected")
+
+    # Validate file type
+    if not allowed_file(file.filename):
+        raise RequestError("Invalid file type. Only PDF files are allowed")
+
+    try:
+        other_data = json.loads(form.get('other_data') or '{}')
+    except json.JSONDecodeError:
+        raise RequestError("Invalid JSON in other_data field")
+
+    pdf_bytes = await file.read()
+    await form.close()
+    return pdf_bytes, other_data
+
+
+async def health_check(request):
+    """Health check endpoint"""
+    return JSONResponse({
+        "status": "healthy",
+        "message": "Daily Student Priority Advisor API is running",
+        "warm": server.crew_pool.warm,
+        "models": server.crew_pool.models,
+        "llm_cassette": llm_cassette.mode,
+    })
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics endpoint"""
+    return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def run_crew(request):
+    """Run the Daily Student Priority Advisor Crew with provided inputs"""
+    try:
+        pdf_bytes, other_data = await parse_run_request(request)
+        async with model_limiter.slot(MODEL, timeout=server.CREW_POOL_TIMEOUT):
+            response = await run_in_worker(run_advisor, pdf_bytes, other_data)
+        return JSONResponse(response)
+
+    except RequestError as e:
+        return error_response(str(e), e.status)
+    except (ModelSlotTimeout, CrewPoolExhausted) as e:
+        return error_response(f"Server busy: {str(e)}", 503)
+    except UpstreamUnavailable as e:
+        return error_response(f"Model unavailable: {str(e)}", 503)
+    except Exception as e:
+        return error_response(f"Server error: {str(e)}", 500)
+
+
+def run_test_crew():
+    # Sample inputs for testing
+    inputs = build_inputs(
+        student_name='Ahmed',
+        current_date='2024-12-20',
+        pdf_content='Sample PDF content for testing purposes'
+    )
+    with trace_request('test') as trace:
+        result = server.crew_pool.kickoff(inputs)
+        return {
+            "success": True,
+            "result": server.result_text(result),
+            "inputs_used": server.inputs_used(inputs),
+            "timings": trace.summary()
+        }
+
+
+async def test_crew(request):
+    """Test endpoint with sample data"""
+    try:
+        async with model_limiter.slot(MODEL, timeout=server.CREW_POOL_TIMEOUT):
+            response = await run_in_worker(run_test_crew)
+        return JSONResponse(response)
+
+    except (ModelSlotTimeout, CrewPoolExhausted) as e:
+        return error_response(f"Server busy: {str(e)}", 503)
+    except UpstreamUnavailable as e:
+        return error_response(f"Model unavailable: {str(e)}", 503)
+    except Exception as e:
+        return error_response(f"Server error: {str(e)}", 500)
+
+
+async def get_priority(request):
+    """Today's priority for a student, as in server.get_priority"""
+    student = request.path_params['student']
+    date = request.query_params.get('date') or today()
+    try:
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        return error_response("Invalid date, expected YYYY-MM-DD", 400)
+
+    try:
+        # A snapshot hit is one cache read; only a miss takes a model slot
+        snapshot = await run_in_worker(server.priority_snapshots.get, student, date, pool=store_executor)
+        if snapshot is not None:
+            metrics.inc('priority_snapshot_requests_total', result='hit')
+            return JSONResponse(dict(snapshot, snapshot=True))
+        async with model_limiter.slot(MODEL, timeout=server.CREW_POOL_TIMEOUT):
+            response = await run_in_worker(server.priority_for, student, date)
+    except (ModelSlotTimeout, CrewPoolExhausted) as e:
+        return error_response(f"Server busy: {str(e)}", 503)
+    except UpstreamUnavailable as e:
+        return error_response(f"Model unavailable: {str(e)}", 503)
+    except Exception as e:
+        return error_response(f"Server error: {str(e)}", 500)
+    if response is None:
+        return error_response("Unknown student; send a PDF to /run first", 404)
+    return JSONResponse(response)
+
+
+async def get_deadlines(request):
+    """A student's upcoming deadlines from the planning store, as in server.get_deadlines"""
+    try:
+        response = await run_in_worker(server.deadlines_for, request.path_params['student'], request.query_params,
+                                       pool=store_executor)
+    except RequestError as e:
+        return error_response(str(e), e.status)
+    except Exception as e:
+        return error_response(f"Server error: {str(e)}", 500)
+    if response is None:
+        return error_response("Unknown student; send a PDF to /run first", 404)
+    return JSONResponse(response)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    server.start_scheduler()
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+    store_executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route('/health', health_check, methods=['GET']),
+        Route('/metrics', metrics_endpoint, methods=['GET']),
+        Route('/run', run_crew, methods=['POST']),
+        Route('/test', test_crew, methods=['POST']),
+        Route('/priority/{student}', get_priority, methods=['GET']),
+        Route('/deadlines/{student}', get_deadlines, methods=['GET']),
+    ],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,100 @@
+"""
+Configurable local stand-in for the Gemini LLM, used by the benchmarks
+"""
+import json
+import math
+import random
+import threading
+import time
+
+from daily_student_priority_advisor.crew import ADVICE_TASK, DECISION_TASK, EXTRACTION_TASK
+from daily_student_priority_advisor.llm import CHARS_PER_TOKEN, InstrumentedLLM
+from mock_server import mock_pdf_analysis, mock_priority_analysis, mock_student_recommendation
+
+
+class FakeLLMError(Exception):
+    """Simulated provider failure"""
+    # A transient upstream error, which the resilience layer retries
+    status_code = 503
+
+
+def canned_answer(task_name):
+    """The mock_server output for a crew task, as the agent's final answer"""
+    planning_data = mock_pdf_analysis(None)
+    priority_analysis = mock_priority_analysis(planning_data, 'Student')
+    if task_name == EXTRACTION_TASK:
+        answer = planning_data
+    elif task_name == DECISION_TASK:
+        answer = priority_analysis
+    elif task_name == ADVICE_TASK:
+        answer = mock_student_recommendation(priority_analysis, planning_data)
+    else:
+        answer = {"result": "ok"}
+    return json.dumps(answer)
+
+
+class FakeLLM(InstrumentedLLM):
+    """
+    LLM that answers every task with the canned mock_server data after a
+    simulated delay, without any network access.
+
+    Latency is log-normally distributed around ``latency`` seconds (the
+    median) with shape ``latency_sigma``; a ``failure_rate`` fraction of
+    calls raise FakeLLMError after the delay. Prompt tokens are estimated
+    from the messages unless ``prompt_tokens`` is given; ``completion_tokens``
+    pads the answer to roughly that many tokens. Usage is reported through
+    CrewAI's token counter like a real provider response.
+    """
+
+    def __init__(self, latency=0.5, latency_sigma=0.3, failure_rate=0.0,
+                 prompt_tokens=None, completion_tokens=None, seed=None, model='fake/advisor'):
+        super().__init__(model=model, temperature=0)
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def profile(self):
+        """Settings recorded alongside benchmark results"""
+        return {
+            "latency": self.latency,
+            "latency_sigma": self.latency_sigma,
+            "failure_rate": self.failure_rate,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+
+    def _sample(self):
+        with self._lock:
+            if self.latency > 0:
+                delay = self.latency * math.exp(self._random.gauss(0, self.latency_sigma))
+            else:
+                delay = 0.0
+            failed = self._random.random() < self.failure_rate
+        return delay, failed
+
+    def _complete(self, messages, tools, callbacks, available_functions, **kwargs):
+        delay, failed = self._sample()
+        time.sleep(delay)
+        if failed:
+            raise FakeLLMError("Simulated LLM failure")
+
+        answer = canned_answer(getattr(kwargs.get('from_task'), 'name', None))
+        if self.completion_tokens:
+            answer += ' ' * max(0, self.completion_tokens * CHARS_PER_TOKEN - len(answer))
+        if isinstance(messages, list):
+            prompt_chars = sum(len(str(message.get('content', ''))) for message in messages if isinstance(message, dict))
+        else:
+            prompt_chars = len(str(messages))
+
+        for callback in callbacks or []:
+            process = getattr(callback, 'token_cost_process', None)
+            if process is not None:
+                process.sum_prompt_tokens(self.prompt_tokens or prompt_chars // CHARS_PER_TOKEN)
+                process.sum_completion_tokens(len(answer) // CHARS_PER_TOKEN)
+                process.sum_successful_requests(1)
+                break
+        return f"Thought: I now know the final answer\nFinal Answer: {answer}"
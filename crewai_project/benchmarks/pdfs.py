@@ -0,0 +1,71 @@
+"""
+Synthetic syllabus PDFs of a given page count for the benchmarks
+"""
+import datetime
+
+MODULES = [
+    ('CS-301', 'Data Structures'),
+    ('CS-310', 'Operating Systems'),
+    ('MA-201', 'Linear Algebra'),
+    ('CS-320', 'Databases'),
+    ('EN-105', 'Technical Writing'),
+]
+
+LINES_PER_PAGE = 40
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages):
+    """Minimal PDF with one Helvetica text page per list of lines"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [{}] /Count {} >>".format(
+            ' '.join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        body = "BT /F1 10 Tf 50 760 Td 18 TL " + ' '.join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(body)} >>\nstream\n{body}\nendstream")
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{obj}\nendobj\n".encode('latin-1')
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b''.join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+def syllabus_pdf(page_count, variant=0, start=datetime.date(2024, 12, 16)):
+    """
+    A syllabus of ``page_count`` pages listing classes, exams and assignments.
+    Different ``variant`` values produce different documents of the same size,
+    so repeated runs do not hit the extraction cache.
+    """
+    pages = []
+    for page in range(page_count):
+        lines = [f"Semester planning - document {variant} - page {page + 1}"]
+        for row in range(LINES_PER_PAGE - 1):
+            index = page * LINES_PER_PAGE + row
+            code, name = MODULES[index % len(MODULES)]
+            day = start + datetime.timedelta(days=index % 30)
+            kind = index % 3
+            if kind == 0:
+                lines.append(f"{code} {name} lecture, Mon/Wed 10:00 AM, Room {300 + index % 20}")
+            elif kind == 1:
+                lines.append(f"{code} {name} assignment {index}: due {day.isoformat()}, weight {5 + index % 20}%")
+            else:
+                lines.append(f"{code} {name} exam part {index}: {day.isoformat()} 9:00 AM, weight {10 + index % 30}%")
+        pages.append(lines)
+    return build_pdf(pages)
@@ -0,0 +1,330 @@
+"""
+Load test of the advisor API with a local stand-in for the LLM
+
+Drives the real server.py pipeline (Flask app, crew pool, caches, PDF text
+extraction, crews) through the /run endpoint, with every LLM call answered by
+FakeLLM (or, with ``--cassette``, replayed from a recorded LLM cassette by
+the real model clients; see cassette.py). For each combination of PDF size and concurrency level it measures
+throughput, latency percentiles, LLM calls/tokens and process memory, and
+writes the results to a JSON file that later runs can be compared against.
+
+Usage (from the crewai_project directory):
+
+    python benchmarks/run_benchmark.py --concurrency 1,4,8 --pages 1,5,20
+    python benchmarks/run_benchmark.py --compare benchmarks/results/baseline.json
+    python benchmarks/run_benchmark.py --cassette .cache/llm_cassette.jsonl --cassette-mode auto  # record once
+    python benchmarks/run_benchmark.py --cassette .cache/llm_cassette.jsonl  # replay offline
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def parse_list(value):
+    return [int(item) for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the advisor API with a fake LLM")
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4, 8],
+                        help="Comma-separated concurrent client counts (default 1,4,8)")
+    parser.add_argument('--pages', type=parse_list, default=[1, 5, 20],
+                        help="Comma-separated PDF sizes in pages (default 1,5,20)")
+    parser.add_argument('--requests', type=int, default=20, help="Requests per scenario (default 20)")
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help="Crew pool size (default: the largest concurrency level)")
+    parser.add_argument('--priority-mode', choices=('llm', 'local'), default=None,
+                        help="priority_mode sent with each request (default: server setting)")
+    parser.add_argument('--reuse-pdfs', action='store_true',
+                        help="Send the same PDF for every request of a scenario, so the extraction cache is hit")
+    parser.add_argument('--latency', type=float, default=0.5, help="Median fake LLM latency in seconds (default 0.5)")
+    parser.add_argument('--latency-sigma', type=float, default=0.3,
+                        help="Log-normal shape of the fake LLM latency (default 0.3)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of fake LLM calls that fail")
+    parser.add_argument('--prompt-tokens', type=int, default=None,
+                        help="Prompt tokens reported per call (default: estimated from the prompt)")
+    parser.add_argument('--completion-tokens', type=int, default=None,
+                        help="Completion tokens per call (default: size of the canned answer)")
+    parser.add_argument('--seed', type=int, default=1234, help="Seed for the fake LLM")
+    parser.add_argument('--cassette', default=None,
+                        help="Use the configured models through this LLM cassette instead of the fake LLM")
+    parser.add_argument('--cassette-mode', choices=('replay', 'auto', 'record'), default='replay',
+                        help="replay only (offline), replay and record misses, or record everything (default replay)")
+    parser.add_argument('--cassette-latency', default='',
+                        help="Replay delay per call: seconds, or 'recorded' (default none, full local speed)")
+    parser.add_argument('--output', default=None,
+                        help="Results file (default benchmarks/results/benchmark-<timestamp>.json)")
+    parser.add_argument('--compare', default=None, help="Earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help="Relative change reported as a regression when comparing (default 0.10)")
+    parser.add_argument('--verbose', action='store_true', help="Keep the crews' console output")
+    return parser.parse_args(argv)
+
+
+def rss_bytes():
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # Not Linux: fall back to the peak, which is the best portable figure
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemorySampler(threading.Thread):
+    """Tracks the peak RSS of the process while a scenario runs"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(name='benchmark-memory', daemon=True)
+        self.interval = interval
+        self.start_rss = rss_bytes()
+        self.peak_rss = self.start_rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, rss_bytes())
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.peak_rss = max(self.peak_rss, rss_bytes())
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "mean": round(float(np.mean(values)), 4),
+        "max": round(float(np.max(values)), 4),
+    }
+
+
+def run_scenario(app, pages, concurrency, request_count, args, variant_offset):
+    """Send ``request_count`` /run requests from ``concurrency`` clients"""
+    from pdfs import syllabus_pdf
+
+    if args.reuse_pdfs:
+        shared = syllabus_pdf(pages, variant=variant_offset)
+        documents = [shared] * request_count
+    else:
+        documents = [syllabus_pdf(pages, variant=variant_offset + i) for i in range(request_count)]
+    other_data = {'student_name': 'Benchmark', 'current_date': '2024-12-20', 'new_task_description': 'Lab report'}
+    if args.priority_mode:
+        other_data['priority_mode'] = args.priority_mode
+
+    def send(numbered):
+        index, pdf_bytes = numbered
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/run', data={
+            'file': (io.BytesIO(pdf_bytes), 'syllabus.pdf'),
+            # A student per request, so identical uploads are not coalesced into one run
+            'other_data': json.dumps(dict(other_data, student_id=f'benchmark-{index}')),
+        }, content_type='multipart/form-data')
+        elapsed = time.perf_counter() - started
+        payload = response.get_json(silent=True) or {}
+        return elapsed, response.status_code, payload
+
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, enumerate(documents)))
+    duration = time.perf_counter() - started
+    sampler.stop()
+
+    latencies = [elapsed for elapsed, status, _ in results if status == 200]
+    llm = {'llm_calls': 0, 'retries': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'cached_prompt_tokens': 0,
+           'prompt_tokens_saved': 0}
+    stages = {}
+    errors = {}
+    for _, status, payload in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+            continue
+        timings = payload.get('timings') or {}
+        for key in llm:
+            llm[key] += (timings.get('llm') or {}).get(key, 0)
+        for stage, seconds in (timings.get('stages') or {}).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    succeeded = len(latencies)
+    return {
+        "pages": pages,
+        "pdf_bytes": len(documents[0]),
+        "concurrency": concurrency,
+        "requests": request_count,
+        "succeeded": succeeded,
+        "errors": errors,
+        "duration": round(duration, 4),
+        "throughput": round(succeeded / duration, 4) if duration > 0 else None,
+        "latency": percentiles(latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "llm_per_request": {key: round(value / succeeded, 2) if succeeded else None for key, value in llm.items()},
+        "memory": {
+            "rss_start_mb": round(sampler.start_rss / 2 ** 20, 2),
+            "rss_peak_mb": round(sampler.peak_rss / 2 ** 20, 2),
+            # Growth over the scenario shared out between the requests in flight
+            "per_request_kb": round((sampler.peak_rss - sampler.start_rss) / 1024 / concurrency, 1),
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Print per-scenario changes against a baseline; return the number of regressions"""
+    previous = {(s['pages'], s['concurrency']): s for s in baseline.get('scenarios', [])}
+    regressions = 0
+    print(f"\nCompared with {baseline.get('meta', {}).get('git_revision') or 'baseline'}:")
+    for scenario in results['scenarios']:
+        old = previous.get((scenario['pages'], scenario['concurrency']))
+        if old is None:
+            continue
+        checks = [
+            ('throughput', scenario['throughput'], old['throughput'], True),
+            ('p95', scenario['latency']['p95'], old['latency']['p95'], False),
+            ('p99', scenario['latency']['p99'], old['latency']['p99'], False),
+            ('rss_peak_mb', scenario['memory']['rss_peak_mb'], old['memory']['rss_peak_mb'], False),
+        ]
+        changes = []
+        for name, new_value, old_value, higher_is_better in checks:
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            flag = ' REGRESSION' if worse > threshold else ''
+            regressions += bool(flag)
+            changes.append(f"{name} {change:+.1%}{flag}")
+        print(f"  pages={scenario['pages']:<3} concurrency={scenario['concurrency']:<3} " + ', '.join(changes))
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pool_size = args.pool_size or max(args.concurrency)
+
+    # The server reads its settings at import; keep the benchmark off the disk caches
+    os.environ['CREW_POOL_SIZE'] = str(pool_size)
+    os.environ.setdefault('EXTRACTION_CACHE_PATH', '')
+    os.environ.setdefault('RECOMMENDATION_CACHE_PATH', '')
+    os.environ.setdefault('PLANNING_SESSION_PATH', '')
+    os.environ.setdefault('PRIORITY_SNAPSHOT_PATH', '')
+    os.environ.setdefault('PLANNING_STORE_PATH', '')
+    os.environ.setdefault('JOB_STORE_PATH', '')
+    os.environ.setdefault('CREWAI_TRACING_ENABLED', 'false')
+    # Telemetry export threads would add network noise to the measurements
+    os.environ.setdefault('CREWAI_DISABLE_TELEMETRY', 'true')
+    os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    with quiet:
+        import server
+        from daily_student_priority_advisor.cassette import llm_cassette
+        from daily_student_priority_advisor.crew_pool import CrewPool
+        from fake_llm import FakeLLM
+
+        if args.cassette:
+            # The server's own model clients, answered from the cassette
+            llm = None
+            llm_cassette.configure(mode=args.cassette_mode, path=args.cassette, latency=args.cassette_latency)
+        else:
+            llm = FakeLLM(
+                latency=args.latency,
+                latency_sigma=args.latency_sigma,
+                failure_rate=args.failure_rate,
+                prompt_tokens=args.prompt_tokens,
+                completion_tokens=args.completion_tokens,
+                seed=args.seed,
+            )
+        # Same pool settings as the server, answered by the fake LLM or the cassette
+        server.crew_pool = server.pipeline.crew_pool = CrewPool(
+            size=pool_size, llm=llm, timeout=server.CREW_POOL_TIMEOUT
+        )
+        # Build the crews now so the first scenario does not pay for it
+        server.crew_pool.warmup()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pool_size": pool_size,
+            "requests_per_scenario": args.requests,
+            "priority_mode": args.priority_mode or server.PRIORITY_MODE,
+            "extraction_mode": server.EXTRACTION_MODE,
+            "reuse_pdfs": args.reuse_pdfs,
+            "fake_llm": llm.profile() if llm is not None else None,
+            "cassette": {"path": args.cassette, "mode": args.cassette_mode,
+                         "latency": args.cassette_latency} if args.cassette else None,
+            "models": server.crew_pool.models,
+        },
+        "scenarios": [],
+    }
+
+    variant = 0
+    for pages in args.pages:
+        for concurrency in args.concurrency:
+            with quiet:
+                scenario = run_scenario(server.app, pages, concurrency, args.requests, args, variant)
+            variant += args.requests
+            results['scenarios'].append(scenario)
+            latency = scenario['latency']
+            print(
+                f"pages={pages:<3} concurrency={concurrency:<3} "
+                f"throughput={scenario['throughput']} req/s "
+                f"p50={latency['p50']}s p95={latency['p95']}s p99={latency['p99']}s "
+                f"rss_peak={scenario['memory']['rss_peak_mb']}MB errors={sum(scenario['errors'].values())}"
+            )
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
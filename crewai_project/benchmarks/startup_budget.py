@@ -0,0 +1,152 @@
+"""
+Import-time and memory budget for the server and CLI fast-start paths
+
+Starts fresh interpreters that import server.py and answer GET /health, and
+that run ``main.py --help``, and checks that neither loads the CrewAI /
+LangChain / Google stack or pypdf and that both stay within the time and RSS
+budgets.
+With ``--warmup`` it also reports the cost of a warmed-up server import for
+comparison (not checked against the budget).
+
+Usage (from the crewai_project directory):
+
+    python benchmarks/startup_budget.py
+    python benchmarks/startup_budget.py --max-import-seconds 0.8 --max-rss-mb 100 --warmup
+
+Exits with status 1 when a budget is exceeded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Top-level packages that must only be imported once a crew actually runs
+HEAVY_MODULES = ('crewai', 'crewai_tools', 'langchain', 'langchain_core', 'litellm', 'google.generativeai', 'pypdf')
+
+# Runs in the child: import the server, answer a health check, report the cost
+HEALTH_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter() - started
+response = server.app.test_client().get('/health')
+heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    "import_seconds": imported,
+    "health_seconds": time.perf_counter() - started,
+    "health_status": response.status_code,
+    "rss_peak_mb": (peak if sys.platform == 'darwin' else peak * 1024) / 2 ** 20,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Check the startup budget of the server and CLI")
+    parser.add_argument('--max-import-seconds', type=float, default=1.0,
+                        help="Budget for importing server.py and answering /health (default 1.0)")
+    parser.add_argument('--max-rss-mb', type=float, default=120.0,
+                        help="Budget for the peak RSS of that process in MB (default 120)")
+    parser.add_argument('--max-help-seconds', type=float, default=0.5,
+                        help="Budget for main.py --help (default 0.5)")
+    parser.add_argument('--runs', type=int, default=3, help="Runs per measurement; the fastest counts (default 3)")
+    parser.add_argument('--warmup', action='store_true', help="Also report a warmed-up server import")
+    return parser.parse_args(argv)
+
+
+def child_env(**extra):
+    env = dict(os.environ)
+    # Keep the probes off the disk caches and the network
+    env.update({
+        'EXTRACTION_CACHE_PATH': '',
+        'RECOMMENDATION_CACHE_PATH': '',
+        'PLANNING_SESSION_PATH': '',
+        'PRIORITY_SNAPSHOT_PATH': '',
+        'PLANNING_STORE_PATH': '',
+        'JOB_STORE_PATH': '',
+        'CREWAI_DISABLE_TELEMETRY': 'true',
+        'OTEL_SDK_DISABLED': 'true',
+        'WARMUP': '0',
+    })
+    env.update(extra)
+    return env
+
+
+def probe_health(env):
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\n" + HEALTH_PROBE
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_DIR, env=env,
+        check=True, capture_output=True, text=True,
+    ).stdout
+    # The probe's report is the last line; anything before it is app logging
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def probe_help(env):
+    code = (
+        "import json, sys, time\n"
+        "started = time.perf_counter()\n"
+        "sys.argv = ['main.py', '--help']\n"
+        "import main\n"
+        "try:\n"
+        "    main.run()\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+        "sys.stderr.write(json.dumps({'help_seconds': time.perf_counter() - started, 'heavy_modules': heavy}))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_DIR, env=env,
+        check=True, capture_output=True, text=True,
+    )
+    # The usage text goes to stdout, the measurement is the last line on stderr
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def fastest(probe, runs, key, env):
+    return min((probe(env) for _ in range(max(1, runs))), key=lambda result: result[key])
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    failures = []
+
+    health = fastest(probe_health, args.runs, 'health_seconds', child_env())
+    print(
+        f"server import + /health: {health['health_seconds']:.3f}s "
+        f"(import {health['import_seconds']:.3f}s) rss_peak={health['rss_peak_mb']:.1f}MB"
+    )
+    if health['health_status'] != 200:
+        failures.append(f"/health returned {health['health_status']}")
+    if health['heavy_modules']:
+        failures.append(f"server import loaded {', '.join(health['heavy_modules'])}")
+    if health['health_seconds'] > args.max_import_seconds:
+        failures.append(f"server import + /health took {health['health_seconds']:.3f}s > {args.max_import_seconds}s")
+    if health['rss_peak_mb'] > args.max_rss_mb:
+        failures.append(f"server RSS {health['rss_peak_mb']:.1f}MB > {args.max_rss_mb}MB")
+
+    cli = fastest(probe_help, args.runs, 'help_seconds', child_env())
+    print(f"main.py --help: {cli['help_seconds']:.3f}s")
+    if cli['heavy_modules']:
+        failures.append(f"main.py --help loaded {', '.join(cli['heavy_modules'])}")
+    if cli['help_seconds'] > args.max_help_seconds:
+        failures.append(f"main.py --help took {cli['help_seconds']:.3f}s > {args.max_help_seconds}s")
+
+    if args.warmup:
+        warm = probe_health(child_env(WARMUP='1'))
+        print(
+            f"warmed-up server import + /health: {warm['health_seconds']:.3f}s "
+            f"rss_peak={warm['rss_peak_mb']:.1f}MB"
+        )
+
+    for failure in failures:
+        print(f"BUDGET EXCEEDED: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Latency of the local study planner on semester-sized planning data
+
+Builds synthetic planning data for a semester (modules, weekly classes and
+commitments, exams and assignments spread over ``--weeks`` weeks) for
+``--students`` students and plans ``--days`` days for each, without any LLM.
+
+Usage (from the crewai_project directory):
+
+    python benchmarks/study_plan_benchmark.py
+    python benchmarks/study_plan_benchmark.py --students 500 --days 28 --max-p95-ms 20
+
+Exits with status 1 when the p95 planning time exceeds ``--max-p95-ms``.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdfs import MODULES  # noqa: E402
+from daily_student_priority_advisor.study_plan import build_study_plan  # noqa: E402
+
+START = datetime.date(2025, 2, 3)
+DAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+
+
+def semester_planning_data(seed, weeks=15, assignments_per_module=8, exams_per_module=2):
+    """Planning data shaped like the extraction output for one student's semester"""
+    rng = random.Random(seed)
+    classes, exams, assignments = [], [], []
+    for code, name in MODULES:
+        days = rng.sample(DAY_NAMES, 2)
+        hour = rng.choice([8, 10, 13, 15])
+        classes.append({
+            "name": f"{name} lecture",
+            "days": ', '.join(days),
+            "time": f"{hour}:00 - {hour + 1}:30",
+        })
+        classes.append({"name": f"{name} lab", "days": rng.choice(DAY_NAMES), "time": f"{hour + 2}:00"})
+        for i in range(exams_per_module):
+            exams.append({
+                "name": f"{name} {'midterm' if i == 0 else 'final'}",
+                "date": (START + datetime.timedelta(weeks=weeks * (i + 1) // exams_per_module - 1,
+                                                    days=rng.randint(0, 4))).isoformat(),
+                "module": code,
+                "weight": rng.choice([20, 30, 40]),
+            })
+        for i in range(assignments_per_module):
+            assignments.append({
+                "name": f"{name} assignment {i + 1}",
+                "deadline": (START + datetime.timedelta(days=rng.randint(1, weeks * 7))).isoformat(),
+                "module": code,
+                "weight": rng.choice([5, 10, 15]),
+            })
+    commitments = [
+        {"name": "Part-time job", "time": "Every Tuesday 6 PM - 10 PM", "recurrence": "weekly"},
+        {"name": "Football practice", "time": "Thursday 7 PM", "recurrence": "weekly"},
+        {"name": "Family dinner", "time": "Sunday 12:00 - 15:00", "recurrence": "weekly"},
+    ]
+    modules = [
+        {"code": code, "name": name, "importance": rng.choice(['high', 'medium', 'low']), "credits": rng.choice([3, 4, 6])}
+        for code, name in MODULES
+    ]
+    return {
+        "classes": classes,
+        "exams": exams,
+        "assignments": assignments,
+        "commitments": commitments,
+        "modules": modules,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the local study planner")
+    parser.add_argument('--students', type=int, default=200, help="Students to plan for (default 200)")
+    parser.add_argument('--days', type=int, default=7, help="Days per plan (default 7)")
+    parser.add_argument('--weeks', type=int, default=15, help="Semester length in weeks (default 15)")
+    parser.add_argument('--max-p95-ms', type=float, default=25.0,
+                        help="Budget for the p95 time of one plan in milliseconds (default 25)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    students = [semester_planning_data(seed, weeks=args.weeks) for seed in range(args.students)]
+    items = len(students[0]['exams']) + len(students[0]['assignments'])
+
+    # One untimed plan loads NumPy's lazily initialized parts
+    build_study_plan(students[0], start_date=START.isoformat(), days=args.days)
+
+    timings = []
+    planned = 0
+    for offset, planning_data in enumerate(students):
+        start_date = START + datetime.timedelta(days=offset % (args.weeks * 7))
+        started = time.perf_counter()
+        plan = build_study_plan(planning_data, start_date=start_date.isoformat(), days=args.days)
+        timings.append((time.perf_counter() - started) * 1000)
+        planned += sum(len(day['blocks']) for day in plan['days'])
+
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(
+        f"{args.students} students x {args.days} days ({items} exams/assignments each): "
+        f"p50={p50:.2f}ms p95={p95:.2f}ms max={timings[-1]:.2f}ms total={sum(timings):.0f}ms "
+        f"blocks={planned}"
+    )
+    if p95 > args.max_p95_ms:
+        print(f"BUDGET EXCEEDED: p95 {p95:.2f}ms > {args.max_p95_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""
+Cache building blocks: a bounded in-memory LRU tier and an SQLite disk tier
+"""
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from .metrics import metrics
+
+# Open SQLite connections, so forked worker processes can drop inherited ones
+_sqlite_connections = weakref.WeakSet()
+# Connections inherited from the parent process. They must not be used or
+# closed in the child, so they are only kept referenced.
+_inherited_connections = []
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU cache with an optional TTL (seconds)"""
+
+    def __init__(self, max_items=256, ttl=None, name='cache'):
+        self.max_items = max(1, int(max_items))
+        self.ttl = ttl
+        self.name = name
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if self.ttl is not None and time.time() - stored_at > self.ttl:
+                del self._items[key]
+                metrics.inc('cache_evictions_total', cache=self.name, tier='memory', reason='ttl')
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.time())
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+                metrics.inc('cache_evictions_total', cache=self.name, tier='memory', reason='size')
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def items(self):
+        """``(key, value)`` pairs of the entries that have not expired"""
+        now = time.time()
+        with self._lock:
+            return [(key, value) for key, (value, stored_at) in self._items.items()
+                    if self.ttl is None or now - stored_at <= self.ttl]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+
+class SQLiteConnection:
+    """
+    This process's connection to the SQLite file at ``path``, in WAL mode so
+    several processes can share the file. It is opened on first use, running
+    the ``schema`` statements (CREATE TABLE/INDEX IF NOT EXISTS ...). A
+    forked child drops the inherited connection and opens its own, so stores
+    created before a fork (e.g. with a preloading pre-fork server) are safe
+    to use in the workers. Hold ``lock`` while using the connection.
+    """
+
+    def __init__(self, path, schema=()):
+        self.path = path
+        self.schema = tuple(schema)
+        self.lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = None
+        _sqlite_connections.add(self)
+
+    def get(self):
+        """The connection, opened on first use in this process (caller holds the lock)"""
+        if self._connection is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in self.schema:
+                conn.execute(statement)
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        if self._connection is not None:
+            _inherited_connections.append(self._connection)
+            self._connection = None
+
+
+class SQLiteCache:
+    """
+    Disk cache tier stored in a single SQLite table.
+
+    Entries expire after ``ttl`` seconds and the least recently used entries
+    are evicted once the stored values exceed ``max_bytes``. WAL mode lets
+    several processes share the same file. Each process opens its own
+    connection on first use, so caches created before a fork (e.g. with a
+    preloading pre-fork server) are safe to use in the workers.
+    """
+
+    def __init__(self, path, table='cache', ttl=None, max_bytes=256 * 1024 * 1024, name='cache'):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.name = name
+        self._db = SQLiteConnection(path, schema=(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)',
+            f'CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)',
+        ))
+
+    @property
+    def _lock(self):
+        return self._db.lock
+
+    @property
+    def _conn(self):
+        """This process's connection (caller holds the lock)"""
+        return self._db.get()
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f'SELECT value, created_at FROM {self.table} WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+                self._conn.commit()
+                metrics.inc('cache_evictions_total', cache=self.name, tier='disk', reason='ttl')
+                return None
+            self._conn.execute(f'UPDATE {self.table} SET accessed_at = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            return value
+
+    def put(self, key, value):
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def items(self):
+        """``(key, value)`` pairs of the entries that have not expired"""
+        cutoff = time.time() - self.ttl if self.ttl is not None else float('-inf')
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT key, value FROM {self.table} WHERE created_at >= ?', (cutoff,)
+            ).fetchall()
+
+    def _evict(self, now):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        if self.ttl is not None:
+            expired = self._conn.execute(
+                f'DELETE FROM {self.table} WHERE created_at < ?', (now - self.ttl,)
+            ).rowcount
+            if expired:
+                metrics.inc('cache_evictions_total', expired, cache=self.name, tier='disk', reason='ttl')
+
+        if self.max_bytes is None:
+            return
+        total = self._conn.execute(f'SELECT COALESCE(SUM(size), 0) FROM {self.table}').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            f'SELECT key, size FROM {self.table} ORDER BY accessed_at ASC'
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        if evicted:
+            metrics.inc('cache_evictions_total', evicted, cache=self.name, tier='disk', reason='size')
+
+
+def _reset_connections_after_fork():
+    for connection in list(_sqlite_connections):
+        connection._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_connections_after_fork)
+
+
+class TieredCache:
+    """Memory LRU in front of an optional disk tier, with hit/miss accounting"""
+
+    def __init__(self, memory, disk=None, name='cache'):
+        self.memory = memory
+        self.disk = disk
+        self.name = name
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            metrics.inc('cache_hits_total', cache=self.name, tier='memory')
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                metrics.inc('cache_hits_total', cache=self.name, tier='disk')
+                self.memory.put(key, value)
+                return value
+        metrics.inc('cache_misses_total', cache=self.name)
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def items(self):
+        """All entries, from the disk tier when there is one (it is shared between processes)"""
+        if self.disk is not None:
+            return self.disk.items()
+        return self.memory.items()
+
+
+metrics.describe('cache_hits_total', 'Cache hits by cache and tier')
+metrics.describe('cache_misses_total', 'Cache misses by cache')
+metrics.describe('cache_evictions_total', 'Cache evictions by cache, tier and reason')
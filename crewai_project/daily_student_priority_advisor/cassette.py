@@ -0,0 +1,131 @@
+"""
+Record/replay of LLM calls, for offline and deterministic runs of the real crew
+
+In ``record`` mode every successful LLM response is appended to a cassette,
+a JSON-lines file with one ``{"key", "task", "model", "seconds", "response"}``
+object per distinct request. In ``replay`` mode requests are answered from
+the cassette without any network access (a request it does not hold raises
+CassetteMiss); ``auto`` replays what it has and records the rest. Requests
+are matched on a hash of the task name and the normalized messages, so
+whitespace changes in the prompts do not matter but any real change does.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from .metrics import metrics
+
+metrics.describe('llm_cassette_calls_total', 'LLM calls seen by the cassette, by result (hit, miss or recorded)')
+
+CASSETTE_MODES = ('off', 'record', 'replay', 'auto')
+DEFAULT_CASSETTE_PATH = os.path.join('.cache', 'llm_cassette.jsonl')
+
+
+class CassetteMiss(LookupError):
+    """A replayed LLM request that the cassette holds no response for"""
+
+
+def _normalize(text):
+    return re.sub(r'\s+', ' ', str(text)).strip()
+
+
+def cassette_key(task, messages):
+    """Hash of a request: its task and each message's role and whitespace-normalized content"""
+    if isinstance(messages, list):
+        parts = [
+            [message.get('role'), _normalize(message.get('content') if isinstance(message.get('content'), str)
+                                             else json.dumps(message.get('content'), sort_keys=True))]
+            if isinstance(message, dict) else [None, _normalize(message)]
+            for message in messages
+        ]
+    else:
+        parts = [[None, _normalize(messages)]]
+    payload = json.dumps([task or '', parts], separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class LLMCassette:
+    """
+    The process's cassette, configured from LLM_CASSETTE_MODE,
+    LLM_CASSETTE_PATH and LLM_CASSETTE_LATENCY (``recorded`` to sleep for
+    each call's recorded duration, a number of seconds, or empty for none)
+    unless configure() is called. Entries are loaded on first use.
+    """
+
+    def __init__(self):
+        self.configure(
+            mode=os.getenv('LLM_CASSETTE_MODE', 'off') or 'off',
+            path=os.getenv('LLM_CASSETTE_PATH', DEFAULT_CASSETTE_PATH),
+            latency=os.getenv('LLM_CASSETTE_LATENCY', ''),
+        )
+
+    def configure(self, mode='off', path=DEFAULT_CASSETTE_PATH, latency=''):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"LLM cassette mode must be one of {', '.join(CASSETTE_MODES)}, not {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.latency = latency if latency in ('', None, 'recorded') else float(latency)
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def _load(self):
+        """Entries by key (caller holds the lock); later lines win"""
+        if self._entries is None:
+            self._entries = {}
+            if os.path.exists(self.path):
+                with open(self.path, encoding='utf-8') as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._entries[entry['key']] = entry
+        return self._entries
+
+    def replay(self, task, messages):
+        """
+        The recorded response for a request, after the configured latency,
+        or None when it should go to the provider. Raises CassetteMiss for an
+        unknown request in ``replay`` mode.
+        """
+        if self.mode not in ('replay', 'auto'):
+            return None
+        key = cassette_key(task, messages)
+        with self._lock:
+            entry = self._load().get(key)
+        if entry is None:
+            metrics.inc('llm_cassette_calls_total', result='miss')
+            if self.mode == 'replay':
+                raise CassetteMiss(f"No recorded response for {task or 'unnamed'} request {key} in {self.path}")
+            return None
+        metrics.inc('llm_cassette_calls_total', result='hit')
+        delay = entry.get('seconds', 0.0) if self.latency == 'recorded' else self.latency or 0.0
+        if delay > 0:
+            time.sleep(delay)
+        return entry['response']
+
+    def record(self, task, model, messages, response, seconds):
+        """Append a successful response to the cassette (once per distinct request and response)"""
+        if self.mode not in ('record', 'auto') or not isinstance(response, str):
+            return
+        key = cassette_key(task, messages)
+        entry = {"key": key, "task": task, "model": model, "seconds": round(seconds, 3), "response": response}
+        with self._lock:
+            entries = self._load()
+            known = entries.get(key)
+            if known is not None and known['response'] == response:
+                return
+            entries[key] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # One write per line, so processes recording into the same file do not interleave
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n')
+        metrics.inc('llm_cassette_calls_total', result='recorded')
+
+
+llm_cassette = LLMCassette()
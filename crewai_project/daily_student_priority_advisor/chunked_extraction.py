@@ -0,0 +1,102 @@
+"""
+Parallel extraction of planning data from PDF text chunks
+"""
+import contextvars
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .compaction import compact_json
+from .defaults import EXTRACTION_TASK
+from .metrics import metrics
+from .progress import parse_task_output
+
+metrics.describe('extraction_chunks_total', 'PDF text chunks sent to the extraction task, by outcome')
+
+# Fields identifying the same item when it is extracted from several chunks
+ITEM_KEYS = {
+    'classes': ('name', 'days', 'time'),
+    'exams': ('name', 'date'),
+    'assignments': ('name', 'deadline'),
+    'commitments': ('name', 'time'),
+    'modules': ('code', 'name'),
+}
+
+_SPACES = re.compile(r'\s+')
+
+
+def _normalize(value):
+    return _SPACES.sub(' ', str(value or '')).strip().lower()
+
+
+def _item_key(category, item):
+    if category == 'modules':
+        # Modules are identified by code, or by name when the code is missing
+        return (_normalize(item.get('code')) or _normalize(item.get('name')),)
+    return tuple(_normalize(item.get(field)) for field in ITEM_KEYS[category])
+
+
+def merge_planning_data(parts):
+    """
+    Merge planning data dicts extracted from separate chunks into one.
+
+    Items describing the same class/exam/assignment/commitment/module are
+    de-duplicated, with fields missing from the first occurrence filled in
+    from later ones. The overall confidence is the lowest chunk confidence.
+    """
+    merged = {category: [] for category in ITEM_KEYS}
+    index = {category: {} for category in ITEM_KEYS}
+    confidences = []
+
+    for part in parts:
+        for category in ITEM_KEYS:
+            for item in part.get(category) or []:
+                if not isinstance(item, dict):
+                    continue
+                key = _item_key(category, item)
+                existing = index[category].get(key)
+                if existing is None:
+                    existing = dict(item)
+                    index[category][key] = existing
+                    merged[category].append(existing)
+                else:
+                    for field, value in item.items():
+                        if existing.get(field) in (None, '', []):
+                            existing[field] = value
+        confidence = part.get('confidence')
+        if isinstance(confidence, (int, float)):
+            confidences.append(float(confidence))
+
+    if confidences:
+        merged['confidence'] = min(confidences)
+    return merged
+
+
+def extract_chunks(crew_pool, chunks, inputs, parallelism=4):
+    """
+    Run the extraction task once per text chunk, up to ``parallelism`` at a
+    time, and return the merged planning data as a JSON string.
+    """
+    def extract(chunk):
+        chunk_inputs = dict(inputs, pdf_text=chunk, pdf_file_path='')
+        output = crew_pool.kickoff(chunk_inputs, tasks=[EXTRACTION_TASK])
+        return output.tasks_output[0].raw
+
+    with ThreadPoolExecutor(max_workers=max(1, min(parallelism, len(chunks))),
+                            thread_name_prefix='advisor-extract') as executor:
+        # Copy the context so LLM calls are recorded in the request's trace
+        futures = [executor.submit(contextvars.copy_context().run, extract, chunk) for chunk in chunks]
+        raw_outputs = [future.result() for future in futures]
+
+    parts = []
+    for raw in raw_outputs:
+        parsed = parse_task_output(raw)
+        if isinstance(parsed, dict):
+            parts.append(parsed)
+            metrics.inc('extraction_chunks_total', outcome='parsed')
+        else:
+            metrics.inc('extraction_chunks_total', outcome='unparsed')
+
+    if not parts:
+        # Nothing structured to merge: hand the raw chunk outputs to the next stage
+        return '\n\n'.join(raw_outputs)
+    return compact_json(merge_planning_data(parts))
@@ -0,0 +1,69 @@
+"""
+Single-flight deduplication of identical concurrent requests
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+from .caching import LRUCache
+from .metrics import metrics
+
+metrics.describe('request_coalesced_total', 'Requests answered by an identical request, by source (in_flight or recent)')
+metrics.describe('requests_in_flight_unique', 'Distinct coalescable requests currently being computed', 'gauge')
+
+
+def request_key(pdf_bytes, other_data):
+    """Content hash of a /run request: the PDF and its canonical other_data"""
+    digest = hashlib.sha256(pdf_bytes)
+    digest.update(b'\0')
+    digest.update(json.dumps(other_data, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs one computation per key at a time: callers arriving while it runs
+    wait for it and get the same result (or exception). Successful results
+    are kept for ``ttl`` seconds, so an app retry or a double tap right
+    after the first answer does not start the work again.
+    """
+
+    def __init__(self, ttl=30, max_items=1024, name='run'):
+        self.name = name
+        self._recent = LRUCache(max_items=max_items, ttl=ttl, name=f'{name}_coalescing') if ttl else None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return ``(result, shared)``; ``shared`` is True when another call computed it"""
+        with self._lock:
+            if self._recent is not None:
+                result = self._recent.get(key)
+                if result is not None:
+                    metrics.inc('request_coalesced_total', endpoint=self.name, source='recent')
+                    return result, True
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                metrics.set('requests_in_flight_unique', len(self._in_flight), endpoint=self.name)
+
+        if not owner:
+            metrics.inc('request_coalesced_total', endpoint=self.name, source='in_flight')
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            if self._recent is not None:
+                self._recent.put(key, result)
+            return result, False
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+                metrics.set('requests_in_flight_unique', len(self._in_flight), endpoint=self.name)
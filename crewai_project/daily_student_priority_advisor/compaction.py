@@ -0,0 +1,217 @@
+"""
+Compact, token-budgeted serialization of the outputs passed between crew tasks
+
+A task's output is cut down to the fields the next task reads (see
+PLANNING_FIELDS and ANALYSIS_FIELDS), serialized as compact JSON and then
+trimmed to the next task's token budget.
+"""
+import datetime
+import json
+
+from .defaults import DECISION_TASK, EXTRACTION_TASK
+from .instrumentation import current_trace
+from .metrics import metrics
+from .progress import parse_task_output
+from .scoring import parse_date
+
+metrics.describe('stage_handoff_tokens_total', 'Estimated tokens of task outputs handed to the next task')
+metrics.describe('stage_handoff_trimmed_total', 'Task outputs trimmed to fit the next task\'s token budget')
+metrics.describe('stage_handoff_tokens_saved_total',
+                 'Estimated prompt tokens left out of the next tasks\' context, by the task that produced them')
+
+# Rough characters-per-token ratio used for estimates
+CHARS_PER_TOKEN = 4
+
+# Tokens a task's output may take up in the next task's prompt
+DEFAULT_TOKEN_BUDGETS = {
+    EXTRACTION_TASK: 2000,
+    DECISION_TASK: 400,
+}
+# Longest free-text field kept in a planning data item
+MAX_FIELD_CHARS = 160
+# Ranking entries of a local analysis kept for the advice task
+MAX_RANKING_ITEMS = 3
+# Undated planning data categories, in the order they are dropped when over budget
+DROP_ORDER = ('classes', 'commitments')
+DATE_FIELDS = {'exams': 'date', 'assignments': 'deadline'}
+# Fields of each planning data item the priority decision reads
+PLANNING_FIELDS = {
+    'classes': ('name', 'days', 'time', 'recurrence'),
+    'exams': ('name', 'date', 'time', 'module', 'weight'),
+    'assignments': ('name', 'deadline', 'module', 'weight'),
+    'commitments': ('name', 'days', 'time', 'recurrence'),
+    'modules': ('code', 'name', 'importance', 'credits'),
+}
+# Planning data fields only the extraction itself uses
+PLANNING_ONLY_FIELDS = ('confidence',)
+# Fields of a priority analysis, and of its ranking entries, the advice task reads
+ANALYSIS_FIELDS = ('topPriorityTask', 'urgencyScore', 'confidenceLevel', 'moduleImportance', 'reasoning', 'ranking')
+RANKING_FIELDS = ('name', 'type', 'deadline', 'module', 'urgencyScore')
+
+
+def estimate_tokens(text):
+    return len(text or '') // CHARS_PER_TOKEN
+
+
+def _prune(value):
+    """Drop None, empty strings and empty containers, recursively"""
+    if isinstance(value, dict):
+        pruned = {key: _prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, '', [], {})}
+    if isinstance(value, list):
+        return [item for item in (_prune(item) for item in value) if item not in (None, '', [], {})]
+    return value
+
+
+def compact_json(data):
+    """JSON without whitespace or empty fields"""
+    return json.dumps(_prune(data), separators=(',', ':'), ensure_ascii=False)
+
+
+def compact_output(raw):
+    """A task output as compact JSON when it is JSON, otherwise unchanged"""
+    parsed = parse_task_output(raw)
+    if isinstance(parsed, (dict, list)):
+        return compact_json(parsed)
+    return raw
+
+
+def _size(data):
+    return len(compact_json(data))
+
+
+def _deadline_key(item, field):
+    """Sort key putting the most pressing dated items first and undated items last"""
+    date = parse_date(item.get(field)) if isinstance(item, dict) else None
+    return (date is None, date or datetime.date.min)
+
+
+def project_planning_data(data):
+    """Planning data with only the PLANNING_FIELDS of each item; other top-level keys (e.g. studentTasks) are kept"""
+    projected = {}
+    for key, value in data.items():
+        if key in PLANNING_ONLY_FIELDS:
+            continue
+        fields = PLANNING_FIELDS.get(key)
+        if fields is not None and isinstance(value, list):
+            value = [{field: item[field] for field in fields if field in item} if isinstance(item, dict) else item
+                     for item in value]
+        projected[key] = value
+    return projected
+
+
+def project_priority_analysis(analysis):
+    """The ANALYSIS_FIELDS of a priority analysis, with the first MAX_RANKING_ITEMS ranking entries"""
+    projected = {key: analysis[key] for key in ANALYSIS_FIELDS if key in analysis}
+    if isinstance(projected.get('ranking'), list):
+        projected['ranking'] = [
+            {field: item[field] for field in RANKING_FIELDS if field in item} if isinstance(item, dict) else item
+            for item in projected['ranking'][:MAX_RANKING_ITEMS]
+        ]
+    return projected
+
+
+def fit_planning_data(data, max_chars, current_date=None):
+    """
+    Shrink planning data to about ``max_chars`` of compact JSON: long text
+    fields of every category are shortened, exams and assignments already past are dropped,
+    then classes and commitments, then the remaining exams and assignments
+    with the furthest deadlines.
+    """
+    data = _prune(data)
+    if _size(data) <= max_chars:
+        return data
+
+    for items in data.values():
+        for item in items if isinstance(items, list) else []:
+            if isinstance(item, dict):
+                for field, value in item.items():
+                    if isinstance(value, str) and len(value) > MAX_FIELD_CHARS:
+                        item[field] = value[:MAX_FIELD_CHARS - 1].rstrip() + '…'
+
+    today = parse_date(current_date)
+    if today is not None:
+        for category, field in DATE_FIELDS.items():
+            items = data.get(category) or []
+            kept = [i for i in items if not (isinstance(i, dict) and (parse_date(i.get(field)) or today) < today)]
+            if kept != items:
+                data[category] = kept
+
+    size = _size(data)
+    for category in DROP_ORDER:
+        items = data.get(category) or []
+        while items and size > max_chars:
+            size -= len(compact_json(items.pop())) + 1
+        if size <= max_chars:
+            break
+
+    # Still too long: drop exams and assignments together, furthest deadline first
+    dated = sorted(
+        ((category, item) for category, field in DATE_FIELDS.items() for item in data.get(category) or []),
+        key=lambda pair: _deadline_key(pair[1], DATE_FIELDS[pair[0]]),
+    )
+    while dated and size > max_chars:
+        category, item = dated.pop()
+        data[category].remove(item)
+        size -= len(compact_json(item)) + 1
+    return _prune(data)
+
+
+def fit_priority_analysis(analysis, max_chars):
+    """
+    Shrink a priority analysis to about ``max_chars``: only the first
+    MAX_RANKING_ITEMS ranking entries are kept, without their factors, and
+    the ranking is dropped entirely if that is still too long.
+    """
+    analysis = _prune(analysis)
+    if _size(analysis) <= max_chars or 'ranking' not in analysis:
+        return analysis
+    analysis['ranking'] = [
+        {key: value for key, value in item.items() if key != 'factors'} if isinstance(item, dict) else item
+        for item in analysis['ranking'][:MAX_RANKING_ITEMS]
+    ]
+    if _size(analysis) > max_chars:
+        del analysis['ranking']
+    return analysis
+
+
+def fit_to_budget(task_name, output, budget, current_date=None):
+    """
+    Serialize a task's output (raw text or parsed data) for the next task's
+    prompt: compact JSON of the fields that task reads, trimmed to about
+    ``budget`` tokens when given. Text that is not JSON is cut at the budget.
+    """
+    parsed = parse_task_output(output)
+    if isinstance(parsed, (dict, list)):
+        full = compact_json(parsed)
+        if isinstance(parsed, dict) and task_name == EXTRACTION_TASK:
+            parsed = project_planning_data(parsed)
+        elif isinstance(parsed, dict) and task_name == DECISION_TASK:
+            parsed = project_priority_analysis(parsed)
+        text = compact_json(parsed)
+    else:
+        full = text = str(parsed or '')
+
+    if budget and estimate_tokens(text) > budget:
+        max_chars = budget * CHARS_PER_TOKEN
+        if isinstance(parsed, dict) and task_name == EXTRACTION_TASK:
+            text = compact_json(fit_planning_data(parsed, max_chars, current_date))
+        elif isinstance(parsed, dict) and task_name == DECISION_TASK:
+            text = compact_json(fit_priority_analysis(parsed, max_chars))
+        elif not isinstance(parsed, (dict, list)):
+            text = text[:max_chars]
+        metrics.inc('stage_handoff_trimmed_total', task=task_name)
+
+    tokens = estimate_tokens(text)
+    metrics.inc('stage_handoff_tokens_total', tokens, task=task_name)
+    record_handoff(task_name, tokens, estimate_tokens(full) - tokens)
+    return text
+
+
+def record_handoff(task_name, tokens, saved):
+    """Account tokens of a task's output handed on, and tokens left out, in the metrics and the request trace"""
+    if saved > 0:
+        metrics.inc('stage_handoff_tokens_saved_total', saved, task=task_name)
+    trace = current_trace()
+    if trace is not None:
+        trace.add_handoff(task_name, tokens, max(saved, 0))
@@ -0,0 +1,85 @@
+"""
+Per-model concurrency limits for the asyncio server
+"""
+import asyncio
+from contextlib import asynccontextmanager
+
+from .metrics import metrics
+
+metrics.describe('model_requests_in_flight', 'Requests currently using an upstream model', 'gauge')
+metrics.describe('model_requests_waiting', 'Requests waiting for a free slot on an upstream model', 'gauge')
+metrics.describe('model_slot_timeouts_total', 'Requests that gave up waiting for a model slot')
+
+
+class ModelSlotTimeout(Exception):
+    """Raised when no slot on the model became free within the timeout"""
+
+
+def parse_limits(value, default):
+    """
+    Parse ``MODEL_CONCURRENCY``: either a single number applied to every
+    model, or ``model=N`` pairs separated by commas (other models get
+    ``default``). Returns ``(limits_by_model, default)``.
+    """
+    limits = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '=' in part:
+            model, limit = part.rsplit('=', 1)
+            limits[model.strip()] = max(1, int(limit))
+        else:
+            default = max(1, int(part))
+    return limits, default
+
+
+class ModelLimiter:
+    """
+    Caps the number of requests talking to each upstream model at once.
+    Requests over the limit wait as coroutines on the event loop, so they
+    hold no thread while queued.
+    """
+
+    def __init__(self, limits=None, default=4):
+        self.limits = dict(limits or {})
+        self.default = default
+        self._semaphores = {}
+        self._waiting = {}
+        self._in_flight = {}
+
+    def limit(self, model):
+        return self.limits.get(model, self.default)
+
+    def total(self, models):
+        """Threads needed to run every slot of the given models at once"""
+        return sum(self.limit(model) for model in set(models))
+
+    @asynccontextmanager
+    async def slot(self, model, timeout=None):
+        """Hold one of the model's slots for the duration of the ``async with`` block"""
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = self._semaphores[model] = asyncio.Semaphore(self.limit(model))
+
+        self._update('_waiting', 'model_requests_waiting', model, 1)
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            metrics.inc('model_slot_timeouts_total', model=model)
+            raise ModelSlotTimeout(f"No slot on {model} after {timeout}s")
+        finally:
+            self._update('_waiting', 'model_requests_waiting', model, -1)
+
+        self._update('_in_flight', 'model_requests_in_flight', model, 1)
+        try:
+            yield
+        finally:
+            self._update('_in_flight', 'model_requests_in_flight', model, -1)
+            semaphore.release()
+
+    def _update(self, counter, metric, model, delta):
+        # Only touched from the event loop thread, so no lock is needed
+        counts = getattr(self, counter)
+        counts[model] = counts.get(model, 0) + delta
+        metrics.set(metric, counts[model], model=model)
@@ -5,11 +5,60 @@ import os
 from crewai import Agent, Crew, Process, Task
 from crewai.project import CrewBase, agent, crew, task
 from crewai_tools import FileReadTool
-from langchain_google_genai import ChatGoogleGenerativeAI
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Re-exported for callers that import them from the crew module
+from .defaults import (
+    ADVICE_TASK,
+    DECISION_TASK,
+    DEFAULT_INPUTS,
+    DEFAULT_MODEL_SETTINGS,
+    EXTRACTION_TASK,
+    MODEL,
+    TASK_AGENTS,
+    TEMPLATE_MODEL,
+    agent_model_settings,
+    build_inputs,
+)
+from .llm import InstrumentedLLM
+from .schemas import TASK_SCHEMAS
+
+
+def build_llm(model=MODEL, temperature=0.7, max_tokens=None):
+    """
+    Build the Gemini LLM client.
+
+    CrewAI wraps whatever is passed as ``llm`` into its own ``LLM`` object for
+    every agent, so building the ``LLM`` directly lets all agents (and all
+    pooled crews) share a single client and its HTTP connections.
+    """
+    return InstrumentedLLM(
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        api_key=os.getenv("GOOGLE_API_KEY")
+    )
+
+
+def build_llms(settings=None):
+    """
+    Build one LLM client per agent from its model settings (see
+    defaults.agent_model_settings); agents with the same settings share a
+    client. An advisor on the template model gets the decision agent's
+    client, which only runs it when a crew executes every task.
+    """
+    settings = settings if settings is not None else agent_model_settings()
+    clients = {}
+    llms = {}
+    for agent_name, agent_settings in settings.items():
+        if agent_settings['model'] == TEMPLATE_MODEL:
+            continue
+        key = (agent_settings['model'], agent_settings['temperature'], agent_settings['max_tokens'])
+        if key not in clients:
+            clients[key] = build_llm(*key)
+        llms[agent_name] = clients[key]
+    for agent_name in settings:
+        llms.setdefault(agent_name, llms.get(TASK_AGENTS[DECISION_TASK]) or next(iter(clients.values())))
+    return llms
 
 @CrewBase
 class DailyStudentPriorityAdvisorCrew:
@@ -18,45 +67,60 @@ class DailyStudentPriorityAdvisorCrew:
     agents_config = 'config/agents.yaml'
     tasks_config = 'config/tasks.yaml'
 
-    def __init__(self):
-        # Initialize the LLM with Google Gemini
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini/gemini-2.5-flash",
-            temperature=0.7,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
+    def __init__(self, llm=None, llms=None):
+        # One LLM client per agent (see build_llms), unless shared clients are
+        # given; a single ``llm`` is used by every agent
+        if llms is None:
+            llms = build_llms() if llm is None else {}
+        self.llms = llms
+        self.llm = llm
+        self._stage_crews = {}
+
+    def _llm_for(self, agent_name):
+        return self.llms.get(agent_name) or self.llm
+
+    def _agent_config(self, agent_name):
+        """An agent's config without the model settings, which choose its LLM instead"""
+        return {key: value for key, value in self.agents_config[agent_name].items()
+                if key not in DEFAULT_MODEL_SETTINGS}
 
     @agent
     def pdf_planning_reader(self) -> Agent:
         return Agent(
-            config=self.agents_config["pdf_planning_reader"],
+            config=self._agent_config("pdf_planning_reader"),
             tools=[FileReadTool()],
-            llm=self.llm,
+            llm=self._llm_for("pdf_planning_reader"),
             verbose=True,
             allow_delegation=False,
             max_iter=25,
+            # LLM calls are retried with backoff by the resilience layer
+            max_retry_limit=0,
         )
 
     @agent
     def daily_priority_decision_maker(self) -> Agent:
         return Agent(
-            config=self.agents_config["daily_priority_decision_maker"],
+            config=self._agent_config("daily_priority_decision_maker"),
             tools=[],
-            llm=self.llm,
+            llm=self._llm_for("daily_priority_decision_maker"),
             verbose=True,
             allow_delegation=False,
             max_iter=25,
+            # LLM calls are retried with backoff by the resilience layer
+            max_retry_limit=0,
         )
 
     @agent
     def student_decision_advisor(self) -> Agent:
         return Agent(
-            config=self.agents_config["student_decision_advisor"],
+            config=self._agent_config("student_decision_advisor"),
             tools=[],
-            llm=self.llm,
+            llm=self._llm_for("student_decision_advisor"),
             verbose=True,
             allow_delegation=False,
             max_iter=25,
+            # LLM calls are retried with backoff by the resilience layer
+            max_retry_limit=0,
         )
 
     @task
@@ -64,6 +128,7 @@ class DailyStudentPriorityAdvisorCrew:
         return Task(
             config=self.tasks_config["extract_pdf_planning_data"],
             markdown=False,
+            output_pydantic=TASK_SCHEMAS["extract_pdf_planning_data"],
         )
 
     @task
@@ -71,6 +136,7 @@ class DailyStudentPriorityAdvisorCrew:
         return Task(
             config=self.tasks_config["make_daily_priority_decision"],
             markdown=False,
+            output_pydantic=TASK_SCHEMAS["make_daily_priority_decision"],
         )
 
     @task
@@ -78,6 +144,7 @@ class DailyStudentPriorityAdvisorCrew:
         return Task(
             config=self.tasks_config["provide_final_decision"],
             markdown=False,
+            output_pydantic=TASK_SCHEMAS["provide_final_decision"],
         )
 
     @crew
@@ -88,4 +155,21 @@ class DailyStudentPriorityAdvisorCrew:
             tasks=self.tasks,  # Automatically created by the @task decorator
             process=Process.sequential,
             verbose=True,
-        )
\ No newline at end of file
+        )
+
+    def stage_crew(self, task_names) -> Crew:
+        """
+        Creates (once per task selection) a crew that runs only the named
+        tasks, in crew order. Inputs must then carry whatever the skipped
+        tasks would have produced (``planning_context``, ``priority_analysis``).
+        """
+        key = tuple(task_names)
+        if key not in self._stage_crews:
+            tasks = [t for t in self.crew().tasks if t.name in key]
+            self._stage_crews[key] = Crew(
+                agents=[t.agent for t in tasks],
+                tasks=tasks,
+                process=Process.sequential,
+                verbose=True,
+            )
+        return self._stage_crews[key]
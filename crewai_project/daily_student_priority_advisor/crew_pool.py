@@ -0,0 +1,136 @@
+"""
+Worker-level pool of ready-to-run advisor crews
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from .defaults import EXTRACTION_TASK, TASK_AGENTS, TEMPLATE_MODEL, agent_model_settings
+from .instrumentation import current_trace, span
+from .metrics import metrics
+
+metrics.describe('crew_pool_size', 'Number of pre-built crews in the pool', 'gauge')
+metrics.describe('crew_pool_hits_total', 'Crew checkouts served immediately from the pool')
+metrics.describe('crew_pool_waits_total', 'Crew checkouts that had to wait for a crew to be returned')
+metrics.describe('crew_pool_timeouts_total', 'Crew checkouts that gave up waiting')
+
+
+class CrewPoolExhausted(Exception):
+    """Raised when no crew became available within the checkout timeout"""
+
+
+class CrewPool:
+    """
+    Fixed-size pool of pre-built DailyStudentPriorityAdvisorCrew instances.
+
+    Agents, tools, task configs and the LLM clients (one per agent model
+    setting in config/agents.yaml) are built once, on the
+    first checkout or an explicit warmup(); a request only checks out a crew
+    and binds its own inputs at kickoff. A crew is used by one request at a
+    time. Creating the pool does not import CrewAI, so processes that never
+    run a crew (health checks, CLI --help) stay small and start fast.
+    """
+
+    def __init__(self, size=4, llm=None, timeout=None, model_settings=None):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._llm = llm
+        self._llms = None
+        self.model_settings = model_settings if model_settings is not None else agent_model_settings()
+        # A shared ``llm`` replaces every agent's model except a template advisor
+        self.models = {
+            agent: settings['model'] if llm is None or settings['model'] == TEMPLATE_MODEL else llm.model
+            for agent, settings in self.model_settings.items()
+        }
+        # The PDF reader's model, which does most of the work of a request
+        self.model = self.model_for(EXTRACTION_TASK)
+        self._crews = queue.Queue()
+        self._warm = False
+        self._warmup_lock = threading.Lock()
+        metrics.set('crew_pool_size', self.size)
+
+    def model_for(self, task_name):
+        """Model the agent running ``task_name`` is routed to"""
+        return self.models[TASK_AGENTS[task_name]]
+
+    @property
+    def llms(self):
+        """The LLM client of each agent, built (with the crews) on first use"""
+        self.warmup()
+        return self._llms
+
+    @property
+    def warm(self):
+        return self._warm
+
+    def warmup(self):
+        """Import the CrewAI stack and build the LLM clients and every crew"""
+        if self._warm:
+            return
+        with self._warmup_lock:
+            if self._warm:
+                return
+            with span('crew_warmup'):
+                from .crew import DailyStudentPriorityAdvisorCrew, build_llms
+
+                if self._llm is None:
+                    self._llms = build_llms(self.model_settings)
+                else:
+                    self._llms = {agent: self._llm for agent in self.model_settings}
+                for _ in range(self.size):
+                    advisor = DailyStudentPriorityAdvisorCrew(llms=self._llms)
+                    # Build agents and tasks up front (crew() is memoized per instance)
+                    advisor.crew()
+                    self._crews.put(advisor)
+            self._warm = True
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Check out a crew for the duration of the ``with`` block"""
+        timeout = self.timeout if timeout is None else timeout
+        self.warmup()
+        with span('crew_checkout'):
+            try:
+                advisor = self._crews.get_nowait()
+                metrics.inc('crew_pool_hits_total')
+            except queue.Empty:
+                metrics.inc('crew_pool_waits_total')
+                try:
+                    advisor = self._crews.get(timeout=timeout)
+                except queue.Empty:
+                    metrics.inc('crew_pool_timeouts_total')
+                    raise CrewPoolExhausted(f"No crew available after {timeout}s")
+        try:
+            yield advisor
+        finally:
+            self._crews.put(advisor)
+
+    def kickoff(self, inputs, tasks=None, task_callback=None, timeout=None):
+        """
+        Run the crew with the given inputs on a pooled crew. ``tasks``
+        restricts the run to the named tasks (see stage_crew); by default all
+        three run. ``task_callback`` is called with each task's output as soon
+        as that task finishes.
+        """
+        trace = current_trace()
+        last = [time.perf_counter()]
+
+        def on_task(task_output):
+            # Tasks run sequentially: each one took the time since the previous finished
+            now = time.perf_counter()
+            if trace is not None:
+                model = self.models.get(TASK_AGENTS.get(task_output.name))
+                trace.add_task_time(task_output.name, now - last[0], model=model)
+            last[0] = now
+            if task_callback is not None:
+                task_callback(task_output)
+
+        with self.acquire(timeout=timeout) as advisor:
+            crew = advisor.stage_crew(tasks) if tasks else advisor.crew()
+            crew.task_callback = on_task
+            last[0] = time.perf_counter()
+            try:
+                return crew.kickoff(inputs=inputs)
+            finally:
+                crew.task_callback = None
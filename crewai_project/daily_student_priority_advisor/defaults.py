@@ -0,0 +1,77 @@
+"""
+Crew inputs, task names and model settings that are cheap to import
+
+Everything the server needs before the first crew actually runs lives here,
+so that importing the server (health checks, CLI --help) does not load the
+CrewAI stack. crew.py re-exports these names.
+"""
+import os
+
+import yaml
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Model used by agents that do not choose one in config/agents.yaml
+MODEL = "gemini/gemini-2.5-flash"
+
+AGENTS_CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config', 'agents.yaml')
+# Keys of an agent in config/agents.yaml that select its LLM
+DEFAULT_MODEL_SETTINGS = {'model': MODEL, 'temperature': 0.7, 'max_tokens': None}
+# Model name that replaces the advisor agent with template_recommendation()
+TEMPLATE_MODEL = 'template'
+
+# Defaults for every template variable referenced in config/tasks.yaml
+DEFAULT_INPUTS = {
+    'student_name': 'Student',
+    'current_date': '',
+    'task_deadline': '',
+    'module_coefficient': 1,
+    'confidence_level': 'medium',
+    'new_task_description': '',
+    'pdf_text': '',
+    'pdf_file_path': '',
+    'planning_context': 'Use the planning data extracted by the previous task.',
+    'schedule_features': 'Not precomputed; judge the workload from the classes and commitments in the planning data.',
+    'priority_analysis': 'Use the priority analysis from the previous task.',
+}
+# Inputs taken from the request, as opposed to those the pipeline fills in
+REQUEST_INPUTS = ('student_name', 'current_date', 'task_deadline', 'module_coefficient', 'confidence_level',
+                  'new_task_description')
+
+# Task names, in the order the sequential crew runs them
+EXTRACTION_TASK = 'extract_pdf_planning_data'
+DECISION_TASK = 'make_daily_priority_decision'
+ADVICE_TASK = 'provide_final_decision'
+
+# Agent running each task (see config/tasks.yaml)
+TASK_AGENTS = {
+    EXTRACTION_TASK: 'pdf_planning_reader',
+    DECISION_TASK: 'daily_priority_decision_maker',
+    ADVICE_TASK: 'student_decision_advisor',
+}
+# LLM call phrasing a local study plan (not a crew task), made with the advisor's model
+PLAN_TASK = 'phrase_study_plan'
+
+
+def build_inputs(**overrides):
+    """Return crew inputs with defaults filled in for every template variable"""
+    inputs = dict(DEFAULT_INPUTS)
+    inputs.update({key: value for key, value in overrides.items() if value is not None})
+    return inputs
+
+
+def agent_model_settings(path=AGENTS_CONFIG_PATH):
+    """``{agent: {model, temperature, max_tokens}}`` from config/agents.yaml, with defaults filled in"""
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+    settings = {}
+    for agent, info in config.items():
+        chosen = {key: value for key, value in (info or {}).items()
+                  if key in DEFAULT_MODEL_SETTINGS and value is not None}
+        settings[agent] = dict(DEFAULT_MODEL_SETTINGS, **chosen)
+    for agent, agent_settings in settings.items():
+        if agent_settings['model'] == TEMPLATE_MODEL and agent != TASK_AGENTS[ADVICE_TASK]:
+            raise ValueError(f"Only {TASK_AGENTS[ADVICE_TASK]} can use the {TEMPLATE_MODEL!r} model, not {agent}")
+    return settings
@@ -0,0 +1,69 @@
+"""
+Content-addressed cache for PDF planning extraction results
+"""
+import hashlib
+import json
+import os
+
+import yaml
+
+from .caching import LRUCache, SQLiteCache, TieredCache
+from .defaults import EXTRACTION_TASK, TASK_AGENTS
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), 'config')
+
+
+def config_hash(model='', task=EXTRACTION_TASK, agent=None, settings=None):
+    """
+    Hash the parts of the configuration that shape a task's output: the
+    task, its agent (by default the one running it), the model name and
+    any pipeline ``settings`` that change what the agent is given. Editing
+    other tasks does not invalidate cached outputs.
+    """
+    with open(os.path.join(CONFIG_DIR, 'tasks.yaml')) as f:
+        tasks = yaml.safe_load(f)
+    with open(os.path.join(CONFIG_DIR, 'agents.yaml')) as f:
+        agents = yaml.safe_load(f)
+    material = {
+        'task': tasks.get(task),
+        'agent': agents.get(agent or TASK_AGENTS[task]),
+        'model': model,
+        'settings': settings or {},
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ExtractionCache(TieredCache):
+    """
+    Extraction outputs keyed by sha256(PDF bytes) + sha256(extraction config).
+    ``settings`` are the pipeline's extraction settings (mode, PDF text limit,
+    ...): outputs extracted under other settings are not reused.
+    """
+
+    def __init__(self, memory, disk=None, model='', settings=None):
+        super().__init__(memory, disk, name='extraction')
+        self.config_digest = config_hash(model, settings=settings)
+
+    def key_for(self, pdf_bytes):
+        return f"{hashlib.sha256(pdf_bytes).hexdigest()}:{self.config_digest}"
+
+
+def create_extraction_cache(model='', settings=None):
+    """Build the extraction cache from EXTRACTION_CACHE_* environment settings"""
+    ttl = float(os.getenv('EXTRACTION_CACHE_TTL', str(7 * 24 * 3600)))
+    memory = LRUCache(
+        max_items=int(os.getenv('EXTRACTION_CACHE_MEMORY_ITEMS', '256')),
+        ttl=ttl,
+        name='extraction',
+    )
+    disk = None
+    path = os.getenv('EXTRACTION_CACHE_PATH', os.path.join('.cache', 'extraction_cache.sqlite3'))
+    if path:
+        disk = SQLiteCache(
+            path,
+            table='extractions',
+            ttl=ttl,
+            max_bytes=int(os.getenv('EXTRACTION_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+            name='extraction',
+        )
+    return ExtractionCache(memory, disk, model=model, settings=settings)
@@ -0,0 +1,241 @@
+"""
+Per-request latency and LLM token instrumentation
+"""
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from .metrics import metrics
+
+metrics.describe('advisor_request_seconds', 'Wall time of advisor requests', 'histogram')
+metrics.describe('advisor_stage_seconds', 'Wall time of request stages outside the crew tasks', 'histogram')
+metrics.describe('advisor_task_seconds', 'Wall time of crew tasks, by task and model', 'histogram')
+metrics.describe('llm_calls_total', 'LLM calls by task and model')
+metrics.describe('llm_retries_total', 'Failed LLM calls that were retried, by task and model')
+metrics.describe('llm_call_seconds', 'Wall time of single LLM calls', 'histogram')
+metrics.describe('llm_prompt_tokens_total', 'Prompt tokens by task and model')
+metrics.describe('llm_completion_tokens_total', 'Completion tokens by task and model')
+metrics.describe('llm_cached_prompt_tokens_total', 'Prompt tokens the provider served from its context cache, by task and model')
+metrics.describe('llm_prompt_prefix_tokens_total',
+                 'Prompt tokens identical to the start of the previous prompt of the same task and model')
+metrics.describe('profiles_written_total', 'Slow-request profiles written to disk')
+
+_current_trace = contextvars.ContextVar('advisor_trace', default=None)
+
+
+def _empty_task_stats():
+    return {'wall': 0.0, 'llm_calls': 0, 'retries': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+            'cached_prompt_tokens': 0}
+
+
+class RequestTrace:
+    """Timings, LLM calls and token counts collected while serving one request"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.tasks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage):
+        """Time a stage of the request (added up when entered several times)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(stage, time.perf_counter() - started)
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        metrics.observe('advisor_stage_seconds', seconds, stage=stage)
+
+    def add_task_time(self, task, seconds, model=None):
+        with self._lock:
+            stats = self.tasks.setdefault(task, _empty_task_stats())
+            stats['wall'] += seconds
+            if model:
+                stats['model'] = model
+        metrics.observe('advisor_task_seconds', seconds, task=task, model=model or 'unknown')
+
+    def add_llm_call(self, task, prompt_tokens, completion_tokens, failed=False, model=None, cached_tokens=0):
+        with self._lock:
+            stats = self.tasks.setdefault(task, _empty_task_stats())
+            if model:
+                stats['model'] = model
+            stats['llm_calls'] += 1
+            stats['prompt_tokens'] += prompt_tokens
+            stats['completion_tokens'] += completion_tokens
+            stats['cached_prompt_tokens'] += cached_tokens
+            if failed:
+                stats['retries'] += 1
+
+    def add_handoff(self, task, tokens, saved):
+        """Tokens of a task's output handed to the next task (None to keep them), and tokens left out of it"""
+        with self._lock:
+            stats = self.tasks.setdefault(task, _empty_task_stats())
+            if tokens is not None:
+                stats['handoff_tokens'] = tokens
+            stats['handoff_tokens_saved'] = stats.get('handoff_tokens_saved', 0) + saved
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        """JSON-friendly breakdown returned to clients as ``timings``"""
+        with self._lock:
+            tasks = {name: dict(stats, wall=round(stats['wall'], 4)) for name, stats in self.tasks.items()}
+            stages = {name: round(seconds, 4) for name, seconds in self.stages.items()}
+        return {
+            "total": round(self.elapsed(), 4),
+            "stages": stages,
+            "tasks": tasks,
+            "llm": dict(
+                {
+                    key: sum(stats[key] for stats in tasks.values())
+                    for key in ('llm_calls', 'retries', 'prompt_tokens', 'completion_tokens', 'cached_prompt_tokens')
+                },
+                prompt_tokens_saved=sum(stats.get('handoff_tokens_saved', 0) for stats in tasks.values()),
+            ),
+        }
+
+
+def current_trace():
+    """The trace of the request being served in this context, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request(name):
+    """
+    Collect instrumentation for one request. Nested calls reuse the trace
+    that is already active, so helpers can open one unconditionally.
+    """
+    existing = _current_trace.get()
+    if existing is not None:
+        yield existing
+        return
+
+    trace = RequestTrace(name)
+    token = _current_trace.set(trace)
+    sampler = profiler.start()
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        elapsed = trace.elapsed()
+        metrics.observe('advisor_request_seconds', elapsed, endpoint=name)
+        if sampler is not None:
+            profiler.finish(sampler, name, elapsed)
+
+
+@contextmanager
+def span(stage):
+    """Time a stage of the current request; a no-op outside of a request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    with trace.span(stage):
+        yield
+
+
+def record_llm_call(task, model, seconds, prompt_tokens, completion_tokens, failed=False, cached_tokens=0,
+                    prefix_tokens=0):
+    """
+    Account one LLM call in the metrics and the current request trace.
+    ``cached_tokens`` are prompt tokens the provider reports as served from
+    its cache; ``prefix_tokens`` the prompt tokens identical to the start of
+    the task's previous prompt, which a prefix cache can reuse.
+    """
+    task = task or 'unknown'
+    metrics.inc('llm_calls_total', task=task, model=model)
+    metrics.observe('llm_call_seconds', seconds, model=model)
+    if failed:
+        metrics.inc('llm_retries_total', task=task, model=model)
+    if prompt_tokens:
+        metrics.inc('llm_prompt_tokens_total', prompt_tokens, task=task, model=model)
+    if completion_tokens:
+        metrics.inc('llm_completion_tokens_total', completion_tokens, task=task, model=model)
+    if cached_tokens:
+        metrics.inc('llm_cached_prompt_tokens_total', cached_tokens, task=task, model=model)
+    if prefix_tokens:
+        metrics.inc('llm_prompt_prefix_tokens_total', prefix_tokens, task=task, model=model)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_llm_call(task, prompt_tokens, completion_tokens, failed=failed, model=model,
+                           cached_tokens=cached_tokens)
+
+
+class StackSampler(threading.Thread):
+    """Samples the call stack of one thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(name='advisor-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class SlowRequestProfiler:
+    """
+    Opt-in sampling profiler. A ``sample_rate`` fraction of requests are
+    profiled by sampling their thread's stack; when such a request takes
+    longer than ``slow_seconds`` the collapsed stacks are written to
+    ``directory`` (one ``.folded`` file per request, flamegraph-ready).
+    """
+
+    def __init__(self, sample_rate=0.0, slow_seconds=10.0, directory='.cache/profiles', interval=0.01):
+        self.configure(sample_rate, slow_seconds, directory, interval)
+
+    def configure(self, sample_rate=0.0, slow_seconds=10.0, directory='.cache/profiles', interval=0.01):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.directory = directory
+        self.interval = interval
+
+    def start(self):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        return sampler
+
+    def finish(self, sampler, name, elapsed):
+        sampler.stop()
+        if elapsed < self.slow_seconds or not sampler.stacks:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}-{int(time.time() * 1000)}-{elapsed:.1f}s.folded")
+        with open(path, 'w') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        metrics.inc('profiles_written_total')
+        return path
+
+
+# Disabled until configured (see server.py PROFILE_* settings)
+profiler = SlowRequestProfiler()
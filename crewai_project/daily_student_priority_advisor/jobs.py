@@ -0,0 +1,207 @@
+"""
+Background job execution with a bounded worker pool and queue
+"""
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import metrics
+
+metrics.describe('jobs_submitted_total', 'Jobs accepted into the queue')
+metrics.describe('jobs_rejected_total', 'Jobs rejected because the queue was full')
+metrics.describe('jobs_finished_total', 'Jobs that left the queue, by final status')
+metrics.describe('jobs_queued', 'Jobs waiting for a worker', 'gauge')
+metrics.describe('jobs_running', 'Jobs currently running', 'gauge')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# How often a job running in another process is re-read from the store
+STORE_POLL_INTERVAL = 0.5
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+class Job:
+    """A unit of work submitted to the JobManager"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if self.status == SUCCEEDED:
+            data["result"] = self.result
+        elif self.status == FAILED:
+            data["error"] = self.error
+        return data
+
+
+class JobManager:
+    """
+    Runs submitted callables on a fixed number of worker threads.
+
+    At most ``queue_depth`` jobs may wait for a worker; further submissions
+    raise JobQueueFull so the caller can apply backpressure. Jobs that have
+    not started yet can be cancelled. Finished jobs are kept for
+    ``result_ttl`` seconds so clients can poll for the result.
+
+    With a ``store`` (an SQLiteCache shared by the server processes), every
+    status change is also published there, so any worker process can report
+    on a job through lookup() and wait_for().
+    """
+
+    def __init__(self, workers=4, queue_depth=32, result_ttl=3600, store=None):
+        self.workers = max(1, int(workers))
+        self.queue_depth = max(0, int(queue_depth))
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='advisor-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._queued = 0
+        self._running = 0
+        self.store = store
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` and return its Job immediately"""
+        with self._lock:
+            self._purge_finished()
+            if self._queued >= self.queue_depth:
+                metrics.inc('jobs_rejected_total')
+                raise JobQueueFull(f"Job queue is full ({self.queue_depth} jobs waiting)")
+            job = Job()
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._update_gauges()
+        metrics.inc('jobs_submitted_total')
+        self._publish(job)
+        job.future = self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id):
+        """The Job if it was submitted to this process"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def lookup(self, job_id):
+        """Job state as a dict, from this process or the shared store, or None"""
+        job = self.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.store is None:
+            return None
+        value = self.store.get(job_id)
+        return json.loads(value) if value is not None else None
+
+    def wait_for(self, job_id, timeout):
+        """Like lookup(), but first wait up to ``timeout`` seconds for the job to finish"""
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+            return job.to_dict()
+
+        deadline = time.monotonic() + timeout
+        data = self.lookup(job_id)
+        while data is not None and data['status'] not in FINISHED and time.monotonic() < deadline:
+            time.sleep(min(STORE_POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            data = self.lookup(job_id)
+        return data
+
+    def cancel(self, job_id):
+        """Cancel a queued job. Returns False if it is unknown or already started."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            self._queued -= 1
+            self._update_gauges()
+        if job.future is not None:
+            job.future.cancel()
+        metrics.inc('jobs_finished_total', status=CANCELLED)
+        self._publish(job)
+        job.done.set()
+        return True
+
+    def wait(self, job, timeout=None):
+        """Block until the job finishes or the timeout expires"""
+        return job.done.wait(timeout)
+
+    def shutdown(self, wait=True, cancel_queued=True):
+        """Stop the workers; with ``cancel_queued=False`` queued jobs still run first"""
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_queued)
+
+    def _run(self, job, fn, args, kwargs):
+        with self._lock:
+            if job.status == CANCELLED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._queued -= 1
+            self._running += 1
+            self._update_gauges()
+        self._publish(job)
+        try:
+            job.result = fn(*args, **kwargs)
+            status = SUCCEEDED
+        except Exception as e:
+            job.error = str(e)
+            status = FAILED
+        with self._lock:
+            job.status = status
+            job.finished_at = time.time()
+            self._running -= 1
+            self._update_gauges()
+        metrics.inc('jobs_finished_total', status=status)
+        self._publish(job)
+        job.done.set()
+
+    def _publish(self, job):
+        """Share the job's current state with other processes"""
+        if self.store is None:
+            return
+        try:
+            self.store.put(job.id, json.dumps(job.to_dict()))
+        except (sqlite3.Error, TypeError, ValueError):
+            # Other processes just won't see this update; the owner still serves the job
+            pass
+
+    def _purge_finished(self):
+        """Forget finished jobs older than result_ttl (caller holds the lock)"""
+        if self.result_ttl is None:
+            return
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _update_gauges(self):
+        metrics.set('jobs_queued', self._queued)
+        metrics.set('jobs_running', self._running)
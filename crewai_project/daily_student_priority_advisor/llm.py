@@ -0,0 +1,124 @@
+"""
+LLM client used by the advisor agents
+"""
+import os
+import threading
+import time
+
+from crewai import LLM
+
+from .cassette import llm_cassette
+from .compaction import CHARS_PER_TOKEN
+from .defaults import ADVICE_TASK, PLAN_TASK, TASK_AGENTS
+from .instrumentation import record_llm_call
+from .resilience import llm_resilience
+
+
+def _token_totals(callbacks):
+    """Prompt/completion/cached prompt totals from CrewAI's token counter among the callbacks"""
+    for callback in callbacks or []:
+        process = getattr(callback, 'token_cost_process', None)
+        if process is not None and hasattr(process, 'get_summary'):
+            summary = process.get_summary()
+            return summary.prompt_tokens, summary.completion_tokens, getattr(summary, 'cached_prompt_tokens', 0) or 0
+    return None
+
+
+def _estimate_tokens(value):
+    if isinstance(value, list):
+        value = ' '.join(str(message.get('content', '')) for message in value if isinstance(message, dict))
+    return len(str(value or '')) // CHARS_PER_TOKEN
+
+
+def _prompt_text(messages):
+    if isinstance(messages, list):
+        return '\n'.join(f"{message.get('role')}: {message.get('content')}"
+                         for message in messages if isinstance(message, dict))
+    return str(messages or '')
+
+
+class PromptPrefixes:
+    """
+    The start of the last prompt sent for each task and model, to measure
+    how much of every prompt repeats it: the static prefix (agent role, goal
+    and backstory, task instructions) that the provider's context cache can
+    reuse. Only the first ``max_chars`` of each prompt are compared.
+    """
+
+    def __init__(self, max_chars=16384):
+        self.max_chars = max_chars
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def shared_tokens(self, task, model, messages):
+        """Tokens at the start of this prompt identical to the previous prompt of the task and model"""
+        text = _prompt_text(messages)[:self.max_chars]
+        with self._lock:
+            previous = self._last.get((task, model))
+            self._last[(task, model)] = text
+        if not previous:
+            return 0
+        return len(os.path.commonprefix([previous, text])) // CHARS_PER_TOKEN
+
+
+prompt_prefixes = PromptPrefixes()
+
+
+class InstrumentedLLM(LLM):
+    """
+    CrewAI LLM that records every call (wall time, tokens, failures) in the
+    metrics registry and the current request trace, and sends it through
+    the rate limiter, retries, hedging and circuit breaker of the calling
+    agent (see resilience.py). With an LLM cassette in replay mode, recorded
+    responses are returned at once, without the resilience layer (see
+    cassette.py). The prompt tokens shared with the task's previous prompt
+    (see PromptPrefixes) and those the provider served from its cache are
+    recorded too.
+    """
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, **kwargs):
+        # ``task_name`` labels calls made outside a crew task
+        task = kwargs.pop('task_name', None) or getattr(kwargs.get('from_task'), 'name', None)
+        prefix_tokens = prompt_prefixes.shared_tokens(task, self.model, messages)
+
+        if llm_cassette.enabled:
+            started = time.perf_counter()
+            response = llm_cassette.replay(task, messages)
+            if response is not None:
+                record_llm_call(task, self.model, time.perf_counter() - started,
+                                _estimate_tokens(messages), _estimate_tokens(response), prefix_tokens=prefix_tokens)
+                return response
+
+        def attempt():
+            before = _token_totals(callbacks)
+            started = time.perf_counter()
+            try:
+                response = self._complete(messages, tools, callbacks, available_functions, **kwargs)
+            except Exception:
+                record_llm_call(task, self.model, time.perf_counter() - started, 0, 0, failed=True)
+                raise
+
+            after = _token_totals(callbacks)
+            if before is not None and after is not None and after != before:
+                prompt_tokens, completion_tokens, cached_tokens = (now - then for now, then in zip(after, before))
+            else:
+                prompt_tokens, completion_tokens, cached_tokens = _estimate_tokens(messages), _estimate_tokens(response), 0
+            seconds = time.perf_counter() - started
+            record_llm_call(task, self.model, seconds, prompt_tokens, completion_tokens,
+                            cached_tokens=cached_tokens, prefix_tokens=prefix_tokens)
+            if llm_cassette.enabled:
+                llm_cassette.record(task, self.model, messages, response, seconds)
+            return response
+
+        agent = TASK_AGENTS.get(task) or (TASK_AGENTS[ADVICE_TASK] if task == PLAN_TASK else None)
+        return llm_resilience.call(agent, self.model, attempt)
+
+    def _complete(self, messages, tools, callbacks, available_functions, **kwargs):
+        """Send the request to the provider (overridden by stand-in LLMs)"""
+        return super().call(
+            messages,
+            tools=tools,
+            callbacks=callbacks,
+            available_functions=available_functions,
+            **kwargs,
+        )
@@ -0,0 +1,114 @@
+"""
+Lightweight in-process metrics exposed in Prometheus text format
+"""
+import threading
+
+# Default histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+        self._meta = {}
+
+    def describe(self, name, help_text, metric_type='counter'):
+        """Register help text and type for a metric"""
+        with self._lock:
+            self._meta[name] = (metric_type, help_text)
+
+    def inc(self, name, value=1, **labels):
+        """Increment a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge to an absolute value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        """Record one observation in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': tuple(buckets),
+                    'counts': [0] * len(buckets),
+                    'sum': 0.0,
+                    'count': 0,
+                }
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def get(self, name, **labels):
+        """Read the current value of a metric"""
+        with self._lock:
+            return self._values.get((name, tuple(sorted(labels.items()))), 0)
+
+    def snapshot(self):
+        """Return a plain dict of all metric values, useful for JSON output"""
+        with self._lock:
+            items = list(self._values.items())
+        result = {}
+        for (name, labels), value in items:
+            if labels:
+                label_str = ','.join(f'{k}={v}' for k, v in labels)
+                result[f'{name}{{{label_str}}}'] = value
+            else:
+                result[name] = value
+        return result
+
+    def render(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            items = sorted(self._values.items())
+            histograms = sorted(
+                (key, dict(h, counts=list(h['counts']))) for key, h in self._histograms.items()
+            )
+            meta = dict(self._meta)
+
+        lines = []
+        seen = set()
+
+        def header(name, default_type):
+            if name in seen:
+                return
+            seen.add(name)
+            metric_type, help_text = meta.get(name, (default_type, ''))
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        def label_text(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+        for (name, labels), value in items:
+            header(name, 'untyped')
+            lines.append(f'{name}{label_text(labels)} {value}')
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            for bound, count in zip(histogram['buckets'], histogram['counts']):
+                lines.append(f'{name}_bucket{label_text(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_bucket{label_text(labels, [("le", "+Inf")])} {histogram["count"]}')
+            lines.append(f'{name}_sum{label_text(labels)} {histogram["sum"]}')
+            lines.append(f'{name}_count{label_text(labels)} {histogram["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry shared by the server and the crew helpers
+metrics = MetricsRegistry()
@@ -0,0 +1,118 @@
+"""
+In-memory PDF text extraction for the PDF planning reader
+"""
+import io
+import re
+
+from .metrics import metrics
+
+metrics.describe('pdf_pages_extracted_total', 'PDF pages converted to text')
+metrics.describe('pdf_bytes_ingested_total', 'PDF bytes read for text extraction')
+metrics.describe('pdf_text_chars_total', 'Characters of compact text passed to the PDF reader')
+metrics.describe('pdf_text_fallbacks_total', 'PDFs without extractable text, sent to the reader as a file')
+
+# Lines this close to the top or bottom of a page are treated as header/footer
+HEADER_FOOTER_LINES = 3
+
+_PAGE_NUMBER = re.compile(r'^(page\s*)?\d{1,4}(\s*(/|of)\s*\d{1,4})?$', re.IGNORECASE)
+_SPACES = re.compile(r'[ \t\u00a0]+')
+
+
+def iter_page_text(pdf_bytes):
+    """
+    Yield the cleaned text of each page, one page at a time.
+
+    Whitespace is collapsed, bare page numbers are dropped, and header/footer
+    lines already seen on an earlier page (course titles, university names,
+    confidentiality notices, ...) are only kept the first time.
+    """
+    # Imported on the first PDF so that starting the server does not load pypdf
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(pdf_bytes))
+    metrics.inc('pdf_bytes_ingested_total', len(pdf_bytes))
+    seen_edges = set()
+    for page in reader.pages:
+        try:
+            text = page.extract_text() or ''
+        except Exception:
+            text = ''
+        metrics.inc('pdf_pages_extracted_total')
+
+        lines = [_SPACES.sub(' ', line).strip() for line in text.splitlines()]
+        lines = [line for line in lines if line and not _PAGE_NUMBER.match(line)]
+        kept = []
+        for index, line in enumerate(lines):
+            at_edge = index < HEADER_FOOTER_LINES or index >= len(lines) - HEADER_FOOTER_LINES
+            if at_edge:
+                key = line.lower()
+                if key in seen_edges:
+                    continue
+                seen_edges.add(key)
+            kept.append(line)
+        yield '\n'.join(kept)
+
+
+def extract_pdf_text(pdf_bytes, max_chars=None):
+    """
+    Return compact plain text for a PDF, or '' when it has no text layer
+    (e.g. a scanned document) or cannot be parsed. Text beyond ``max_chars``
+    is cut at a page boundary where possible.
+    """
+    parts = []
+    total = 0
+    try:
+        for number, page_text in enumerate(iter_page_text(pdf_bytes), start=1):
+            if not page_text:
+                continue
+            chunk = f"[Page {number}]\n{page_text}"
+            if max_chars and total + len(chunk) > max_chars:
+                remaining = max_chars - total
+                if remaining > 0 and not parts:
+                    parts.append(chunk[:remaining])
+                parts.append("[Remaining pages omitted]")
+                break
+            parts.append(chunk)
+            total += len(chunk) + 2
+    except Exception:
+        parts = []
+
+    text = '\n\n'.join(parts)
+    if text:
+        metrics.inc('pdf_text_chars_total', len(text))
+    else:
+        metrics.inc('pdf_text_fallbacks_total')
+    return text
+
+
+def split_pdf_text(pdf_bytes, pages_per_chunk=4, max_chars=None):
+    """
+    Return the PDF's compact text as a list of chunks of at most
+    ``pages_per_chunk`` pages and ``max_chars`` characters each, so every
+    chunk fits in one extraction prompt. Returns [] when there is no text.
+    """
+    chunks = []
+    current = []
+    size = 0
+    try:
+        for number, page_text in enumerate(iter_page_text(pdf_bytes), start=1):
+            if not page_text:
+                continue
+            page = f"[Page {number}]\n{page_text}"
+            if max_chars and len(page) > max_chars:
+                page = page[:max_chars]
+            if current and (len(current) >= pages_per_chunk or (max_chars and size + len(page) > max_chars)):
+                chunks.append('\n\n'.join(current))
+                current, size = [], 0
+            current.append(page)
+            size += len(page) + 2
+    except Exception:
+        return []
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    if chunks:
+        metrics.inc('pdf_text_chars_total', sum(len(chunk) for chunk in chunks))
+    else:
+        metrics.inc('pdf_text_fallbacks_total')
+    return chunks
@@ -0,0 +1,488 @@
+"""
+Stage orchestration for the advisor crew
+"""
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .chunked_extraction import extract_chunks
+from .compaction import (DEFAULT_TOKEN_BUDGETS, compact_json, compact_output, estimate_tokens, fit_to_budget,
+                         record_handoff)
+from .defaults import ADVICE_TASK, DECISION_TASK, EXTRACTION_TASK, PLAN_TASK, TASK_AGENTS, TEMPLATE_MODEL
+from .instrumentation import current_trace, span, trace_request
+from .metrics import metrics
+from .pdf_text import extract_pdf_text, split_pdf_text
+from .progress import StageTracker, parse_task_output
+from .recurrence import schedule_features
+from .resilience import UpstreamUnavailable, llm_resilience
+from .scoring import DEFAULT_TIE_MARGIN, parse_date, score_priorities, template_recommendation
+from .study_plan import build_study_plan, plan_digest, plan_summary
+
+metrics.describe('priority_decisions_total', 'Priority decisions by how they were made (llm, local, local_fallback, degraded)')
+metrics.describe('llm_fallbacks_total', 'Stages answered without the LLM because its model was unavailable')
+metrics.describe('study_plans_total', 'Study plans built, by how they were phrased (template or llm)')
+metrics.describe('study_plan_seconds', 'Time to build one study plan, without phrasing', 'histogram')
+metrics.describe('batch_entries_total', 'Entries processed by batch runs, by outcome')
+metrics.describe('batch_extractions_shared_total', 'Batch entries that reused another entry\'s PDF extraction')
+
+PRIORITY_MODES = ('llm', 'local')
+EXTRACTION_MODES = ('single', 'chunked')
+
+PLAN_PROMPT = (
+    "You are a friendly student success coach. Summarize this study plan for the student "
+    "in 2-3 encouraging sentences: what to focus on first, how the week is spread out, and "
+    "anything that does not fit. Plain text only."
+)
+
+
+class AdvisorPipeline:
+    """
+    Runs the three advisor stages on pooled crews, skipping what is already
+    known: cached extractions skip the PDF reader, and in ``local`` priority
+    mode the NumPy scorer replaces the decision agent unless its top scores
+    are too close to call, in which case the LLM decides as usual.
+
+    In ``chunked`` extraction mode, PDFs longer than ``chunk_pages`` pages
+    are split into chunks extracted in parallel and merged.
+
+    With a ``recommendation_cache``, the advice stage runs on its own and is
+    skipped when an equivalent priority analysis was already advised on.
+    An advisor routed to the ``template`` model (config/agents.yaml) is
+    replaced by a recommendation built from the priority analysis.
+
+    Task outputs are handed to the next task as compact JSON, trimmed to the
+    ``token_budgets`` of the task that produced them (see compaction.py).
+    """
+
+    def __init__(self, crew_pool, extraction_cache, priority_mode='llm', tie_margin=DEFAULT_TIE_MARGIN,
+                 max_pdf_chars=None, extraction_mode='single', chunk_pages=4, extraction_parallelism=4,
+                 recommendation_cache=None, token_budgets=None):
+        if extraction_mode not in EXTRACTION_MODES:
+            raise ValueError(f"Unknown extraction mode {extraction_mode!r}, expected one of {EXTRACTION_MODES}")
+        self.crew_pool = crew_pool
+        self.extraction_cache = extraction_cache
+        self.priority_mode = self._check_mode(priority_mode)
+        self.tie_margin = tie_margin
+        self.max_pdf_chars = max_pdf_chars
+        self.extraction_mode = extraction_mode
+        self.chunk_pages = max(1, int(chunk_pages))
+        self.extraction_parallelism = max(1, int(extraction_parallelism))
+        self.recommendation_cache = recommendation_cache
+        self.token_budgets = dict(DEFAULT_TOKEN_BUDGETS, **(token_budgets or {}))
+
+    @staticmethod
+    def _check_mode(mode):
+        if mode not in PRIORITY_MODES:
+            raise ValueError(f"Unknown priority mode {mode!r}, expected one of {PRIORITY_MODES}")
+        return mode
+
+    def run(self, pdf_bytes, inputs, priority_mode=None, on_stage=None):
+        """
+        Run the pipeline for one PDF. ``inputs`` are crew inputs from
+        build_inputs() and are updated in place with the stage data used.
+        Returns a dict with the final ``result``, the full ``planning_data``
+        and how the result was produced.
+        """
+        mode = self._check_mode(priority_mode or self.priority_mode)
+        tracker = StageTracker(on_stage) if on_stage else None
+
+        lookup = self._lookup_extraction(pdf_bytes)
+        cache_key, cached = lookup
+        if mode == 'llm' and self.extraction_mode == 'single' and cached is None:
+            if self.recommendation_cache is None and not self.template_advice:
+                # Nothing to skip: run all three tasks on one crew checkout
+                result, outputs = self._kickoff_with_pdf(pdf_bytes, inputs, None, tracker)
+                self.extraction_cache.put(cache_key, outputs[EXTRACTION_TASK])
+                metrics.inc('priority_decisions_total', mode='llm')
+                return self._with_analysis({
+                    "result": result,
+                    "planning_data": outputs[EXTRACTION_TASK],
+                    "extraction_cached": False,
+                    "priority_mode": 'llm',
+                    "recommendation_cached": False,
+                }, outputs[DECISION_TASK])
+            # Stop before the advice task, which may be answered from the cache
+            _, outputs = self._kickoff_with_pdf(pdf_bytes, inputs, [EXTRACTION_TASK, DECISION_TASK], tracker)
+            self.extraction_cache.put(cache_key, outputs[EXTRACTION_TASK])
+            metrics.inc('priority_decisions_total', mode='llm')
+            result, recommendation_cached = self.advise(outputs[DECISION_TASK], inputs, tracker,
+                                                        planning_data=outputs[EXTRACTION_TASK])
+            return self._with_analysis({
+                "result": result,
+                "planning_data": outputs[EXTRACTION_TASK],
+                "extraction_cached": False,
+                "priority_mode": 'llm',
+                "recommendation_cached": recommendation_cached,
+            }, outputs[DECISION_TASK])
+
+        planning_data, extraction_cached = self.extract(pdf_bytes, inputs, tracker, lookup=lookup)
+        outcome = self.decide(planning_data, inputs, mode, tracker)
+        outcome["extraction_cached"] = extraction_cached
+        return outcome
+
+    def _lookup_extraction(self, pdf_bytes):
+        """``(cache_key, planning_data)`` for a PDF, with planning_data None on a cache miss"""
+        with span('extraction_cache'):
+            cache_key = self.extraction_cache.key_for(pdf_bytes)
+            return cache_key, self.extraction_cache.get(cache_key)
+
+    def extract(self, pdf_bytes, inputs=None, tracker=None, lookup=None):
+        """
+        Return ``(planning_data, cached)`` for a PDF, running only the
+        extraction task on a cache miss. ``lookup`` is the result of an
+        earlier _lookup_extraction() for the PDF, so the cache is read once.
+        """
+        cache_key, planning_data = lookup or self._lookup_extraction(pdf_bytes)
+        if planning_data is not None:
+            if tracker:
+                tracker.emit(EXTRACTION_TASK, planning_data, 0.0, cached=True)
+                tracker.restart()
+            return planning_data, True
+
+        inputs = dict(inputs) if inputs is not None else {}
+        pdf_text = None
+        if self.extraction_mode == 'chunked':
+            with span('pdf_text'):
+                chunks = split_pdf_text(pdf_bytes, self.chunk_pages, self.max_pdf_chars)
+            if len(chunks) > 1:
+                started = time.perf_counter()
+                planning_data = extract_chunks(self.crew_pool, chunks, inputs, self.extraction_parallelism)
+                self.extraction_cache.put(cache_key, planning_data)
+                if tracker:
+                    tracker.emit(EXTRACTION_TASK, planning_data, time.perf_counter() - started)
+                    tracker.restart()
+                return planning_data, False
+            pdf_text = chunks[0] if chunks else ''
+
+        _, outputs = self._kickoff_with_pdf(pdf_bytes, inputs, [EXTRACTION_TASK], tracker, pdf_text=pdf_text)
+        planning_data = outputs[EXTRACTION_TASK]
+        self.extraction_cache.put(cache_key, planning_data)
+        return planning_data, False
+
+    def decide(self, planning_data, inputs, priority_mode=None, tracker=None, tasks=None):
+        """
+        Run the priority decision and advice stages from extracted planning
+        data. ``tasks`` replaces the request's single new task with a list of
+        the student's own tasks (see scoring.collect_items).
+        """
+        mode = self._check_mode(priority_mode or self.priority_mode)
+        inputs['planning_context'] = self._handoff(EXTRACTION_TASK, planning_data, inputs)
+        inputs['schedule_features'] = self._schedule_features(planning_data, inputs)
+
+        degraded = self._upstream_down(DECISION_TASK, 'local')
+        if mode == 'local' or degraded:
+            outcome = self._decide_locally(planning_data, inputs, tracker, tasks, force=degraded)
+            if outcome is not None:
+                return outcome
+            # Too close to call locally: let the decision agent weigh the options
+            metrics.inc('priority_decisions_total', mode='local_fallback')
+        else:
+            metrics.inc('priority_decisions_total', mode='llm')
+
+        try:
+            return self._decide_with_llm(planning_data, inputs, tracker, tasks)
+        except UpstreamUnavailable:
+            if llm_resilience.fallback(TASK_AGENTS[DECISION_TASK]) != 'local':
+                raise
+            return self._decide_locally(planning_data, inputs, tracker, tasks, force=True)
+
+    @staticmethod
+    def _schedule_features(planning_data, inputs):
+        """The decision task's precomputed schedule load (see recurrence.schedule_features)"""
+        parsed = parse_task_output(planning_data)
+        if not isinstance(parsed, dict):
+            return inputs.get('schedule_features')
+        with span('schedule_features'):
+            return compact_json(schedule_features(parsed, parse_date(inputs.get('current_date'))))
+
+    def _decide_locally(self, planning_data, inputs, tracker, tasks, force=False):
+        """
+        Score priorities with the local scorer. Returns None when the top
+        scores are too close to call, unless ``force`` is set because the
+        decision agent's model is unavailable.
+        """
+        started = time.perf_counter()
+        with span('local_scoring'):
+            analysis = score_priorities(
+                parse_task_output(planning_data),
+                current_date=inputs.get('current_date'),
+                module_coefficient=inputs.get('module_coefficient'),
+                task_deadline=inputs.get('task_deadline'),
+                confidence_level=inputs.get('confidence_level'),
+                new_task_description=inputs.get('new_task_description') if tasks is None else '',
+                tie_margin=self.tie_margin,
+                tasks=tasks,
+            )
+        if analysis['needsReview'] and not force:
+            return None
+
+        if force:
+            metrics.inc('priority_decisions_total', mode='degraded')
+            metrics.inc('llm_fallbacks_total', task=DECISION_TASK, fallback='local')
+        else:
+            metrics.inc('priority_decisions_total', mode='local')
+        if tracker:
+            tracker.emit(DECISION_TASK, analysis, time.perf_counter() - started)
+            tracker.restart()
+        result, recommendation_cached = self.advise(analysis, inputs, tracker, planning_data=planning_data)
+        outcome = {
+            "result": result,
+            "planning_data": planning_data,
+            "priority_mode": 'local',
+            "priority_analysis": analysis,
+            "recommendation_cached": recommendation_cached,
+        }
+        if force:
+            outcome["degraded"] = True
+        return outcome
+
+    def _decide_with_llm(self, planning_data, inputs, tracker, tasks):
+        parsed = parse_task_output(planning_data)
+        considered = planning_data
+        if tasks is not None and isinstance(parsed, dict):
+            # The decision agent only sees the planning data, so list the student's tasks there
+            considered = dict(parsed, studentTasks=tasks)
+            inputs['planning_context'] = self._handoff(EXTRACTION_TASK, considered, inputs)
+
+        if self.recommendation_cache is None and not self.template_advice:
+            result, outputs = self._kickoff(inputs, [DECISION_TASK, ADVICE_TASK], tracker)
+            recommendation_cached = False
+        else:
+            _, outputs = self._kickoff(inputs, [DECISION_TASK], tracker)
+            result, recommendation_cached = self.advise(outputs[DECISION_TASK], inputs, tracker,
+                                                        planning_data=considered)
+        return self._with_analysis({
+            "result": result,
+            "planning_data": planning_data,
+            "priority_mode": 'llm',
+            "recommendation_cached": recommendation_cached,
+        }, outputs[DECISION_TASK])
+
+    def advise(self, priority_analysis, inputs, tracker=None, planning_data=None):
+        """
+        Run the advice stage for a priority analysis (dict or task output).
+        Returns ``(result, cached)``; a cached result is the recommendation
+        text with this request's task name, student name and dates filled in.
+        ``planning_data`` is what the analysis was made from; the
+        recommendation cache finds the top task's deadline and module there.
+        """
+        if self.template_advice:
+            return self._template_advice(priority_analysis, inputs, tracker), False
+        inputs['priority_analysis'] = self._handoff(DECISION_TASK, priority_analysis, inputs)
+        cache = self.recommendation_cache
+        if cache is not None:
+            with span('recommendation_cache'):
+                recommendation = cache.lookup(priority_analysis, inputs, planning_data)
+            if recommendation is not None:
+                if tracker:
+                    tracker.emit(ADVICE_TASK, recommendation, 0.0, cached=True)
+                return recommendation, True
+
+        if self._upstream_down(ADVICE_TASK, 'template'):
+            return self._template_advice(priority_analysis, inputs, tracker, fallback=True), False
+        try:
+            result, _ = self._kickoff(inputs, [ADVICE_TASK], tracker)
+        except UpstreamUnavailable:
+            if llm_resilience.fallback(TASK_AGENTS[ADVICE_TASK]) != 'template':
+                raise
+            return self._template_advice(priority_analysis, inputs, tracker, fallback=True), False
+        if cache is not None:
+            cache.store(priority_analysis, inputs, result.raw, planning_data)
+        return result, False
+
+    @property
+    def template_advice(self):
+        """True when the advisor agent is routed to the template model (see config/agents.yaml)"""
+        return self.crew_pool.model_for(ADVICE_TASK) == TEMPLATE_MODEL
+
+    def _upstream_down(self, task_name, fallback):
+        """True when the task's agent falls back to ``fallback`` and its model's circuit is open"""
+        return (llm_resilience.fallback(TASK_AGENTS[task_name]) == fallback
+                and llm_resilience.degraded(self.crew_pool.model_for(task_name)))
+
+    @staticmethod
+    def _template_advice(priority_analysis, inputs, tracker, fallback=False):
+        """
+        Deterministic advice built from the priority analysis, for a template
+        advisor or as the ``fallback`` when the advisor's model is unavailable
+        """
+        started = time.perf_counter()
+        analysis = parse_task_output(priority_analysis)
+        recommendation = compact_json(template_recommendation(
+            analysis if isinstance(analysis, dict) else {}, inputs.get('student_name', ''),
+        ))
+        duration = time.perf_counter() - started
+        if fallback:
+            metrics.inc('llm_fallbacks_total', task=ADVICE_TASK, fallback='template')
+        trace = current_trace()
+        if trace is not None:
+            trace.add_task_time(ADVICE_TASK, duration, model=TEMPLATE_MODEL)
+        if tracker:
+            tracker.emit(ADVICE_TASK, recommendation, duration)
+        return recommendation
+
+    def plan(self, planning_data, inputs, days=7, tasks=None, phrase=False):
+        """
+        Build a multi-day study plan from planning data without the crew
+        (see study_plan.py). Returns ``(plan, summary)``: the summary is
+        phrased by the advisor's model when ``phrase`` is set, otherwise (or
+        when that model is unavailable) it is a template.
+        """
+        started = time.perf_counter()
+        with span('study_plan'):
+            plan = build_study_plan(
+                parse_task_output(planning_data),
+                start_date=inputs.get('current_date'),
+                days=days,
+                tasks=tasks,
+                new_task_description=inputs.get('new_task_description') if tasks is None else '',
+                task_deadline=inputs.get('task_deadline'),
+                module_coefficient=inputs.get('module_coefficient'),
+                confidence_level=inputs.get('confidence_level'),
+            )
+        metrics.observe('study_plan_seconds', time.perf_counter() - started)
+        if not phrase or self.template_advice:
+            metrics.inc('study_plans_total', phrasing='template')
+            return plan, plan_summary(plan)
+
+        llm = self.crew_pool.llms[TASK_AGENTS[ADVICE_TASK]]
+        messages = [
+            {"role": "system", "content": PLAN_PROMPT},
+            {"role": "user", "content": compact_json(dict(plan_digest(plan), student=inputs.get('student_name')))},
+        ]
+        try:
+            with span('phrase_plan'):
+                summary = llm.call(messages, task_name=PLAN_TASK)
+        except UpstreamUnavailable:
+            metrics.inc('llm_fallbacks_total', task=PLAN_TASK, fallback='template')
+            metrics.inc('study_plans_total', phrasing='template')
+            return plan, plan_summary(plan)
+        metrics.inc('study_plans_total', phrasing='llm')
+        return plan, str(summary).strip()
+
+    def run_batch(self, entries, concurrency=4, priority_mode=None):
+        """
+        Process many entries and yield one ``(entry_id, outcome_or_exception)``
+        pair per entry, in completion order.
+
+        Each entry is a dict with ``id``, crew ``inputs`` and either
+        ``pdf_bytes`` or ``planning_data``. Identical PDFs are extracted once
+        and shared between entries; decision and advice stages run on up to
+        ``concurrency`` threads. Entries are submitted as workers free up so
+        only a bounded number of results are held at any time.
+        """
+        extractions = {}
+        lock = threading.Lock()
+
+        def planning_data_for(entry):
+            if entry.get('planning_data') is not None:
+                planning_data = entry['planning_data']
+                return planning_data if isinstance(planning_data, str) else compact_json(planning_data)
+
+            cache_key = self.extraction_cache.key_for(entry['pdf_bytes'])
+            with lock:
+                future = extractions.get(cache_key)
+                owner = future is None
+                if owner:
+                    future = extractions[cache_key] = Future()
+            if owner:
+                try:
+                    future.set_result(self.extract(entry['pdf_bytes'], entry['inputs'])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            else:
+                metrics.inc('batch_extractions_shared_total')
+            return future.result()
+
+        def process(entry):
+            try:
+                with trace_request('batch') as trace:
+                    planning_data = planning_data_for(entry)
+                    outcome = self.decide(planning_data, entry['inputs'], priority_mode)
+                    outcome['timings'] = trace.summary()
+                metrics.inc('batch_entries_total', outcome='success')
+                return entry['id'], outcome
+            except Exception as e:
+                metrics.inc('batch_entries_total', outcome='error')
+                return entry['id'], e
+
+        concurrency = max(1, int(concurrency))
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='advisor-batch') as executor:
+            pending = set()
+            for entry in entries:
+                if len(pending) >= concurrency:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(executor.submit(process, entry))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def _handoff(self, task_name, output, inputs):
+        """A task's output as the next task's input: compact JSON within the task's token budget"""
+        return fit_to_budget(task_name, output, self.token_budgets.get(task_name), inputs.get('current_date'))
+
+    def _kickoff(self, inputs, tasks, tracker):
+        """
+        Run crew tasks, handing each task's output to the next one as compact
+        JSON within its token budget. Each task reads only the previous
+        task's output, so earlier outputs are dropped from the crew's context
+        once handed on. Returns ``(result, outputs)`` where ``outputs`` maps
+        each task name to its full (untrimmed) compact output.
+        """
+        outputs = {}
+        handed = []
+
+        def on_task(task_output):
+            # The crew joins every earlier output into the next task's context
+            for earlier in handed:
+                if earlier.raw:
+                    record_handoff(earlier.name, None, estimate_tokens(earlier.raw))
+                    earlier.raw = ''
+            handed[:] = [task_output]
+            outputs[task_output.name] = task_output.raw = compact_output(task_output.raw)
+            if tracker:
+                tracker(task_output)
+            if task_output.name in self.token_budgets:
+                # The crew builds the next task's context from this output
+                task_output.raw = self._handoff(task_output.name, task_output.raw, inputs)
+
+        result = self.crew_pool.kickoff(inputs, tasks=tasks, task_callback=on_task)
+        return result, outputs
+
+    @staticmethod
+    def _with_analysis(outcome, priority_analysis):
+        """Add the decision agent's analysis to an outcome when it is structured"""
+        parsed = parse_task_output(priority_analysis)
+        if isinstance(parsed, dict):
+            outcome["priority_analysis"] = parsed
+        return outcome
+
+    def _kickoff_with_pdf(self, pdf_bytes, inputs, tasks, tracker, pdf_text=None):
+        """
+        Run crew tasks that read the PDF (see _kickoff for the return value).
+        The PDF's text is extracted in memory (unless already given) and
+        passed inline as ``pdf_text``; only PDFs without a text layer are
+        written to a temporary file for the reader's file tool.
+        """
+        if pdf_text is None:
+            with span('pdf_text'):
+                pdf_text = extract_pdf_text(pdf_bytes, max_chars=self.max_pdf_chars)
+        if pdf_text:
+            inputs['pdf_text'] = pdf_text
+            return self._kickoff(inputs, tasks, tracker)
+
+        # Create a temporary file to save the uploaded PDF
+        with span('file_save'), tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
+            tmp_file.write(pdf_bytes)
+            tmp_filename = tmp_file.name
+        try:
+            inputs['pdf_file_path'] = tmp_filename
+            return self._kickoff(inputs, tasks, tracker)
+        finally:
+            # Clean up the temporary file
+            os.unlink(tmp_filename)
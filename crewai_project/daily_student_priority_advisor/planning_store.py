@@ -0,0 +1,211 @@
+"""
+Persistent, date-indexed store of each student's extracted planning items
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+
+from .caching import SQLiteConnection
+from .metrics import metrics
+from .progress import parse_task_output
+from .scoring import parse_date
+
+metrics.describe('planning_store_upserts_total', 'Planning items written to the planning store')
+metrics.describe('planning_store_query_seconds', 'Time to answer one planning store query', 'histogram')
+
+# Planning data categories stored, with the item type and the field holding each item's date
+CATEGORIES = (
+    ('exams', 'exam', 'date'),
+    ('assignments', 'assignment', 'deadline'),
+    ('classes', 'class', None),
+    ('commitments', 'commitment', None),
+)
+ITEM_TYPES = ('exam', 'assignment', 'task', 'class', 'commitment')
+MAX_QUERY_ITEMS = 500
+
+
+def _item_key(item_type, name, module):
+    """Stable identity of an item across extractions, so a moved deadline updates the same row"""
+    text = '\0'.join((item_type, str(name or '').strip().lower(), str(module or '').strip().lower()))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def planning_items(planning_data, tasks=None):
+    """
+    Flatten planning data (dict or task output) and the student's own
+    ``tasks`` into rows of ``(item_key, type, name, module, date, weight, data)``
+    """
+    planning_data = parse_task_output(planning_data)
+    planning_data = planning_data if isinstance(planning_data, dict) else {}
+    rows = {}
+    for category, item_type, date_field in CATEGORIES:
+        for item in planning_data.get(category) or []:
+            if not isinstance(item, dict):
+                continue
+            name = item.get('name') or item_type.capitalize()
+            module = item.get('module')
+            date = parse_date(item.get(date_field)) if date_field else None
+            rows[_item_key(item_type, name, module)] = (
+                item_type, name, module, date.isoformat() if date else None, _weight(item.get('weight')), item,
+            )
+    for task in tasks or []:
+        if not task.get('description'):
+            continue
+        date = parse_date(task.get('deadline'))
+        rows[_item_key('task', task.get('id'), None)] = (
+            'task', task['description'], None, date.isoformat() if date else None, None, task,
+        )
+    return [(key,) + row for key, row in rows.items()]
+
+
+def _weight(value):
+    try:
+        return float(str(value).strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return None
+
+
+class PlanningStore:
+    """
+    Every exam, assignment, class, commitment and task extracted for a
+    student, one SQLite row per item with indexes on (student, date),
+    (student, type, date) and (student, module, date), so "what is due in the
+    next 3 days" is an index range scan that never touches the crew.
+
+    upsert() replaces the items of one document in a single transaction;
+    items of the student's other documents are kept. Students not updated
+    for ``ttl`` seconds are dropped. Like SQLiteCache, each process opens
+    its own connection on first use (see caching.SQLiteConnection).
+    """
+
+    def __init__(self, path, table='planning_items', ttl=None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._db = SQLiteConnection(path, schema=(
+            f'CREATE TABLE IF NOT EXISTS {table} ('
+            'student_id TEXT NOT NULL, item_key TEXT NOT NULL, document_id TEXT NOT NULL, '
+            'type TEXT NOT NULL, name TEXT NOT NULL, module TEXT, module_key TEXT, date TEXT, '
+            'weight REAL, data TEXT NOT NULL, updated_at REAL NOT NULL, '
+            'PRIMARY KEY (student_id, item_key))',
+        ) + tuple(
+            f'CREATE INDEX IF NOT EXISTS {table}_{name} ON {table} ({columns})'
+            for name, columns in (
+                ('date', 'student_id, date'),
+                ('type', 'student_id, type, date'),
+                ('module', 'student_id, module_key, date'),
+                ('document', 'student_id, document_id, updated_at'),
+                ('updated', 'updated_at'),
+            )
+        ))
+
+    @property
+    def _lock(self):
+        return self._db.lock
+
+    @property
+    def _conn(self):
+        """This process's connection (caller holds the lock)"""
+        return self._db.get()
+
+    def upsert(self, student_id, doc_id, planning_data, tasks=None):
+        """
+        Store the items of one document's planning data and the student's
+        tasks; returns how many. With ``planning_data`` None only the tasks
+        are replaced.
+        """
+        now = time.time()
+        rows = [
+            (student_id, key, doc_id, item_type, name, module, str(module).strip().lower() if module else None,
+             date, weight, json.dumps(data, ensure_ascii=False), now)
+            for key, item_type, name, module, date, weight, data in planning_items(planning_data, tasks)
+        ]
+        with self._lock:
+            conn = self._conn
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO {self.table} (student_id, item_key, document_id, type, name, module, '
+                    'module_key, date, weight, data, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (student_id, item_key) DO UPDATE SET document_id = excluded.document_id, '
+                    'type = excluded.type, name = excluded.name, module = excluded.module, '
+                    'module_key = excluded.module_key, date = excluded.date, weight = excluded.weight, '
+                    'data = excluded.data, updated_at = excluded.updated_at',
+                    rows,
+                )
+                # Items the document no longer has
+                conn.execute(
+                    f'DELETE FROM {self.table} WHERE student_id = ? AND document_id = ? AND updated_at < ?'
+                    + (" AND type = 'task'" if planning_data is None else ''),
+                    (student_id, doc_id, now),
+                )
+                if self.ttl is not None:
+                    conn.execute(f'DELETE FROM {self.table} WHERE updated_at < ?', (now - self.ttl,))
+        metrics.inc('planning_store_upserts_total', len(rows))
+        return len(rows)
+
+    def upcoming(self, student_id, start_date=None, days=7, types=None, module=None, limit=MAX_QUERY_ITEMS):
+        """
+        Dated items of a student due in the ``days`` days from ``start_date``
+        (default today), soonest first, optionally only of the given
+        ``types`` or ``module`` (as extracted, in any case)
+        """
+        start = parse_date(start_date) or datetime.date.today()
+        end = start + datetime.timedelta(days=max(0, int(days)))
+        query = f'SELECT type, name, module, date, weight, data FROM {self.table} WHERE student_id = ? '
+        params = [student_id]
+        if types:
+            query += f"AND type IN ({', '.join('?' * len(types))}) "
+            params.extend(types)
+        if module:
+            query += 'AND module_key = ? '
+            params.append(str(module).strip().lower())
+        query += 'AND date >= ? AND date < ? ORDER BY date, type, name LIMIT ?'
+        params.extend([start.isoformat(), end.isoformat(), int(limit)])
+        return [dict(item, daysLeft=(parse_date(item['date']) - start).days)
+                for item in self._query(query, params)]
+
+    def items(self, student_id, types=None, module=None, limit=MAX_QUERY_ITEMS):
+        """All stored items of a student, dated ones first by date"""
+        query = f'SELECT type, name, module, date, weight, data FROM {self.table} WHERE student_id = ? '
+        params = [student_id]
+        if types:
+            query += f"AND type IN ({', '.join('?' * len(types))}) "
+            params.extend(types)
+        if module:
+            query += 'AND module_key = ? '
+            params.append(str(module).strip().lower())
+        query += 'ORDER BY date IS NULL, date, type, name LIMIT ?'
+        params.append(int(limit))
+        return self._query(query, params)
+
+    def _query(self, query, params):
+        started = time.perf_counter()
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        metrics.observe('planning_store_query_seconds', time.perf_counter() - started)
+        items = []
+        for item_type, name, module, date, weight, data in rows:
+            item = json.loads(data)
+            item.update(type=item_type, name=name, module=module, date=date, weight=weight)
+            items.append({key: value for key, value in item.items() if value is not None})
+        return items
+
+    def has_student(self, student_id):
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT 1 FROM {self.table} WHERE student_id = ? LIMIT 1', (student_id,)
+            ).fetchone() is not None
+
+    def delete_student(self, student_id):
+        with self._lock, self._conn:
+            self._conn.execute(f'DELETE FROM {self.table} WHERE student_id = ?', (student_id,))
+
+
+def create_planning_store():
+    """Build the planning store from PLANNING_STORE_* environment settings"""
+    path = os.getenv('PLANNING_STORE_PATH', os.path.join('.cache', 'planning_store.sqlite3'))
+    ttl = float(os.getenv('PLANNING_STORE_TTL', str(180 * 24 * 3600)))
+    # An empty path keeps the store in this process's memory only
+    return PlanningStore(path or ':memory:', ttl=ttl or None)
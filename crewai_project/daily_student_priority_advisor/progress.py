@@ -0,0 +1,61 @@
+"""
+Per-task progress reporting for the sequential advisor crew
+"""
+import json
+import time
+
+# Public stage names for each task of the crew, in execution order
+STAGES = {
+    'extract_pdf_planning_data': 'extraction',
+    'make_daily_priority_decision': 'priority_decision',
+    'provide_final_decision': 'recommendation',
+}
+
+
+def parse_task_output(raw):
+    """
+    Return the task output as structured data when it is JSON (optionally
+    wrapped in a markdown code fence), otherwise the raw text.
+    """
+    if not isinstance(raw, (str, type(None))):
+        return raw
+    text = (raw or '').strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0].strip()
+    try:
+        return json.loads(text)
+    except (ValueError, TypeError):
+        return raw
+
+
+class StageTracker:
+    """
+    Crew ``task_callback`` that turns each finished task into a stage event.
+
+    The crew runs its tasks sequentially, so a task's duration is the time
+    since the previous task finished (or since the tracker was started).
+    """
+
+    def __init__(self, on_stage):
+        self.on_stage = on_stage
+        self._last = time.perf_counter()
+
+    def restart(self):
+        """Start timing the next task from now"""
+        self._last = time.perf_counter()
+
+    def emit(self, task_name, raw, duration, cached=False):
+        self.on_stage({
+            "stage": STAGES.get(task_name, task_name),
+            "task": task_name,
+            "duration": round(duration, 3),
+            "cached": cached,
+            "output": parse_task_output(raw),
+        })
+
+    def __call__(self, task_output):
+        now = time.perf_counter()
+        duration = now - self._last
+        self._last = now
+        self.emit(task_output.name, task_output.raw, duration)
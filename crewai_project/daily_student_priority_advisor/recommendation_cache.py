@@ -0,0 +1,276 @@
+"""
+Cache of final student recommendations keyed on a normalized priority analysis
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from .caching import LRUCache, SQLiteCache, TieredCache
+from .defaults import ADVICE_TASK, DEFAULT_INPUTS, TASK_AGENTS
+from .extraction_cache import config_hash
+from .metrics import metrics
+from .progress import parse_task_output
+from .scoring import parse_date
+
+metrics.describe('recommendation_cache_near_hits_total', 'Recommendations reused for a near-duplicate top task')
+
+ADVICE_AGENT = TASK_AGENTS[ADVICE_TASK]
+
+# Width of the urgency and confidence buckets analyses are grouped into
+SCORE_BUCKET = 0.1
+# Dimensions of the hashed character-trigram vectors used for near-duplicate task names
+VECTOR_DIMENSIONS = 256
+
+_SPACES = re.compile(r'\s+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _normalize(value):
+    return _SPACES.sub(' ', str(value or '')).strip().lower()
+
+
+def _bucket(value):
+    try:
+        # Rounded first so that e.g. 0.9 lands in bucket 9, not 8
+        return math.floor(round(float(value) / SCORE_BUCKET, 6))
+    except (TypeError, ValueError):
+        return None
+
+
+def _planning_item(planning_data, task, inputs):
+    """
+    ``(deadline, module)`` of the exam, assignment or student task (or the
+    request's new task) that ``task`` names, matched exactly or else by the
+    longest item name it contains; None when there is no such item
+    """
+    name = _normalize(task)
+    candidates = []
+    planning_data = parse_task_output(planning_data)
+    if isinstance(planning_data, dict):
+        for category, field in (('exams', 'date'), ('assignments', 'deadline')):
+            candidates.extend(
+                (_normalize(item.get('name')), item.get(field), item.get('module'))
+                for item in planning_data.get(category) or [] if isinstance(item, dict)
+            )
+        candidates.extend(
+            (_normalize(item.get('description')), item.get('deadline'), None)
+            for item in planning_data.get('studentTasks') or [] if isinstance(item, dict)
+        )
+    candidates.append((_normalize(inputs.get('new_task_description')), inputs.get('task_deadline'), None))
+    matches = [candidate for candidate in candidates if candidate[0] and candidate[0] in name]
+    if not matches:
+        return None
+    _, deadline, module = max(matches, key=lambda candidate: (candidate[0] == name, len(candidate[0])))
+    return deadline, module
+
+
+def analysis_features(analysis, inputs, planning_data=None):
+    """
+    Normalized form of a priority analysis: the top task, its module and
+    importance, the urgency and confidence buckets and the days left until
+    the task's deadline. The deadline and module come from the analysis's
+    ranking (local scorer) or else from the extracted ``planning_data``.
+    Returns None when the analysis lacks a top task or urgency score, or
+    its top task is not an item of the ranking or planning data, and
+    cannot be cached.
+    """
+    analysis = parse_task_output(analysis)
+    if not isinstance(analysis, dict):
+        return None
+    task = analysis.get('topPriorityTask')
+    urgency = _bucket(analysis.get('urgencyScore'))
+    if not task or not isinstance(task, str) or urgency is None:
+        return None
+
+    # Local scorer analyses list the top task first in the ranking
+    top = next((item for item in analysis.get('ranking') or []
+                if isinstance(item, dict) and item.get('name') == task), None)
+    if top is not None:
+        deadline, module = top.get('deadline'), top.get('module')
+    else:
+        # The decision agent names its choice only; find it among the extracted items
+        item = _planning_item(planning_data, task, inputs)
+        if item is None:
+            return None
+        deadline, module = item
+    deadline = parse_date(deadline)
+    today = parse_date(inputs.get('current_date'))
+    return {
+        'task': _normalize(task),
+        'module': _normalize(module),
+        'importance': _normalize(analysis.get('moduleImportance')),
+        'urgency': urgency,
+        'confidence': _bucket(analysis.get('confidenceLevel')),
+        # Part of the key, so relative wording such as "due tomorrow" stays true on a hit
+        'days_left': (deadline - today).days if deadline and today else None,
+        # Kept to fill the cached text, not part of the key
+        'task_name': task,
+        'deadline': deadline,
+    }
+
+
+def _date_forms(date):
+    """Ways a date is commonly written in a recommendation, longest first"""
+    return [
+        ('', date.isoformat()),
+        (':long', f"{date:%B} {date.day}, {date.year}"),
+        (':month_day', f"{date:%B} {date.day}"),
+        (':short', f"{date:%b} {date.day}"),
+        (':weekday', f"{date:%A}"),
+    ]
+
+
+def _substitutions(features, inputs):
+    """(marker, text) pairs for the request-specific parts of a recommendation"""
+    pairs = [('task', features['task_name'])]
+    student_name = inputs.get('student_name')
+    # The default name is also a common word, so it is left in place
+    if student_name and student_name != DEFAULT_INPUTS['student_name']:
+        pairs.append(('student_name', student_name))
+    for name, date in (('current_date', parse_date(inputs.get('current_date'))), ('deadline', features['deadline'])):
+        if date is not None:
+            pairs.extend((name + suffix, text) for suffix, text in _date_forms(date))
+    return pairs
+
+
+def to_template(text, features, inputs):
+    """Replace the task name, student name and dates in ``text`` with markers"""
+    for marker, value in sorted(_substitutions(features, inputs), key=lambda pair: -len(pair[1])):
+        text = re.sub(rf'(?<!\w){re.escape(value)}(?!\w)', '{{' + marker + '}}', text)
+    return text
+
+
+def fill_template(template, features, inputs):
+    """Fill the markers of a cached recommendation for another request"""
+    for marker, value in _substitutions(features, inputs):
+        template = template.replace('{{' + marker + '}}', value)
+    return template
+
+
+def _trigram_vector(text):
+    vector = np.zeros(VECTOR_DIMENSIONS, dtype=np.float32)
+    for word in _WORD.findall(text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[zlib.crc32(padded[i:i + 3].encode('utf-8')) % VECTOR_DIMENSIONS] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class NearDuplicateIndex:
+    """
+    In-memory index of cached top-task names, grouped by the rest of the
+    normalized analysis. Finds the most similar task name (cosine similarity
+    of hashed character trigrams) within the same group.
+    """
+
+    def __init__(self, max_items=1024):
+        self.max_items = max(1, int(max_items))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (group, vector)
+
+    def add(self, key, group, task):
+        with self._lock:
+            self._entries[key] = (group, _trigram_vector(task))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def nearest(self, group, task, threshold):
+        """Key of the most similar entry in ``group``, if at least ``threshold`` similar"""
+        with self._lock:
+            candidates = [(key, vector) for key, (entry_group, vector) in self._entries.items() if entry_group == group]
+        if not candidates:
+            return None
+        similarities = np.stack([vector for _, vector in candidates]) @ _trigram_vector(task)
+        best = int(np.argmax(similarities))
+        return candidates[best][0] if similarities[best] >= threshold else None
+
+
+class RecommendationCache(TieredCache):
+    """
+    Final recommendations keyed on the normalized priority analysis and the
+    advice task configuration. Cached texts are stored as templates, and
+    the task name, student name and dates of the request are filled in on a
+    hit. With ``similarity`` set, analyses whose top task name is at least
+    that similar to a cached one (and that match on everything else) reuse
+    its recommendation too.
+    """
+
+    def __init__(self, memory, disk=None, model='', similarity=0.0):
+        super().__init__(memory, disk, name='recommendation')
+        self.config_digest = config_hash(model, task=ADVICE_TASK, agent=ADVICE_AGENT)
+        self.similarity = similarity
+        self.index = NearDuplicateIndex(memory.max_items) if similarity > 0 else None
+
+    def _group(self, features):
+        material = {key: features[key] for key in ('module', 'importance', 'urgency', 'confidence', 'days_left')}
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def key_for(self, features):
+        digest = hashlib.sha256(f"{self._group(features)}:{features['task']}".encode('utf-8')).hexdigest()
+        return f"{digest}:{self.config_digest}"
+
+    def lookup(self, analysis, inputs, planning_data=None):
+        """Recommendation text for an equivalent analysis, or None"""
+        features = analysis_features(analysis, inputs, planning_data)
+        if features is None:
+            return None
+        template = self.get(self.key_for(features))
+        if template is None and self.index is not None:
+            key = self.index.nearest(self._group(features), features['task'], self.similarity)
+            if key is not None:
+                template = self.memory.get(key)
+                if template is None and self.disk is not None:
+                    template = self.disk.get(key)
+                if template is None:
+                    self.index.discard(key)
+                else:
+                    metrics.inc('recommendation_cache_near_hits_total')
+        if template is None:
+            return None
+        return fill_template(template, features, inputs)
+
+    def store(self, analysis, inputs, text, planning_data=None):
+        features = analysis_features(analysis, inputs, planning_data)
+        if features is None or not text:
+            return
+        key = self.key_for(features)
+        self.put(key, to_template(text, features, inputs))
+        if self.index is not None:
+            self.index.add(key, self._group(features), features['task'])
+
+
+def create_recommendation_cache(model=''):
+    """
+    Build the recommendation cache from RECOMMENDATION_CACHE_* environment
+    settings, or return None when RECOMMENDATION_CACHE_MEMORY_ITEMS is 0
+    """
+    memory_items = int(os.getenv('RECOMMENDATION_CACHE_MEMORY_ITEMS', '1024'))
+    if memory_items <= 0:
+        return None
+    ttl = float(os.getenv('RECOMMENDATION_CACHE_TTL', str(24 * 3600)))
+    memory = LRUCache(max_items=memory_items, ttl=ttl, name='recommendation')
+    disk = None
+    path = os.getenv('RECOMMENDATION_CACHE_PATH', os.path.join('.cache', 'recommendation_cache.sqlite3'))
+    if path:
+        disk = SQLiteCache(
+            path,
+            table='recommendations',
+            ttl=ttl,
+            max_bytes=int(os.getenv('RECOMMENDATION_CACHE_MAX_BYTES', str(64 * 1024 * 1024))),
+            name='recommendation',
+        )
+    similarity = float(os.getenv('RECOMMENDATION_CACHE_SIMILARITY', '0'))
+    return RecommendationCache(memory, disk, model=model, similarity=similarity)
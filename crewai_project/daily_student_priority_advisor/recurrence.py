@@ -0,0 +1,404 @@
+"""
+Recurrence rules for classes and commitments, and an interval index of their occurrences
+
+Extracted classes ("Mon, Wed, Fri 10:00 AM") and commitments ("Every Tuesday
+6 PM", recurrence "weekly") are free text. parse_rule() normalizes each one
+into a RecurrenceRule; a Schedule expands the rules lazily, one week at a
+time, into an IntervalTree over minutes and answers "busy minutes on a
+date", "what conflicts with this slot" and "load over the next N days" in
+logarithmic time. schedule_features() turns those answers into the numbers
+the priority stage uses for workload balance.
+"""
+import bisect
+import datetime
+import re
+
+MINUTES_PER_DAY = 24 * 60
+# Study time of a day, in minutes since midnight (also used by the study planner)
+DAY_START_MINUTES = 8 * 60
+DAY_END_MINUTES = 22 * 60
+# Duration assumed for classes and commitments without an end time
+DEFAULT_EVENT_MINUTES = 60
+# Overlapping sessions listed in schedule_features()
+MAX_CONFLICTS = 5
+
+WEEKDAYS = {
+    'mon': 0, 'monday': 0, 'tue': 1, 'tues': 1, 'tuesday': 1, 'wed': 2, 'wednesday': 2,
+    'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3, 'fri': 4, 'friday': 4,
+    'sat': 5, 'saturday': 5, 'sun': 6, 'sunday': 6,
+}
+# "Saturdays": plurals of the full day names only, so that words such as
+# "thus" are not read as an abbreviated day
+WEEKDAYS.update({name + 's': day for name, day in list(WEEKDAYS.items()) if name.endswith('day')})
+WEEKDAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+DAY_GROUPS = {'daily': range(7), 'every day': range(7), 'weekday': range(5), 'weekend': (5, 6)}
+# Phrases meaning "every other week"
+BIWEEKLY_PHRASES = ('biweekly', 'bi-weekly', 'every other', 'every two weeks', 'every 2 weeks', 'fortnight')
+ONCE_PHRASES = ('once', 'one-off', 'one off', 'single')
+# "Mon-Fri", "Monday to Friday"
+DAY_RANGE_PATTERN = re.compile(r'\b([a-z]+)\s*(?:-|\u2013|\bto\b|\bthrough\b|\bthru\b)\s*([a-z]+)\b')
+# "6 PM" / "10:30am", "18:00" and the French-style "14h00" ("3h" is a duration, not a time)
+TIME_PATTERN = re.compile(
+    r'\b(\d{1,2})(?::(\d{2}))?\s*([ap])\.?m?\.?\b|\b(\d{1,2}):(\d{2})\b|\b(\d{1,2})h(\d{2})\b',
+    re.IGNORECASE,
+)
+DATE_PATTERN = re.compile(r'\b\d{4}-\d{2}-\d{2}\b')
+UNTIL_PATTERN = re.compile(r'\b(?:until|till|through)\s+(\d{4}-\d{2}-\d{2})\b', re.IGNORECASE)
+
+
+def _weekdays(text):
+    """Weekdays (0 = Monday) named in free text such as "Mon, Wed, Fri", "Mon-Thu", "Saturdays" or "weekdays" """
+    text = (text or '').lower()
+    for group, days in DAY_GROUPS.items():
+        if group in text:
+            return set(days)
+    weekdays = set()
+    for first, last in DAY_RANGE_PATTERN.findall(text):
+        if first in WEEKDAYS and last in WEEKDAYS:
+            first, last = WEEKDAYS[first], WEEKDAYS[last]
+            # "Fri-Mon" wraps around the weekend
+            weekdays.update(day % 7 for day in range(first, last + (7 if last < first else 0) + 1))
+    for word in re.findall(r'[a-z]+', text):
+        if word in WEEKDAYS:
+            weekdays.add(WEEKDAYS[word])
+    return weekdays
+
+
+def _time_range(text):
+    """``(start, end)`` in minutes since midnight from "10:00 AM - 11:30 AM", "18:00", "14h00" or "6 PM", or None"""
+    # Dates ("2025-03-14") are not times
+    text = DATE_PATTERN.sub(' ', text or '')
+    times = []
+    meridiems = []
+    for match in TIME_PATTERN.finditer(text):
+        if match.group(4) is not None:
+            hour, minute, meridiem = int(match.group(4)), int(match.group(5)), None
+        elif match.group(6) is not None:
+            hour, minute, meridiem = int(match.group(6)), int(match.group(7)), None
+        else:
+            hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3).lower()
+        times.append((hour, minute))
+        meridiems.append(meridiem)
+        if len(times) == 2:
+            break
+    if not times:
+        return None
+    # "10-11:30 AM": a missing am/pm is taken from the other time
+    known = next((m for m in reversed(meridiems) if m), None)
+    minutes = []
+    for (hour, minute), meridiem in zip(times, meridiems):
+        meridiem = meridiem or known
+        if meridiem == 'p' and hour < 12:
+            hour += 12
+        elif meridiem == 'a' and hour == 12:
+            hour = 0
+        minutes.append(min(hour, 23) * 60 + min(minute, 59))
+    start = minutes[0]
+    end = minutes[1] if len(minutes) > 1 and minutes[1] > start else start + DEFAULT_EVENT_MINUTES
+    return start, min(end, MINUTES_PER_DAY)
+
+
+def _clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _monday(date):
+    return date - datetime.timedelta(days=date.weekday())
+
+
+class RecurrenceRule:
+    """
+    A normalized class or commitment: ``start``-``end`` (minutes since
+    midnight) on ``weekdays`` every ``interval`` weeks, counted from the week
+    of ``anchor``, up to ``until``; or only on ``date`` for a one-off event.
+    """
+
+    __slots__ = ('name', 'kind', 'weekdays', 'start', 'end', 'interval', 'anchor', 'until', 'date')
+
+    def __init__(self, name, kind, weekdays, start, end, interval=1, anchor=None, until=None, date=None):
+        self.name = name
+        self.kind = kind
+        self.weekdays = frozenset(weekdays)
+        self.start = start
+        self.end = end
+        self.interval = max(1, int(interval))
+        self.anchor = _monday(anchor) if anchor else None
+        self.until = until
+        self.date = date
+
+    @property
+    def minutes(self):
+        return self.end - self.start
+
+    def occurs_on(self, date):
+        if self.date is not None:
+            return date == self.date
+        if date.weekday() not in self.weekdays or (self.until is not None and date > self.until):
+            return False
+        if self.interval > 1 and self.anchor is not None:
+            return ((_monday(date) - self.anchor).days // 7) % self.interval == 0
+        return True
+
+    def occurrences(self, start_date, end_date):
+        """Yield ``(date, start, end)`` for each occurrence in ``[start_date, end_date)``, lazily"""
+        if self.date is not None:
+            if start_date <= self.date < end_date:
+                yield self.date, self.start, self.end
+            return
+        if self.until is not None:
+            end_date = min(end_date, self.until + datetime.timedelta(days=1))
+        date = start_date
+        while date < end_date:
+            if self.occurs_on(date):
+                yield date, self.start, self.end
+            date += datetime.timedelta(days=1)
+
+    def rrule(self):
+        """The rule in iCalendar RRULE notation"""
+        if self.date is not None:
+            return f"DTSTART={self.date.strftime('%Y%m%d')}T{self.start // 60:02d}{self.start % 60:02d}00;COUNT=1"
+        parts = ['FREQ=WEEKLY']
+        if self.interval > 1:
+            parts.append(f'INTERVAL={self.interval}')
+        parts.append('BYDAY=' + ','.join(WEEKDAY_CODES[day] for day in sorted(self.weekdays)))
+        parts.append(f'BYHOUR={self.start // 60};BYMINUTE={self.start % 60}')
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%d')}")
+        return ';'.join(parts)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "rrule": self.rrule(),
+            "start": _clock(self.start),
+            "end": _clock(self.end),
+        }
+
+    def __repr__(self):
+        return f"RecurrenceRule({self.name!r}, {self.rrule()!r}, {_clock(self.start)}-{_clock(self.end)})"
+
+
+def parse_rule(name, kind, days='', time='', recurrence='', anchor=None):
+    """
+    Normalize a class or commitment described by free-text ``days``,
+    ``time`` and ``recurrence`` fields into a RecurrenceRule, or return None
+    when no day or time can be read. ``anchor`` is a date in a week the
+    rule occurs, for every-other-week rules.
+    """
+    text = ' '.join(str(part) for part in (days, time, recurrence) if part)
+    lowered = text.lower()
+    span = _time_range(str(time or '')) or _time_range(text)
+    if span is None:
+        return None
+    until = UNTIL_PATTERN.search(text)
+    until = datetime.date.fromisoformat(until.group(1)) if until else None
+    weekdays = _weekdays(DATE_PATTERN.sub(' ', text))
+    dates = [datetime.date.fromisoformat(d) for d in DATE_PATTERN.findall(UNTIL_PATTERN.sub(' ', text))]
+    if dates and (not weekdays or any(phrase in lowered for phrase in ONCE_PHRASES)):
+        return RecurrenceRule(name, kind, (), span[0], span[1], date=dates[0])
+    if not weekdays:
+        return None
+    interval = 2 if any(phrase in lowered for phrase in BIWEEKLY_PHRASES) else 1
+    return RecurrenceRule(name, kind, weekdays, span[0], span[1], interval=interval,
+                          anchor=dates[0] if dates else anchor, until=until)
+
+
+def rules_from_planning_data(planning_data, anchor=None):
+    """RecurrenceRules for every class and commitment of extracted planning data with a readable day and time"""
+    rules = []
+    for session in planning_data.get('classes') or []:
+        rule = parse_rule(session.get('name') or 'Class', 'class', session.get('days'), session.get('time'),
+                          session.get('recurrence'), anchor)
+        if rule is not None:
+            rules.append(rule)
+    for commitment in planning_data.get('commitments') or []:
+        rule = parse_rule(commitment.get('name') or 'Commitment', 'commitment', commitment.get('days'),
+                          commitment.get('time'), commitment.get('recurrence'), anchor)
+        if rule is not None:
+            rules.append(rule)
+    return rules
+
+
+class IntervalTree:
+    """
+    Static interval tree over half-open ``[start, end)`` integer intervals,
+    kept as a balanced binary tree implicit in the start-sorted array, each
+    node augmented with the largest end in its subtree. overlapping() visits
+    O(log n + k) nodes for k results; covered() works on the union of the
+    intervals with prefix sums and takes O(log n).
+    """
+
+    def __init__(self, intervals=()):
+        items = sorted((item for item in intervals if item[1] > item[0]), key=lambda item: (item[0], item[1]))
+        self._starts = [item[0] for item in items]
+        self._ends = [item[1] for item in items]
+        self._values = [item[2] if len(item) > 2 else None for item in items]
+        self._max_end = list(self._ends)
+        self._augment(0, len(items))
+
+        # Union of the intervals and the covered length before each of its parts
+        self._union_starts, self._union_ends, self._covered_before = [], [], []
+        total = 0
+        for start, end in zip(self._starts, self._ends):
+            if self._union_ends and start <= self._union_ends[-1]:
+                if end > self._union_ends[-1]:
+                    total += end - self._union_ends[-1]
+                    self._union_ends[-1] = end
+                continue
+            self._union_starts.append(start)
+            self._union_ends.append(end)
+            self._covered_before.append(total)
+            total += end - start
+
+    def _augment(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for child in (self._augment(lo, mid), self._augment(mid + 1, hi)):
+            if child is not None and child > self._max_end[mid]:
+                self._max_end[mid] = child
+        return self._max_end[mid]
+
+    def __len__(self):
+        return len(self._starts)
+
+    def overlapping(self, start, end):
+        """``(start, end, value)`` of every interval overlapping ``[start, end)``, by start"""
+        found = []
+        stack = [(0, len(self._starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] <= start:
+                # Nothing in this subtree ends after the query starts
+                continue
+            if self._starts[mid] < end:
+                if self._ends[mid] > start:
+                    found.append((self._starts[mid], self._ends[mid], self._values[mid]))
+                stack.append((mid + 1, hi))
+            stack.append((lo, mid))
+        found.sort(key=lambda item: (item[0], item[1]))
+        return found
+
+    def _covered_until(self, point):
+        i = bisect.bisect_right(self._union_starts, point) - 1
+        if i < 0:
+            return 0
+        return self._covered_before[i] + min(point, self._union_ends[i]) - self._union_starts[i]
+
+    def covered(self, start, end):
+        """Length of ``[start, end)`` covered by at least one interval"""
+        if end <= start:
+            return 0
+        return self._covered_until(end) - self._covered_until(start)
+
+
+def _minute(date, minutes=0):
+    """Minutes since 0001-01-01 of a time on a date"""
+    return date.toordinal() * MINUTES_PER_DAY + minutes
+
+
+class Schedule:
+    """
+    The occurrences of a student's recurrence rules, indexed for time
+    queries. Weeks are expanded the first time a query touches them (and the
+    tree rebuilt once per query that expands any), so a query over any date
+    range only costs the occurrences actually in that range.
+    """
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self._weeks = set()
+        self._intervals = []
+        self._tree = IntervalTree()
+
+    @classmethod
+    def from_planning_data(cls, planning_data, anchor=None):
+        return cls(rules_from_planning_data(planning_data, anchor))
+
+    def _expand(self, start_date, end_date):
+        monday = _monday(start_date)
+        expanded = False
+        while monday < end_date:
+            if monday not in self._weeks:
+                self._weeks.add(monday)
+                sunday = monday + datetime.timedelta(days=7)
+                for rule in self.rules:
+                    for date, start, end in rule.occurrences(monday, sunday):
+                        self._intervals.append((_minute(date, start), _minute(date, end), rule))
+                expanded = True
+            monday += datetime.timedelta(days=7)
+        if expanded:
+            self._tree = IntervalTree(self._intervals)
+
+    def busy_minutes(self, date, day_start=0, day_end=MINUTES_PER_DAY):
+        """Minutes between ``day_start`` and ``day_end`` of ``date`` taken by classes and commitments"""
+        self._expand(date, date + datetime.timedelta(days=1))
+        return self._tree.covered(_minute(date, day_start), _minute(date, day_end))
+
+    def load(self, start_date, days=7):
+        """Busy minutes over the ``days`` days from ``start_date``"""
+        end_date = start_date + datetime.timedelta(days=max(0, int(days)))
+        self._expand(start_date, end_date)
+        return self._tree.covered(_minute(start_date), _minute(end_date))
+
+    def conflicts(self, date, start, end):
+        """Classes and commitments overlapping ``start``-``end`` (minutes since midnight) on ``date``"""
+        self._expand(date, date + datetime.timedelta(days=1))
+        return [
+            {"name": rule.name, "kind": rule.kind,
+             "start": _clock(begin - _minute(date)), "end": _clock(finish - _minute(date))}
+            for begin, finish, rule in self._tree.overlapping(_minute(date, start), _minute(date, end))
+        ]
+
+    def busy_intervals(self, date):
+        """``(start, end)`` minutes since midnight of each occurrence on ``date``, by start"""
+        self._expand(date, date + datetime.timedelta(days=1))
+        return [
+            (begin - _minute(date), finish - _minute(date))
+            for begin, finish, _ in self._tree.overlapping(_minute(date), _minute(date, MINUTES_PER_DAY))
+        ]
+
+    def overlaps(self, start_date, days=7):
+        """``(date, first, second)`` for each pair of occurrences overlapping each other"""
+        end_date = start_date + datetime.timedelta(days=max(0, int(days)))
+        self._expand(start_date, end_date)
+        pairs = []
+        for begin, finish, rule in self._tree.overlapping(_minute(start_date), _minute(end_date)):
+            for other_begin, _, other in self._tree.overlapping(begin, finish):
+                if (other_begin, id(other)) > (begin, id(rule)):
+                    date = datetime.date.fromordinal(begin // MINUTES_PER_DAY)
+                    pairs.append((date, rule, other))
+        return pairs
+
+
+def schedule_features(planning_data, current_date=None, days=7, schedule=None):
+    """
+    Precomputed schedule load for the priority stage: busy and free study
+    minutes today, the load over the next ``days`` days, the busiest day and
+    classes or commitments that overlap each other
+    """
+    today = current_date or datetime.date.today()
+    schedule = schedule or Schedule.from_planning_data(planning_data, anchor=today)
+    window = DAY_END_MINUTES - DAY_START_MINUTES
+    per_day = [
+        (today + datetime.timedelta(days=offset),
+         schedule.busy_minutes(today + datetime.timedelta(days=offset), DAY_START_MINUTES, DAY_END_MINUTES))
+        for offset in range(max(1, days))
+    ]
+    busiest_date, busiest = max(per_day, key=lambda day: day[1])
+    return {
+        "recurringEvents": len(schedule.rules),
+        "busyMinutesToday": schedule.busy_minutes(today),
+        "freeStudyMinutesToday": window - per_day[0][1],
+        f"busyMinutesNext{days}Days": schedule.load(today, days),
+        f"freeStudyMinutesNext{days}Days": window * len(per_day) - sum(busy for _, busy in per_day),
+        "busiestDay": {"date": busiest_date.isoformat(), "busyMinutes": busiest} if busiest else None,
+        "conflicts": [
+            {"date": date.isoformat(), "events": [first.name, second.name]}
+            for date, first, second in schedule.overlaps(today, days)[:MAX_CONFLICTS]
+        ],
+    }
@@ -0,0 +1,380 @@
+"""
+Rate limiting, retries, hedging and circuit breaking for LLM calls
+
+Settings come from config/llm.yaml: a ``default`` section, overridable with
+LLM_<SETTING> environment variables (e.g. LLM_REQUESTS_PER_MINUTE), and
+per-agent overrides under ``agents``. Agents share one token bucket and one
+circuit breaker per model, unless an agent sets its own
+``requests_per_minute``, which gives it a bucket of its own.
+"""
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import yaml
+
+from .metrics import metrics
+
+metrics.describe('llm_rate_limit_wait_seconds', 'Time LLM calls waited for the rate limiter', 'histogram')
+metrics.describe('llm_hedged_calls_total', 'Duplicate LLM requests sent because the first one was slow')
+metrics.describe('llm_hedge_wins_total', 'Hedged LLM calls answered by the duplicate request')
+metrics.describe('llm_circuit_open', 'Whether calls to a model are currently short-circuited', 'gauge')
+metrics.describe('llm_circuit_trips_total', 'Times a model\'s circuit breaker opened')
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config', 'llm.yaml')
+
+DEFAULT_SETTINGS = {
+    'requests_per_minute': 60,
+    'burst': 10,
+    'max_rate_wait_seconds': 30,
+    'timeout_seconds': 0,
+    'max_retries': 3,
+    'backoff_seconds': 1.0,
+    'max_backoff_seconds': 20.0,
+    'hedge_percentile': 0,
+    'hedge_min_samples': 20,
+    'circuit_failures': 5,
+    'circuit_reset_seconds': 30,
+    'fallback': 'none',
+}
+
+# HTTP statuses worth retrying: rate limits and transient upstream failures
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = ('RateLimit', 'Timeout', 'ServiceUnavailable', 'APIConnectionError', 'InternalServerError')
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a model's circuit is open or its rate limit cannot be met in time"""
+
+
+class LLMSaturated(UpstreamUnavailable):
+    """Raised when no LLM call worker of this process became free in time (local, not a provider failure)"""
+
+
+class LLMTimeout(Exception):
+    """Raised when an LLM call took longer than its timeout"""
+    status_code = 408
+
+
+def load_settings(path=CONFIG_PATH):
+    """``(default_settings, settings_by_agent)`` from the YAML file and LLM_* overrides"""
+    config = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            config = yaml.safe_load(f) or {}
+    default = dict(DEFAULT_SETTINGS, **(config.get('default') or {}))
+    for key, value in DEFAULT_SETTINGS.items():
+        override = os.getenv(f'LLM_{key.upper()}')
+        if override:
+            default[key] = override if isinstance(value, str) else float(override)
+    agents = {name: dict(settings or {}) for name, settings in (config.get('agents') or {}).items()}
+    return default, agents
+
+
+def is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return any(name in type(error).__name__ for name in RETRYABLE_NAMES)
+
+
+def retry_after(error):
+    """Seconds the provider asked to wait before the next request, if it said"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens per second up to ``burst``.
+    A rate-limit response pauses the bucket for every caller.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Take a token, possibly going into debt; returns how long to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait_for = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait_for, self._paused_until - now)
+
+    def acquire(self, timeout=None):
+        """Wait for a token; returns the seconds waited"""
+        delay = self._reserve()
+        if timeout is not None and delay > timeout:
+            with self._lock:
+                self._tokens += 1
+            raise UpstreamUnavailable(f"Rate limit would delay the call by {delay:.1f}s")
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def pause(self, seconds):
+        """Hold back all callers for ``seconds`` (after a 429 from the provider)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failures`` consecutive failed calls. While open, calls
+    are refused; after ``reset_seconds`` one trial call is let through and
+    its outcome closes or re-opens the circuit. A trial that ends without
+    telling whether the model is up must be given back with release().
+    """
+
+    def __init__(self, name, failures=5, reset_seconds=30):
+        self.name = name
+        self.failures = max(1, int(failures))
+        self.reset_seconds = float(reset_seconds)
+        self._consecutive = 0
+        self._opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def release(self):
+        """Give back a trial call that was not made or did not reach a verdict"""
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._trial = False
+            if self._opened_at is not None:
+                self._opened_at = None
+                metrics.set('llm_circuit_open', 0, model=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or (self._opened_at is None and self._consecutive >= self.failures):
+                if self._opened_at is None:
+                    metrics.inc('llm_circuit_trips_total', model=self.name)
+                self._opened_at = time.monotonic()
+                self._trial = False
+                metrics.set('llm_circuit_open', 1, model=self.name)
+
+
+class LatencyWindow:
+    """Recent successful call latencies, for the hedging threshold"""
+
+    def __init__(self, size=200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, percentile, min_samples):
+        with self._lock:
+            values = sorted(self._values)
+        if not values or len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, int(len(values) * percentile / 100.0))]
+
+
+class LLMResilience:
+    """
+    Wraps LLM calls with a per-model token bucket and circuit breaker, and
+    per-agent retries with exponential backoff, timeouts and hedging: when
+    ``hedge_percentile`` is set, a call still running after that percentile
+    of the agent's recent latencies gets a duplicate request, and the first
+    answer wins.
+
+    Calls with a timeout or hedging run on ``call_workers`` threads; size
+    them with size_for() to the number of calls the process makes at once.
+    A call's timeout starts when it gets a thread, and a call that waits
+    longer than ``max_rate_wait_seconds`` for one fails with LLMSaturated
+    without counting against the model's circuit.
+    """
+
+    def __init__(self, default=None, agents=None, call_workers=16):
+        self.default = dict(DEFAULT_SETTINGS, **(default or {}))
+        self.agents = dict(agents or {})
+        self.call_workers = call_workers
+        self._buckets = {}
+        self._breakers = {}
+        self._latencies = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def settings(self, agent):
+        return dict(self.default, **self.agents.get(agent, {}))
+
+    def fallback(self, agent):
+        """The agent's fallback when its model is unavailable: 'local', 'template' or None"""
+        fallback = self.settings(agent).get('fallback')
+        return None if fallback in (None, 'none') else fallback
+
+    def degraded(self, model):
+        """True while the model's circuit is open"""
+        breaker = self._breakers.get(model)
+        return breaker is not None and breaker.is_open
+
+    def _bucket(self, model, agent, settings):
+        own = 'requests_per_minute' in self.agents.get(agent, {})
+        key = (model, agent if own else None)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(
+                    float(settings['requests_per_minute']) / 60.0, settings['burst']
+                )
+            return bucket
+
+    def _breaker(self, model):
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(
+                    model, self.default['circuit_failures'], self.default['circuit_reset_seconds']
+                )
+            return breaker
+
+    def _latency(self, agent):
+        with self._lock:
+            return self._latencies.setdefault(agent, LatencyWindow())
+
+    def size_for(self, concurrent_calls):
+        """Size the call threads for ``concurrent_calls`` calls in flight, each with room for a hedge"""
+        with self._lock:
+            self.call_workers = max(1, 2 * int(concurrent_calls))
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _submit(self, func):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.call_workers, thread_name_prefix='llm-call')
+        # Copy the context so the call is recorded in the request's trace
+        return self._executor.submit(contextvars.copy_context().run, func)
+
+    def call(self, agent, model, func):
+        """Call ``func`` (one request to the model) under the agent's policy"""
+        settings = self.settings(agent)
+        bucket = self._bucket(model, agent, settings)
+        breaker = self._breaker(model)
+        latency = self._latency(agent)
+        retries = int(settings['max_retries'])
+
+        for attempt in range(retries + 1):
+            if not breaker.allow():
+                raise UpstreamUnavailable(f"{model} is unavailable (circuit open)")
+            try:
+                waited = bucket.acquire(timeout=float(settings['max_rate_wait_seconds']))
+            except UpstreamUnavailable:
+                breaker.release()
+                raise
+            metrics.observe('llm_rate_limit_wait_seconds', waited, model=model)
+
+            started = time.perf_counter()
+            try:
+                result = self._attempt(func, settings, latency)
+            except Exception as e:
+                # Only errors saying the model is unavailable count toward the circuit
+                if is_retryable(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                if attempt == retries or not is_retryable(e):
+                    raise
+                delay = min(float(settings['max_backoff_seconds']),
+                            float(settings['backoff_seconds']) * 2 ** attempt)
+                # Full jitter, so that retries from concurrent requests spread out
+                delay = random.uniform(0, delay)
+                asked = retry_after(e)
+                if asked is not None or getattr(e, 'status_code', None) == 429:
+                    bucket.pause(max(asked or 0.0, delay))
+                time.sleep(max(asked or 0.0, delay))
+                continue
+            breaker.record_success()
+            latency.add(time.perf_counter() - started)
+            return result
+
+    def _attempt(self, func, settings, latency):
+        timeout = float(settings['timeout_seconds']) or None
+        hedge_after = None
+        if float(settings['hedge_percentile']) > 0:
+            hedge_after = latency.percentile(float(settings['hedge_percentile']), int(settings['hedge_min_samples']))
+        if timeout is None and hedge_after is None:
+            return func()
+
+        running = threading.Event()
+
+        def run():
+            running.set()
+            return func()
+
+        primary = self._submit(run)
+        # Time queued for a call thread is local: it neither counts toward the timeout nor against the provider
+        if not running.wait(float(settings['max_rate_wait_seconds'])) and primary.cancel():
+            raise LLMSaturated(f"No LLM call thread free within {settings['max_rate_wait_seconds']}s")
+        deadline = time.monotonic() + timeout if timeout else None
+        hedge_at = time.monotonic() + hedge_after if hedge_after is not None else None
+        pending = {primary}
+        error = None
+        while pending:
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            wakes = [t for t in (deadline, hedge_at) if t is not None]
+            done, pending = wait(pending, timeout=max(0.0, min(wakes) - now) if wakes else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is not primary:
+                    metrics.inc('llm_hedge_wins_total')
+                return result
+            if pending and hedge_at is not None and time.monotonic() >= hedge_at:
+                # Still waiting at the hedging threshold: race a duplicate request
+                hedge_at = None
+                metrics.inc('llm_hedged_calls_total')
+                pending.add(self._submit(func))
+        if error is not None and not pending:
+            raise error
+        # Abandoned requests finish in the background and their answers are dropped
+        raise LLMTimeout(f"No answer within {timeout}s")
+
+
+# Shared by every LLM client in the process
+llm_resilience = LLMResilience(*load_settings())
@@ -0,0 +1,96 @@
+"""
+Output schemas of the advisor crew tasks
+
+Field names follow the extractedData / priority analysis / recommendation
+shapes of mock_server.py, which the mobile app already reads. CrewAI adds
+each schema to its task's prompt and validates the final answer against it.
+"""
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from .defaults import ADVICE_TASK, DECISION_TASK, EXTRACTION_TASK
+
+# Weights and credits are sometimes written as "20%" or "4 ECTS"
+Number = Union[float, str]
+
+
+class ClassSession(BaseModel):
+    name: str
+    time: Optional[str] = Field(None, description="Start and end time, e.g. 10:00 - 11:30")
+    days: Optional[str] = Field(None, description="Weekdays, e.g. Mon, Wed")
+    recurrence: Optional[str] = Field(None, description="weekly, biweekly or once, with an end date if given")
+    location: Optional[str] = None
+    instructor: Optional[str] = None
+
+
+class Exam(BaseModel):
+    name: str
+    date: Optional[str] = Field(None, description="YYYY-MM-DD")
+    time: Optional[str] = None
+    module: Optional[str] = None
+    location: Optional[str] = None
+    weight: Optional[Number] = Field(None, description="Percentage of the final grade")
+
+
+class Assignment(BaseModel):
+    name: str
+    deadline: Optional[str] = Field(None, description="YYYY-MM-DD")
+    module: Optional[str] = None
+    weight: Optional[Number] = Field(None, description="Percentage of the final grade")
+    description: Optional[str] = Field(None, description="One short sentence")
+
+
+class Commitment(BaseModel):
+    name: str
+    time: Optional[str] = Field(None, description="Start and end time, e.g. 18:00 - 22:00")
+    days: Optional[str] = Field(None, description="Weekdays, e.g. Tue, Thu")
+    recurrence: Optional[str] = Field(None, description="weekly, biweekly or once, with an end date if given")
+    category: Optional[str] = None
+
+
+class Module(BaseModel):
+    code: Optional[str] = None
+    name: Optional[str] = None
+    importance: Optional[str] = Field(None, description="high, medium or low")
+    credits: Optional[Number] = None
+
+
+class PlanningData(BaseModel):
+    """Output of the extraction task"""
+    classes: List[ClassSession] = []
+    exams: List[Exam] = []
+    assignments: List[Assignment] = []
+    commitments: List[Commitment] = []
+    modules: List[Module] = []
+    confidence: Optional[float] = Field(None, ge=0, le=1)
+
+
+class Reasoning(BaseModel):
+    deadlineProximity: str
+    moduleWeight: str
+    workloadBalance: str
+
+
+class PriorityAnalysis(BaseModel):
+    """Output of the priority decision task"""
+    topPriorityTask: str
+    urgencyScore: float = Field(ge=0, le=1)
+    confidenceLevel: float = Field(ge=0, le=1)
+    moduleImportance: str = Field(description="high, medium or low")
+    reasoning: Reasoning
+
+
+class Recommendation(BaseModel):
+    """Output of the advice task"""
+    recommendation: str = Field(description="One or two sentences")
+    actionableSteps: List[str] = Field(description="3 to 5 short steps")
+    estimatedDuration: str
+    confidence: float = Field(ge=0, le=1)
+
+
+TASK_SCHEMAS = {
+    EXTRACTION_TASK: PlanningData,
+    DECISION_TASK: PriorityAnalysis,
+    ADVICE_TASK: Recommendation,
+}
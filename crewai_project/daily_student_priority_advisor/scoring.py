@@ -0,0 +1,325 @@
+"""
+Deterministic local priority scoring for extracted planning data
+
+Computes the same urgency analysis the daily_priority_decision_maker agent
+produces (top task, urgency score, reasoning) from deadline proximity,
+grade weight, module importance and workload, vectorized with NumPy.
+Workload counts both competing deadlines and the time classes and
+commitments take before each deadline (see recurrence.py).
+"""
+import datetime
+
+import numpy as np
+
+from .recurrence import DAY_END_MINUTES, DAY_START_MINUTES, Schedule
+
+# Relative weight of each factor in the urgency score (sums to 1)
+FACTOR_WEIGHTS = {
+    'deadline': 0.45,
+    'module': 0.25,
+    'weight': 0.20,
+    'workload': 0.10,
+}
+# Days over which deadline pressure decays by a factor of e
+DEADLINE_DECAY_DAYS = 3.0
+# Deadlines this many days apart compete for the same preparation time
+WORKLOAD_WINDOW_DAYS = 2
+# Share of the workload factor given to competing deadlines; the rest is the
+# share of study time until the deadline taken by classes and commitments
+COMPETING_SHARE = 0.6
+# Busy share of the next 7 days' study time above which the week is heavy
+HEAVY_SCHEDULE_SHARE = 0.4
+# Module coefficients above this value count as maximum importance
+COEFFICIENT_SCALE = 5.0
+# Scores closer than this are considered a tie that needs the LLM to decide
+DEFAULT_TIE_MARGIN = 0.05
+
+IMPORTANCE_LEVELS = {'high': 1.0, 'medium': 0.6, 'low': 0.3}
+CONFIDENCE_LEVELS = {'high': 0.9, 'medium': 0.7, 'low': 0.5}
+# Students unsure about a task need to start it earlier
+CONFIDENCE_URGENCY = {'high': 0.9, 'medium': 1.0, 'low': 1.15}
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD (optionally with a time part) date, or return None"""
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+
+def _number(value, default=None):
+    try:
+        return float(str(value).strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return default
+
+
+def _confidence_key(confidence_level):
+    """Map a 'low'/'medium'/'high' label or a 0-1 number to a label"""
+    value = _number(confidence_level)
+    if value is None:
+        label = str(confidence_level or 'medium').strip().lower()
+        return label if label in CONFIDENCE_LEVELS else 'medium'
+    if value >= 0.8:
+        return 'high'
+    return 'medium' if value >= 0.6 else 'low'
+
+
+def collect_items(planning_data, new_task_description='', task_deadline='', module_coefficient=1, tasks=None):
+    """
+    Flatten exams, assignments, the request's new task and the student's own
+    ``tasks`` (dicts with description, deadline and module_coefficient) into
+    scorable items
+    """
+    items = []
+    for exam in planning_data.get('exams') or []:
+        items.append({
+            'name': exam.get('name') or 'Exam',
+            'type': 'exam',
+            'deadline': exam.get('date'),
+            'module': exam.get('module'),
+            'weight': exam.get('weight'),
+        })
+    for assignment in planning_data.get('assignments') or []:
+        items.append({
+            'name': assignment.get('name') or 'Assignment',
+            'type': 'assignment',
+            'deadline': assignment.get('deadline'),
+            'module': assignment.get('module'),
+            'weight': assignment.get('weight'),
+        })
+    if new_task_description:
+        items.append({
+            'name': new_task_description,
+            'type': 'task',
+            'deadline': task_deadline,
+            'module': None,
+            'weight': None,
+            'coefficient': module_coefficient,
+        })
+    for task in tasks or []:
+        if task.get('description'):
+            items.append({
+                'name': task['description'],
+                'type': 'task',
+                'deadline': task.get('deadline'),
+                'module': None,
+                'weight': None,
+                'coefficient': task.get('module_coefficient', 1),
+            })
+    return items
+
+
+def _module_scores(items, modules):
+    """Importance of each item's module in 0-1, from importance and credits"""
+    by_key = {}
+    max_credits = max([_number(m.get('credits'), 0) for m in modules] or [0]) or 1.0
+    for module in modules:
+        importance = IMPORTANCE_LEVELS.get(str(module.get('importance', '')).lower(), 0.6)
+        credits = _number(module.get('credits'), 0) / max_credits
+        score = 0.5 * importance + 0.5 * credits if module.get('credits') is not None else importance
+        label = str(module.get('importance') or 'medium').lower()
+        for key in (module.get('code'), module.get('name')):
+            if key:
+                by_key[str(key).strip().lower()] = (score, label)
+
+    scores = np.full(len(items), 0.5)
+    labels = ['medium'] * len(items)
+    for i, item in enumerate(items):
+        if 'coefficient' in item:
+            coefficient = _number(item['coefficient'], 1.0)
+            scores[i] = min(max(coefficient / COEFFICIENT_SCALE, 0.0), 1.0)
+            labels[i] = 'high' if scores[i] >= 0.8 else 'medium' if scores[i] >= 0.4 else 'low'
+        elif item.get('module'):
+            score, label = by_key.get(str(item['module']).strip().lower(), (0.5, 'medium'))
+            scores[i] = score
+            labels[i] = label
+    return scores, labels
+
+
+def _no_priority(deadline_text, ranking=()):
+    """Analysis for planning data with nothing left to prioritize"""
+    return {
+        "topPriorityTask": None,
+        "urgencyScore": 0.0,
+        "confidenceLevel": 0.0,
+        "moduleImportance": None,
+        "reasoning": {
+            "deadlineProximity": deadline_text,
+            "moduleWeight": "No module information to compare",
+            "workloadBalance": "No scheduled workload",
+        },
+        "ranking": list(ranking),
+        "needsReview": True,
+    }
+
+
+def score_priorities(planning_data, current_date='', module_coefficient=1, task_deadline='',
+                     confidence_level='medium', new_task_description='', tie_margin=DEFAULT_TIE_MARGIN,
+                     tasks=None, schedule=None):
+    """
+    Rank every deadline-bearing item and return a priority analysis shaped
+    like the daily_priority_decision_maker output (topPriorityTask,
+    urgencyScore, confidenceLevel, moduleImportance, reasoning) plus the full
+    ``ranking``. ``needsReview`` is True when the top scores are within
+    ``tie_margin`` of each other (or nothing could be scored), meaning the
+    case should be decided by the LLM instead. ``tasks`` are the student's
+    own tasks, scored alongside the new task (see collect_items).
+    ``schedule`` is the recurrence.Schedule of the planning data's classes
+    and commitments, built from it when not given. Items whose deadline has
+    passed score 0 and are ranked last; they are never the top priority.
+    """
+    planning_data = planning_data if isinstance(planning_data, dict) else {}
+    today = parse_date(current_date) or datetime.date.today()
+    items = collect_items(planning_data, new_task_description, task_deadline, module_coefficient, tasks)
+    confidence_key = _confidence_key(confidence_level)
+
+    if not items:
+        return _no_priority("No exams, assignments or tasks with deadlines were found")
+
+    # Days until each deadline; unknown deadlines are NaN
+    deadlines = np.array(
+        [np.datetime64(d) if d else np.datetime64('NaT') for d in (parse_date(i['deadline']) for i in items)],
+        dtype='datetime64[D]',
+    )
+    days_left = (deadlines - np.datetime64(today)).astype('float64')
+    days_left[np.isnat(deadlines)] = np.nan
+    known = ~np.isnan(days_left)
+    with np.errstate(invalid='ignore'):
+        past = known & (days_left < 0)
+
+    # Deadline proximity: 1.0 when due today, decaying with distance; 0 once past
+    deadline_score = np.where(known, np.exp(-np.clip(np.nan_to_num(days_left), 0, None) / DEADLINE_DECAY_DAYS), 0.1)
+    deadline_score[past] = 0.0
+
+    # Share of the final grade
+    weights = np.array([_number(i.get('weight'), np.nan) for i in items], dtype='float64')
+    weight_score = np.where(np.isnan(weights), 0.2, np.clip(weights / 100.0, 0.0, 1.0))
+
+    module_score, module_labels = _module_scores(items, planning_data.get('modules') or [])
+
+    # Workload: other deadlines this week close enough to compete for the same preparation time
+    with np.errstate(invalid='ignore'):
+        week = known & (days_left >= 0) & (days_left <= 7)
+    due = np.where(week, days_left, np.inf)
+    with np.errstate(invalid='ignore'):
+        competing = (np.abs(due[None, :] - due[:, None]) <= WORKLOAD_WINDOW_DAYS).sum(axis=1) - 1
+    workload_score = np.clip(competing / max(len(items) - 1, 1), 0.0, 1.0)
+
+    # Share of the study time left before each deadline taken by classes and commitments
+    schedule = schedule if schedule is not None else Schedule.from_planning_data(planning_data, anchor=today)
+    window = DAY_END_MINUTES - DAY_START_MINUTES
+    week_busy = schedule.load(today, 7) if schedule.rules else 0
+    if schedule.rules:
+        busy_share = np.zeros(len(items))
+        for i in np.flatnonzero(week):
+            span = int(days_left[i]) + 1
+            busy_share[i] = min(schedule.load(today, span) / (span * window), 1.0)
+        workload_score = COMPETING_SHARE * workload_score + (1 - COMPETING_SHARE) * busy_share
+    workload_score = np.where(week, workload_score, 0.0)
+
+    urgency = (
+        FACTOR_WEIGHTS['deadline'] * deadline_score
+        + FACTOR_WEIGHTS['module'] * module_score
+        + FACTOR_WEIGHTS['weight'] * weight_score
+        + FACTOR_WEIGHTS['workload'] * workload_score
+    )
+    is_task = np.array([i['type'] == 'task' for i in items])
+    urgency = np.clip(np.where(is_task, urgency * CONFIDENCE_URGENCY[confidence_key], urgency), 0.0, 1.0)
+    urgency[past] = 0.0
+
+    # Past items last, whatever their weight or module
+    order = np.lexsort((-urgency, past))
+    top = int(order[0])
+    gap = float(urgency[top] - urgency[order[1]]) if len(order) > 1 else 1.0
+    # Confidence grows with the lead of the top item over the runner-up; with
+    # no tie margin any lead is decisive
+    lead = min(gap / (4 * tie_margin), 1.0) if tie_margin > 0 else 1.0
+    confidence = CONFIDENCE_LEVELS[confidence_key] * (0.7 + 0.3 * lead)
+
+    ranking = [
+        {
+            "name": items[i]['name'],
+            "type": items[i]['type'],
+            "deadline": items[i]['deadline'],
+            "module": items[i]['module'],
+            "urgencyScore": round(float(urgency[i]), 3),
+            "factors": {
+                "deadline": round(float(deadline_score[i]), 3),
+                "module": round(float(module_score[i]), 3),
+                "weight": round(float(weight_score[i]), 3),
+                "workload": round(float(workload_score[i]), 3),
+            },
+        }
+        for i in order
+    ]
+
+    if past[top]:
+        return _no_priority("Every exam, assignment and task found is already past its deadline", ranking)
+
+    top_item = items[top]
+    if known[top]:
+        days = int(days_left[top])
+        when = 'due today' if days == 0 else f'due in {days} day{"s" if days != 1 else ""}'
+        deadline_text = f"{top_item['type'].capitalize()} is {when}"
+    else:
+        deadline_text = f"{top_item['type'].capitalize()} has no known deadline"
+    if not np.isnan(weights[top]):
+        weight_text = f"{top_item['type'].capitalize()} carries {weights[top]:g}% of the final grade"
+    else:
+        weight_text = f"Module importance is {module_labels[top]}"
+    n_week = int(week.sum())
+    heavy = n_week >= 3 or week_busy >= HEAVY_SCHEDULE_SHARE * 7 * window
+    workload_text = (
+        f"{n_week} deadline{'s' if n_week != 1 else ''}"
+        + (f" and {round(week_busy / 60, 1):g}h of classes and commitments" if week_busy else '')
+        + " in the next 7 days"
+        + (", workload is heavy" if heavy else ", workload is balanced")
+    )
+
+    return {
+        "topPriorityTask": top_item['name'],
+        "urgencyScore": round(float(urgency[top]), 3),
+        "confidenceLevel": round(float(confidence), 3),
+        "moduleImportance": module_labels[top],
+        "reasoning": {
+            "deadlineProximity": deadline_text,
+            "moduleWeight": weight_text,
+            "workloadBalance": workload_text,
+        },
+        "ranking": ranking,
+        "needsReview": gap < tie_margin,
+    }
+
+
+def template_recommendation(analysis, student_name=''):
+    """
+    Deterministic advice for a priority analysis, shaped like the
+    student_decision_advisor output. Used when the advisor's model is
+    unavailable.
+    """
+    task = analysis.get('topPriorityTask')
+    if not task:
+        return {
+            "recommendation": "No upcoming deadlines were found, so use today to review your notes and plan the week.",
+            "actionableSteps": ["Review this week's lecture notes", "List your upcoming assignments", "Plan your study sessions"],
+            "estimatedDuration": "1-2 hours",
+            "confidence": 0.5,
+        }
+    reasoning = analysis.get('reasoning') or {}
+    urgency = _number(analysis.get('urgencyScore'), 0.5)
+    greeting = f"{student_name}, focus" if student_name else "Focus"
+    why = reasoning.get('deadlineProximity') or reasoning.get('moduleWeight')
+    return {
+        "recommendation": f"{greeting} on {task} today." + (f" {why.rstrip('.')}." if why else ''),
+        "actionableSteps": [
+            f"Review what {task} requires",
+            "Break it into parts and start with the hardest one",
+            "Set a checkpoint to review your progress before the end of the day",
+        ],
+        "estimatedDuration": "3-4 hours" if urgency >= 0.7 else "1-2 hours",
+        "confidence": round(min(_number(analysis.get('confidenceLevel'), 0.5), 0.6), 3),
+    }
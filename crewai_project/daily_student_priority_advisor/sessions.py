@@ -0,0 +1,127 @@
+"""
+Per-student planning sessions for incremental re-prioritization
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from .caching import LRUCache, SQLiteCache, TieredCache
+from .metrics import metrics
+
+metrics.describe('planning_session_deltas_total', 'Task deltas applied to planning sessions, by operation')
+
+DELTA_OPS = ('add', 'edit', 'remove')
+
+
+class DeltaError(ValueError):
+    """A task delta that cannot be applied to the session"""
+
+
+def document_id(pdf_bytes):
+    """Identifier of an uploaded document, returned to clients by /run"""
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+def task_from_data(data, task_id=None):
+    """Session task from a delta's task fields or a /run request's other_data"""
+    return {
+        'id': str(task_id if task_id is not None else data.get('id', '')),
+        'description': data.get('description', data.get('new_task_description', '')),
+        'deadline': data.get('deadline', data.get('task_deadline', '')),
+        'module_coefficient': data.get('module_coefficient', 1),
+    }
+
+
+def apply_delta(tasks, delta):
+    """
+    Return the task list with one delta applied. A delta is
+    ``{"op": "add" | "edit" | "remove", "task": {"id", "description",
+    "deadline", "module_coefficient"}}``; editing only changes the fields
+    given, and adding an existing id replaces that task.
+    """
+    if not isinstance(delta, dict) or delta.get('op') not in DELTA_OPS:
+        raise DeltaError(f"Delta op must be one of {', '.join(DELTA_OPS)}")
+    task = delta.get('task')
+    if not isinstance(task, dict) or task.get('id') in (None, ''):
+        raise DeltaError("Delta task must be an object with an id")
+    task_id = str(task['id'])
+    by_id = {t['id']: t for t in tasks}
+    op = delta['op']
+
+    if op == 'remove':
+        if task_id not in by_id:
+            raise DeltaError(f"Unknown task {task_id}")
+        tasks = [t for t in tasks if t['id'] != task_id]
+    elif op == 'edit':
+        if task_id not in by_id:
+            raise DeltaError(f"Unknown task {task_id}")
+        updates = {key: task[key] for key in ('description', 'deadline', 'module_coefficient') if key in task}
+        tasks = [dict(t, **updates) if t['id'] == task_id else t for t in tasks]
+    else:
+        new_task = task_from_data(task, task_id)
+        if not new_task['description']:
+            raise DeltaError("Added tasks need a description")
+        tasks = [t for t in tasks if t['id'] != task_id] + [new_task]
+
+    metrics.inc('planning_session_deltas_total', op=op)
+    return tasks
+
+
+class PlanningSessions:
+    """
+    Last extracted planning data and the student's own tasks, per student
+    and document, so a task edit only re-runs the priority ranking and advice.
+    Sessions are stored as JSON in a tiered cache; ``lock()`` serializes
+    read-modify-write updates of one session within this process.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    @staticmethod
+    def key_for(student_id, doc_id):
+        return f"{student_id}:{doc_id}"
+
+    @contextmanager
+    def lock(self, student_id, doc_id):
+        key = self.key_for(student_id, doc_id)
+        with self._locks[hash(key) % len(self._locks)]:
+            yield
+
+    def load(self, student_id, doc_id):
+        value = self.cache.get(self.key_for(student_id, doc_id))
+        return json.loads(value) if value is not None else None
+
+    def save(self, student_id, doc_id, planning_data, tasks):
+        session = {
+            'planning_data': planning_data,
+            'tasks': tasks,
+            'updated_at': time.time(),
+        }
+        self.cache.put(self.key_for(student_id, doc_id), json.dumps(session))
+        return session
+
+
+def create_planning_sessions():
+    """Build the session store from PLANNING_SESSION_* environment settings"""
+    ttl = float(os.getenv('PLANNING_SESSION_TTL', str(7 * 24 * 3600)))
+    memory = LRUCache(
+        max_items=int(os.getenv('PLANNING_SESSION_MEMORY_ITEMS', '4096')),
+        ttl=ttl,
+        name='planning_session',
+    )
+    disk = None
+    path = os.getenv('PLANNING_SESSION_PATH', os.path.join('.cache', 'planning_sessions.sqlite3'))
+    if path:
+        disk = SQLiteCache(
+            path,
+            table='planning_sessions',
+            ttl=ttl,
+            max_bytes=int(os.getenv('PLANNING_SESSION_MAX_BYTES', str(256 * 1024 * 1024))),
+            name='planning_session',
+        )
+    return PlanningSessions(TieredCache(memory, disk, name='planning_session'))
@@ -0,0 +1,199 @@
+"""
+Precomputed "today's priority" per student, refreshed before the morning peak
+"""
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .caching import LRUCache, SQLiteCache, TieredCache
+from .metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process refreshes, skipping students already done
+    fcntl = None
+
+metrics.describe('priority_snapshot_requests_total', 'GET /priority lookups, by result (hit or miss)')
+metrics.describe('priority_snapshot_refreshes_total', 'Snapshots computed by the scheduler, by outcome')
+metrics.describe('priority_snapshot_refresh_seconds', 'Time to compute one student\'s snapshot', 'histogram')
+metrics.describe('priority_snapshot_last_refresh', 'Unix time the last scheduled refresh finished', 'gauge')
+
+
+def today():
+    return datetime.date.today().isoformat()
+
+
+class PrioritySnapshots:
+    """
+    Each active student's recommendation for a day, precomputed from their
+    stored planning data, and the roster of active students: whoever sent a
+    PDF to /run within ``roster_ttl`` seconds, with the request settings to
+    reuse. Both are tiered caches, so a lookup is a single key read.
+    """
+
+    def __init__(self, cache, roster):
+        self.cache = cache
+        self.roster = roster
+
+    @staticmethod
+    def key_for(student_id, date):
+        return f"{student_id}:{date}"
+
+    def get(self, student_id, date=None):
+        value = self.cache.get(self.key_for(student_id, date or today()))
+        return json.loads(value) if value is not None else None
+
+    def put(self, student_id, date, response):
+        snapshot = dict(response, snapshot_date=date, computed_at=time.time())
+        self.cache.put(self.key_for(student_id, date), json.dumps(snapshot))
+        return snapshot
+
+    def register(self, student_id, doc_id, other_data):
+        """Remember the student's latest document and settings (merged with earlier ones) for the next refresh"""
+        known = self.student(student_id)
+        settings = dict(known['other_data'] if known else {})
+        settings.update((key, value) for key, value in other_data.items() if key != 'current_date')
+        self.roster.put(student_id, json.dumps({'document_id': doc_id, 'other_data': settings}))
+
+    def student(self, student_id):
+        value = self.roster.get(student_id)
+        return json.loads(value) if value is not None else None
+
+    def students(self):
+        """``(student_id, entry)`` for every active student"""
+        return [(student_id, json.loads(value)) for student_id, value in self.roster.items()]
+
+
+class SnapshotScheduler:
+    """
+    Background thread that, every day at ``refresh_at`` (local "HH:MM"),
+    computes today's snapshot for every active student that does not have
+    one yet. Students are spread at random over ``jitter_seconds`` and at
+    most ``concurrency`` are computed at once, so the refresh itself does not
+    become a burst on the crew pool.
+
+    ``compute(student_id, entry, date)`` returns the response to store. With
+    several server processes, a lock file lets one process run each refresh.
+    """
+
+    def __init__(self, snapshots, compute, refresh_at='05:30', jitter_seconds=1800, concurrency=2,
+                 lock_path=None):
+        self.snapshots = snapshots
+        self.compute = compute
+        self.refresh_at = datetime.datetime.strptime(refresh_at, '%H:%M').time()
+        self.jitter_seconds = max(0.0, float(jitter_seconds))
+        self.concurrency = max(1, int(concurrency))
+        self.lock_path = lock_path
+        self._stop = threading.Event()
+        self._thread = None
+        self._random = random.Random()
+
+    def start(self):
+        """Start the refresh thread (once per process)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='priority-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def seconds_until_next(self, now=None):
+        now = now or datetime.datetime.now()
+        run_at = datetime.datetime.combine(now.date(), self.refresh_at)
+        if run_at <= now:
+            run_at += datetime.timedelta(days=1)
+        return (run_at - now).total_seconds()
+
+    def _loop(self):
+        while not self._stop.wait(self.seconds_until_next()):
+            try:
+                self.refresh()
+            except Exception:
+                # A failed refresh must not stop tomorrow's
+                metrics.inc('priority_snapshot_refreshes_total', outcome='aborted')
+
+    def refresh(self, date=None):
+        """Compute the missing snapshots for ``date`` (default today); returns how many were computed"""
+        date = date or today()
+        with self._exclusive() as owner:
+            if not owner:
+                return 0
+            pending = [(student_id, entry) for student_id, entry in self.snapshots.students()
+                       if self.snapshots.get(student_id, date) is None]
+            offsets = sorted((self._random.uniform(0, self.jitter_seconds), student_id, entry)
+                             for student_id, entry in pending)
+            started = time.monotonic()
+            computed = []
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='priority-refresh') as executor:
+                slots = threading.BoundedSemaphore(self.concurrency)
+                for offset, student_id, entry in offsets:
+                    if self._stop.wait(max(0.0, started + offset - time.monotonic())):
+                        break
+                    slots.acquire()
+                    future = executor.submit(self._refresh_one, student_id, entry, date)
+                    future.add_done_callback(lambda f: slots.release())
+                    computed.append(future)
+            metrics.set('priority_snapshot_last_refresh', time.time())
+            return sum(1 for future in computed if future.result())
+
+    def _refresh_one(self, student_id, entry, date):
+        started = time.perf_counter()
+        try:
+            response = self.compute(student_id, entry, date)
+        except Exception:
+            metrics.inc('priority_snapshot_refreshes_total', outcome='error')
+            return False
+        if response is None:
+            # The student's planning data is gone: drop them from the roster
+            self.snapshots.roster.delete(student_id)
+            metrics.inc('priority_snapshot_refreshes_total', outcome='expired')
+            return False
+        self.snapshots.put(student_id, date, response)
+        metrics.observe('priority_snapshot_refresh_seconds', time.perf_counter() - started)
+        metrics.inc('priority_snapshot_refreshes_total', outcome='success')
+        return True
+
+    @contextmanager
+    def _exclusive(self):
+        """Yield whether this process may run the refresh (it holds the lock file)"""
+        if self.lock_path is None or fcntl is None:
+            yield True
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.lock_path)), exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Another process is running this refresh
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def create_priority_snapshots():
+    """Build the snapshot store and roster from PRIORITY_SNAPSHOT_* environment settings"""
+    path = os.getenv('PRIORITY_SNAPSHOT_PATH', os.path.join('.cache', 'priority_snapshots.sqlite3'))
+    # Snapshots are only looked up for their own day
+    snapshot_ttl = 2 * 24 * 3600
+    roster_ttl = float(os.getenv('PRIORITY_SNAPSHOT_ACTIVE_DAYS', '14')) * 24 * 3600
+    max_items = int(os.getenv('PRIORITY_SNAPSHOT_MEMORY_ITEMS', '4096'))
+
+    def tier(table, ttl, name):
+        memory = LRUCache(max_items=max_items, ttl=ttl, name=name)
+        disk = SQLiteCache(path, table=table, ttl=ttl, name=name) if path else None
+        return TieredCache(memory, disk, name=name)
+
+    return PrioritySnapshots(
+        tier('priority_snapshots', snapshot_ttl, 'priority_snapshot'),
+        tier('active_students', roster_ttl, 'active_students'),
+    )
@@ -0,0 +1,194 @@
+"""
+Local multi-day study planner for extracted planning data
+
+Finds the free time left around each day's classes and commitments (see
+recurrence.py) and packs study blocks for exams, assignments and tasks into
+it, most urgent first (urgency as in scoring.score_priorities, so deadlines,
+grade weight and module credits all count), with the effort of each item
+scaled by its grade weight and module importance. Pure Python and a single
+NumPy scoring pass: a week for a semester's worth of items takes
+milliseconds.
+"""
+import datetime
+
+from .recurrence import DAY_END_MINUTES, DAY_START_MINUTES, Schedule
+from .scoring import parse_date, score_priorities
+
+BLOCK_MINUTES = 60
+# Free gaps shorter than this are not worth a study block
+MIN_BLOCK_MINUTES = 30
+MAX_DAILY_MINUTES = 6 * 60
+# At most this much time per item per day, so preparation is spread out
+MAX_ITEM_DAILY_MINUTES = 2 * 60
+# Preparation time for an item of average grade weight and module importance
+BASE_MINUTES = {'exam': 600, 'assignment': 360, 'task': 180}
+
+
+def free_slots(busy, day_start=DAY_START_MINUTES, day_end=DAY_END_MINUTES):
+    """Free ``[start, end)`` intervals of a day's study window around the busy intervals"""
+    slots = []
+    cursor = day_start
+    for start, end in sorted(busy):
+        if start > cursor:
+            slots.append([cursor, min(start, day_end)])
+        cursor = max(cursor, end)
+        if cursor >= day_end:
+            break
+    if cursor < day_end:
+        slots.append([cursor, day_end])
+    return [slot for slot in slots if slot[1] - slot[0] >= MIN_BLOCK_MINUTES]
+
+
+def required_minutes(item, block_minutes=BLOCK_MINUTES):
+    """Preparation time for a ranked item, scaled by grade weight and module importance"""
+    factors = item.get('factors') or {}
+    minutes = (
+        BASE_MINUTES.get(item.get('type'), BASE_MINUTES['task'])
+        * (0.75 + 0.5 * factors.get('weight', 0.2))
+        * (0.75 + 0.5 * factors.get('module', 0.5))
+    )
+    blocks = max(1, -(-int(minutes) // block_minutes))
+    return blocks * block_minutes
+
+
+def _clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def build_study_plan(planning_data, start_date='', days=7, tasks=None, new_task_description='',
+                     task_deadline='', module_coefficient=1, confidence_level='medium',
+                     block_minutes=BLOCK_MINUTES, max_daily_minutes=MAX_DAILY_MINUTES):
+    """
+    Plan study blocks over ``days`` days from ``start_date`` (default today).
+    Returns ``{"startDate", "days": [{"date", "blocks", "busyMinutes",
+    "studyMinutes"}], "items": [...], "unscheduled": [...], "overdue": [...]}``
+    where each block is ``{"start", "end", "task", "type", "module"}`` and
+    ``unscheduled`` lists the time missing for items due within the period.
+    Items are planned most urgent first, each no later than the day before
+    an exam or the day an assignment or task is due.
+    """
+    planning_data = planning_data if isinstance(planning_data, dict) else {}
+    start = parse_date(start_date) or datetime.date.today()
+    days = max(1, int(days))
+    dates = [start + datetime.timedelta(days=offset) for offset in range(days)]
+    schedule = Schedule.from_planning_data(planning_data, anchor=start)
+    analysis = score_priorities(
+        planning_data,
+        current_date=start.isoformat(),
+        module_coefficient=module_coefficient,
+        task_deadline=task_deadline,
+        confidence_level=confidence_level,
+        new_task_description=new_task_description,
+        tasks=tasks,
+        schedule=schedule,
+    )
+
+    busy_by_day = []
+    slots_by_day = []
+    for date in dates:
+        busy_by_day.append(schedule.busy_minutes(date))
+        slots_by_day.append(free_slots(schedule.busy_intervals(date)))
+    planned_by_day = [0] * days
+    blocks_by_day = [[] for _ in dates]
+
+    items, unscheduled, overdue = [], [], []
+    for item in analysis['ranking']:
+        deadline = parse_date(item.get('deadline'))
+        if deadline is not None and deadline < start:
+            overdue.append(item['name'])
+            continue
+        last_day = days - 1
+        if deadline is not None:
+            last_day = min(last_day, (deadline - start).days - (1 if item['type'] == 'exam' else 0))
+        required = required_minutes(item, block_minutes)
+        remaining = required
+        for day in range(max(0, last_day + 1)):
+            if remaining <= 0:
+                break
+            today_budget = min(MAX_ITEM_DAILY_MINUTES, max_daily_minutes - planned_by_day[day], remaining)
+            slots = slots_by_day[day]
+            while today_budget >= MIN_BLOCK_MINUTES and slots:
+                slot = slots[0]
+                length = min(block_minutes, slot[1] - slot[0], today_budget)
+                if length < MIN_BLOCK_MINUTES:
+                    slots.pop(0)
+                    continue
+                blocks_by_day[day].append({
+                    "start": _clock(slot[0]),
+                    "end": _clock(slot[0] + length),
+                    "task": item['name'],
+                    "type": item['type'],
+                    "module": item.get('module'),
+                })
+                slot[0] += length
+                if slot[1] - slot[0] < MIN_BLOCK_MINUTES:
+                    slots.pop(0)
+                planned_by_day[day] += length
+                today_budget -= length
+                remaining -= length
+        items.append({
+            "name": item['name'],
+            "type": item['type'],
+            "deadline": item.get('deadline'),
+            "urgencyScore": item['urgencyScore'],
+            "requiredMinutes": required,
+            "plannedMinutes": required - max(remaining, 0),
+        })
+        # Work left on items due after the planned period can still be done later
+        if remaining > 0 and deadline is not None and (deadline - start).days < days:
+            unscheduled.append({"task": item['name'], "minutes": remaining})
+
+    return {
+        "startDate": start.isoformat(),
+        "days": [
+            {
+                "date": date.isoformat(),
+                "blocks": sorted(blocks_by_day[i], key=lambda block: block['start']),
+                "busyMinutes": busy_by_day[i],
+                "studyMinutes": planned_by_day[i],
+            }
+            for i, date in enumerate(dates)
+        ],
+        "items": items,
+        "unscheduled": unscheduled,
+        "overdue": overdue,
+    }
+
+
+def plan_summary(plan):
+    """Short plain-text summary of a study plan, used when the LLM does not phrase it"""
+    planned = [item for item in plan['items'] if item['plannedMinutes']]
+    if not planned:
+        return "Nothing needs preparing in this period; keep up with your classes."
+    top = planned[0]
+    total_hours = sum(day['studyMinutes'] for day in plan['days']) / 60
+    first_day = next((day for day in plan['days'] if day['blocks']), None)
+    text = (
+        f"Plan {total_hours:g} hours of study over {len(plan['days'])} days, "
+        f"starting with {top['name']} ({top['plannedMinutes'] / 60:g}h)."
+    )
+    if first_day:
+        first = first_day['blocks'][0]
+        text += f" First block: {first['task']} on {first_day['date']} at {first['start']}."
+    if plan['unscheduled']:
+        text += f" {len(plan['unscheduled'])} item(s) do not fit; consider freeing up time."
+    return text
+
+
+def plan_digest(plan, max_items=10):
+    """The parts of a plan the LLM needs to phrase it: the planned items and each day's tasks"""
+    return {
+        "items": [
+            {key: item[key] for key in ('name', 'type', 'deadline', 'plannedMinutes')}
+            for item in plan['items'][:max_items] if item['plannedMinutes']
+        ],
+        "days": [
+            {
+                "date": day['date'],
+                "studyMinutes": day['studyMinutes'],
+                "tasks": list(dict.fromkeys(block['task'] for block in day['blocks'])),
+            }
+            for day in plan['days']
+        ],
+        "unscheduled": plan['unscheduled'],
+    }
@@ -3,9 +3,6 @@ Demo script showing the core functionality of the Daily Student Priority Advisor
 This is a simplified version that works with Python 3.9
 """
 import os
-from crewai import Agent, Crew, Process, Task
-from crewai_tools import FileReadTool
-from langchain_google_generativeai import ChatGoogleGenerativeAI
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,6 +10,10 @@ load_dotenv()
 
 def create_daily_student_priority_advisor():
     """Create and run the daily student priority advisor crew"""
+    # Imported here so that importing this module stays cheap
+    from crewai import Agent, Crew, Process, Task
+    from crewai_tools import FileReadTool
+    from langchain_google_generativeai import ChatGoogleGenerativeAI
     
     # Initialize the LLM with Google Gemini
     try:
@@ -0,0 +1,57 @@
+"""
+Production launcher settings for server.py
+
+    gunicorn -c gunicorn.conf.py server:app
+
+The app (CrewAI imports, configuration, pre-built crew pool) is loaded once
+in the master process and N workers are forked from it, so they start warm
+and share the loaded modules copy-on-write; set WARMUP=0 to defer the CrewAI
+imports to each worker's first crew run instead. Workers share the extraction,
+recommendation, session and job stores through SQLite WAL files under
+.cache/, and are recycled after about MAX_REQUESTS requests to bound memory
+growth, finishing their in-flight requests and queued jobs first.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Load server.py, including the CrewAI stack and the crews, before forking
+# the workers, so none of them pays for it on its first request
+preload_app = True
+os.environ.setdefault('WARMUP', '1')
+
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count()))))
+# Threaded workers: each serves as many concurrent requests as it has crews
+worker_class = 'gthread'
+threads = int(os.getenv('WORKER_THREADS', os.getenv('CREW_POOL_SIZE', '4')))
+
+# Recycle workers after MAX_REQUESTS (+ jitter, so they do not all restart at once)
+max_requests = int(os.getenv('MAX_REQUESTS', '500'))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', '50'))
+
+# A full crew run can take minutes; allow it to finish on restarts and reloads
+timeout = int(os.getenv('WORKER_TIMEOUT', '300'))
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', '120'))
+keepalive = 5
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers do not touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive the fork: start the morning priority refresh in
+    # each worker (a lock file lets one of them run it)
+    from server import start_scheduler
+    start_scheduler()
+
+
+def worker_exit(server, worker):
+    # Let jobs accepted by this worker finish before it is replaced
+    from server import job_manager
+    job_manager.shutdown(wait=True, cancel_queued=False)
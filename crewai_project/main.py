@@ -1,19 +1,43 @@
 """
 Main entry point for the Daily Student Priority Advisor CrewAI system
 """
-import os
-from daily_student_priority_advisor.crew import DailyStudentPriorityAdvisorCrew
+import argparse
 
-def run():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Daily Student Priority Advisor crew on sample inputs")
+    parser.add_argument('--warmup', action='store_true',
+                        help="Only load CrewAI and build the crew, then exit (e.g. to prime a container image)")
+    parser.add_argument('--cassette', choices=['record', 'replay', 'auto'],
+                        help="Record the LLM responses to a cassette, or replay them offline (default: LLM_CASSETTE_MODE)")
+    parser.add_argument('--cassette-path', help="Cassette file (default: LLM_CASSETTE_PATH or .cache/llm_cassette.jsonl)")
+    parser.add_argument('--cassette-latency', default=None,
+                        help="Replay delay per call: seconds, or 'recorded' for each call's recorded time (default none)")
+    return parser.parse_args(argv)
+
+def run(argv=None):
     """
     Run the crew.
     """
-    inputs = {
-        'student_name': 'Ahmed',
-        'current_date': '2024-12-20',
-        'pdf_content': 'Sample PDF content for testing'
-    }
-    DailyStudentPriorityAdvisorCrew().crew().kickoff(inputs=inputs)
+    args = parse_args(argv)
+    # CrewAI is imported only once the arguments are parsed, so --help is instant
+    from daily_student_priority_advisor.crew import DailyStudentPriorityAdvisorCrew, build_inputs
+    from daily_student_priority_advisor.cassette import llm_cassette
+
+    if args.cassette or args.cassette_path or args.cassette_latency is not None:
+        llm_cassette.configure(
+            mode=args.cassette or llm_cassette.mode,
+            path=args.cassette_path or llm_cassette.path,
+            latency=args.cassette_latency if args.cassette_latency is not None else llm_cassette.latency,
+        )
+    crew = DailyStudentPriorityAdvisorCrew().crew()
+    if args.warmup:
+        return
+    inputs = build_inputs(
+        student_name='Ahmed',
+        current_date='2024-12-20',
+        pdf_content='Sample PDF content for testing'
+    )
+    crew.kickoff(inputs=inputs)
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
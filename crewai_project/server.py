@@ -1,16 +1,158 @@
 """
 Flask server to expose the Daily Student Priority Advisor CrewAI functionality as an API
 """
+import datetime
+import io
 import os
-import tempfile
+import queue
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, request, jsonify
 from werkzeug.utils import secure_filename
-from daily_student_priority_advisor.crew import DailyStudentPriorityAdvisorCrew
+from daily_student_priority_advisor.defaults import ADVICE_TASK, DECISION_TASK, EXTRACTION_TASK, REQUEST_INPUTS, build_inputs
+from daily_student_priority_advisor.crew_pool import CrewPool, CrewPoolExhausted
+from daily_student_priority_advisor.extraction_cache import create_extraction_cache
+from daily_student_priority_advisor.caching import SQLiteCache
+from daily_student_priority_advisor.cassette import llm_cassette
+from daily_student_priority_advisor.coalescing import SingleFlight, request_key
+from daily_student_priority_advisor.jobs import FINISHED, JobManager, JobQueueFull
+from daily_student_priority_advisor.instrumentation import profiler, span, trace_request
+from daily_student_priority_advisor.metrics import metrics
+from daily_student_priority_advisor.pipeline import PRIORITY_MODES, AdvisorPipeline
+from daily_student_priority_advisor.planning_store import ITEM_TYPES, create_planning_store
+from daily_student_priority_advisor.progress import parse_task_output
+from daily_student_priority_advisor.recommendation_cache import create_recommendation_cache
+from daily_student_priority_advisor.resilience import UpstreamUnavailable, llm_resilience
+from daily_student_priority_advisor.sessions import DeltaError, apply_delta, create_planning_sessions, document_id, task_from_data
+from daily_student_priority_advisor.snapshots import SnapshotScheduler, create_priority_snapshots, today
+
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling them to temporary files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Uploads are bounded by MAX_CONTENT_LENGTH
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryRequest
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
+# Pre-built crews shared by all requests handled by this worker. CrewAI is
+# only imported when the first crew runs, unless WARMUP loads it up front
+CREW_POOL_SIZE = int(os.getenv('CREW_POOL_SIZE', '4'))
+CREW_POOL_TIMEOUT = float(os.getenv('CREW_POOL_TIMEOUT', '30'))
+crew_pool = CrewPool(size=CREW_POOL_SIZE, timeout=CREW_POOL_TIMEOUT)
+# Each crew makes one LLM call at a time; size the call threads (with room for hedges) to match
+llm_resilience.size_for(CREW_POOL_SIZE)
+WARMUP = os.getenv('WARMUP', '0').lower() in ('1', 'true', 'yes')
+
+# Final recommendations keyed on the normalized priority analysis, so students
+# with equivalent priorities skip the advisor agent (None when disabled)
+recommendation_cache = create_recommendation_cache(model=crew_pool.model_for(ADVICE_TASK))
+
+# 'llm' asks the decision agent; 'local' scores priorities in-process and only
+# falls back to the agent when the top scores are within PRIORITY_TIE_MARGIN
+PRIORITY_MODE = os.getenv('PRIORITY_MODE', 'llm')
+PRIORITY_TIE_MARGIN = float(os.getenv('PRIORITY_TIE_MARGIN', '0.05'))
+# Upper bound on PDF text handed to the reader agent, in characters
+MAX_PDF_TEXT_CHARS = int(os.getenv('MAX_PDF_TEXT_CHARS', '60000'))
+
+# 'chunked' splits long PDFs into page chunks extracted in parallel
+EXTRACTION_MODE = os.getenv('EXTRACTION_MODE', 'single')
+EXTRACTION_CHUNK_PAGES = int(os.getenv('EXTRACTION_CHUNK_PAGES', '4'))
+EXTRACTION_PARALLELISM = int(os.getenv('EXTRACTION_PARALLELISM', str(CREW_POOL_SIZE)))
+
+# Extraction results keyed by PDF content and the settings that shape them,
+# so re-uploads skip the PDF reader
+extraction_cache = create_extraction_cache(
+    model=crew_pool.model_for(EXTRACTION_TASK),
+    settings={
+        'extraction_mode': EXTRACTION_MODE,
+        'max_pdf_chars': MAX_PDF_TEXT_CHARS,
+        'chunk_pages': EXTRACTION_CHUNK_PAGES,
+    },
+)
+
+# Tokens the planning data and the priority analysis may take up in the
+# prompts of the tasks that read them (0 for no limit)
+PLANNING_DATA_TOKEN_BUDGET = int(os.getenv('PLANNING_DATA_TOKEN_BUDGET', '2000'))
+PRIORITY_ANALYSIS_TOKEN_BUDGET = int(os.getenv('PRIORITY_ANALYSIS_TOKEN_BUDGET', '400'))
+pipeline = AdvisorPipeline(
+    crew_pool,
+    extraction_cache,
+    priority_mode=PRIORITY_MODE,
+    tie_margin=PRIORITY_TIE_MARGIN,
+    max_pdf_chars=MAX_PDF_TEXT_CHARS,
+    extraction_mode=EXTRACTION_MODE,
+    chunk_pages=EXTRACTION_CHUNK_PAGES,
+    extraction_parallelism=EXTRACTION_PARALLELISM,
+    recommendation_cache=recommendation_cache,
+    token_budgets={
+        EXTRACTION_TASK: PLANNING_DATA_TOKEN_BUDGET,
+        DECISION_TASK: PRIORITY_ANALYSIS_TOKEN_BUDGET,
+    },
+)
+
+# Last planning data and tasks per student and document, for POST /run/delta
+planning_sessions = create_planning_sessions()
+
+# Every extracted item per student, indexed by date, type and module, for
+# GET /deadlines/<student> (kept for PLANNING_STORE_TTL seconds after the
+# student's last update)
+planning_store = create_planning_store()
+# Longest window GET /deadlines accepts, in days
+DEADLINES_MAX_DAYS = int(os.getenv('DEADLINES_MAX_DAYS', '366'))
+
+# Today's recommendation per active student, served by GET /priority/<student>
+# and precomputed every morning from their planning session at
+# PRIORITY_REFRESH_AT (local HH:MM, empty disables the refresh), spread over
+# PRIORITY_REFRESH_JITTER seconds with PRIORITY_REFRESH_CONCURRENCY at once
+priority_snapshots = create_priority_snapshots()
+PRIORITY_REFRESH_AT = os.getenv('PRIORITY_REFRESH_AT', '05:30')
+PRIORITY_REFRESH_JITTER = float(os.getenv('PRIORITY_REFRESH_JITTER', '1800'))
+PRIORITY_REFRESH_CONCURRENCY = int(os.getenv('PRIORITY_REFRESH_CONCURRENCY', '2'))
+
+# Identical /run requests (double taps, app retries) share one computation
+# while it runs, and its response for RUN_DEDUP_TTL seconds after (0: only
+# while it runs)
+RUN_DEDUP_TTL = float(os.getenv('RUN_DEDUP_TTL', '30'))
+run_flights = SingleFlight(ttl=RUN_DEDUP_TTL, name='run')
+
+# Batch runs: concurrent per-student stages and maximum entries per request
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', str(CREW_POOL_SIZE)))
+BATCH_MAX_ENTRIES = int(os.getenv('BATCH_MAX_ENTRIES', '500'))
+
+# Longest study plan POST /plan builds, in days
+PLAN_MAX_DAYS = int(os.getenv('PLAN_MAX_DAYS', '120'))
+# Most plans one POST /plan may have phrased by the advisor's model: each is a
+# sequential LLM call made while the request waits
+PLAN_MAX_PHRASED = int(os.getenv('PLAN_MAX_PHRASED', '10'))
+
+# Background jobs for POST /jobs; a full queue is rejected with 429
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', str(CREW_POOL_SIZE)))
+JOB_QUEUE_DEPTH = int(os.getenv('JOB_QUEUE_DEPTH', '32'))
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '3600'))
+JOB_MAX_WAIT = 60  # longest long-poll accepted by GET /jobs/<id>?wait=
+# Job states are also published to JOB_STORE_PATH so that, with several worker
+# processes, any of them can answer for a job (empty disables the store)
+JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join('.cache', 'jobs.sqlite3'))
+job_store = SQLiteCache(JOB_STORE_PATH, table='jobs', ttl=JOB_RESULT_TTL, name='jobs') if JOB_STORE_PATH else None
+job_manager = JobManager(workers=JOB_WORKERS, queue_depth=JOB_QUEUE_DEPTH, result_ttl=JOB_RESULT_TTL, store=job_store)
+
+# Opt-in profiling: a PROFILE_SAMPLE_RATE fraction of requests is sampled and
+# written to PROFILE_DIR when it takes longer than PROFILE_SLOW_SECONDS
+profiler.configure(
+    sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0')),
+    slow_seconds=float(os.getenv('PROFILE_SLOW_SECONDS', '10')),
+    directory=os.getenv('PROFILE_DIR', os.path.join('.cache', 'profiles')),
+)
+
+def warmup():
+    """Load the CrewAI stack and build the crew pool now instead of on the first request"""
+    crew_pool.warmup()
+
+if WARMUP:
+    warmup()
+
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf'}
 
@@ -20,94 +162,664 @@ def allowed_file(filename):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "message": "Daily Student Priority Advisor API is running"}), 200
+    return jsonify({
+        "status": "healthy",
+        "message": "Daily Student Priority Advisor API is running",
+        "warm": crew_pool.warm,
+        "models": crew_pool.models,
+        "llm_cassette": llm_cassette.mode,
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+class RequestError(Exception):
+    """Invalid client request, reported as a JSON error with the given status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def parse_run_request():
+    """Validate a /run style multipart request and return (pdf_bytes, other_data)"""
+    # Check if request has the required parts
+    if 'file' not in request.files:
+        raise RequestError("No PDF file provided")
+        
+    file = request.files['file']
+    
+    # Check if file is selected
+    if file.filename == '':
+        raise RequestError("No file selected")
+        
+    # Validate file type
+    if not allowed_file(file.filename):
+        raise RequestError("Invalid file type. Only PDF files are allowed")
+    
+    # Get other data from form
+    other_data_str = request.form.get('other_data', '{}')
+    try:
+        other_data = json.loads(other_data_str)
+    except json.JSONDecodeError:
+        raise RequestError("Invalid JSON in other_data field")
+    
+    with span('read_upload'):
+        pdf_bytes = file.read()
+    return pdf_bytes, other_data
+
+def run_advisor(pdf_bytes, other_data, on_stage=None):
+    """
+    Run the advisor pipeline for one PDF and return the response payload.
+    ``on_stage`` receives a progress event as each stage of the crew finishes.
+
+    Without ``on_stage``, identical requests (same PDF bytes and other_data)
+    share one computation while it runs and for RUN_DEDUP_TTL seconds after;
+    the responses of the requests that joined it carry ``coalesced: true``.
+    """
+    if on_stage is not None:
+        return advise_on_pdf(pdf_bytes, other_data, on_stage)
+    response, shared = run_flights.do(
+        request_key(pdf_bytes, other_data),
+        lambda: advise_on_pdf(pdf_bytes, other_data),
+    )
+    return dict(response, coalesced=shared)
+
+def advise_on_pdf(pdf_bytes, other_data, on_stage=None):
+    """Run the advisor pipeline for one PDF (see run_advisor)"""
+    with trace_request('advisor') as trace:
+        # Prepare inputs for the crew
+        inputs = request_inputs(other_data)
+        
+        outcome = pipeline.run(
+            pdf_bytes,
+            inputs,
+            priority_mode=other_data.get('priority_mode'),
+            on_stage=on_stage,
+        )
+        
+        with trace.span('serialize'):
+            response = outcome_response(outcome, inputs)
+        
+        # Start a fresh session so later task edits can go through /run/delta
+        doc_id = document_id(pdf_bytes)
+        tasks = [task_from_data(other_data, other_data.get('task_id', 'task-1'))] if inputs['new_task_description'] else []
+        student = student_id(other_data)
+        if student is not None:
+            with span('session_save'):
+                planning_sessions.save(student, doc_id, outcome['planning_data'], tasks)
+            with span('planning_store'):
+                planning_store.upsert(student, doc_id, outcome['planning_data'], tasks)
+        response["document_id"] = doc_id
+        response["tasks"] = tasks
+        response["timings"] = trace.summary()
+        if student is not None:
+            save_snapshot(student, other_data, doc_id, inputs, response)
+        return response
+
+def save_snapshot(student, other_data, doc_id, inputs, response):
+    """Keep a fresh response as the student's priority for its day, and the student on the refresh roster"""
+    with span('snapshot_save'):
+        priority_snapshots.register(student, doc_id, other_data)
+        priority_snapshots.put(student, inputs['current_date'] or today(), response)
+
+def compute_priority(student, entry, date):
+    """
+    A student's response for ``date`` from their stored planning session
+    (see PrioritySnapshots.register), or None when the session has expired
+    """
+    doc_id = entry['document_id']
+    session = planning_sessions.load(student, doc_id)
+    if session is None:
+        return None
+    other_data = dict(entry['other_data'], current_date=date)
+    with trace_request('priority') as trace:
+        inputs = request_inputs(other_data)
+        outcome = pipeline.decide(
+            session['planning_data'],
+            inputs,
+            priority_mode=other_data.get('priority_mode'),
+            tasks=session['tasks'],
+        )
+        with trace.span('serialize'):
+            response = outcome_response(outcome, inputs)
+        response["document_id"] = doc_id
+        response["tasks"] = session['tasks']
+        response["timings"] = trace.summary()
+    return response
+
+def priority_for(student, date):
+    """The stored snapshot for the student and day, else a live computation (None for unknown students)"""
+    snapshot = priority_snapshots.get(student, date)
+    if snapshot is not None:
+        metrics.inc('priority_snapshot_requests_total', result='hit')
+        return dict(snapshot, snapshot=True)
+    metrics.inc('priority_snapshot_requests_total', result='miss')
+    entry = priority_snapshots.student(student)
+    response = compute_priority(student, entry, date) if entry is not None else None
+    if response is None:
+        return None
+    return dict(priority_snapshots.put(student, date, response), snapshot=False)
+
+snapshot_scheduler = SnapshotScheduler(
+    priority_snapshots,
+    compute_priority,
+    refresh_at=PRIORITY_REFRESH_AT,
+    jitter_seconds=PRIORITY_REFRESH_JITTER,
+    concurrency=PRIORITY_REFRESH_CONCURRENCY,
+    lock_path=os.path.join('.cache', 'priority_refresh.lock'),
+) if PRIORITY_REFRESH_AT else None
+
+def start_scheduler():
+    """
+    Start the daily snapshot refresh in this process. Not done at import, so
+    a pre-fork master does not run it; gunicorn.conf.py starts it in each
+    worker and a lock file lets one of them run each refresh.
+    """
+    if snapshot_scheduler is not None:
+        snapshot_scheduler.start()
+
+def student_id(other_data):
+    """
+    Identifies the student's planning sessions, priority snapshots and stored
+    deadlines: ``student_id`` from other_data, or None when it is missing.
+    The student name is not used, as several students may share it.
+    """
+    student = other_data.get('student_id')
+    return str(student) if student not in (None, '') else None
+
+def request_inputs(other_data):
+    """Crew inputs from the other_data sent by the mobile app"""
+    return build_inputs(
+        student_name=other_data.get('student_name', 'Student'),
+        current_date=other_data.get('current_date', ''),
+        task_deadline=other_data.get('task_deadline', ''),
+        module_coefficient=other_data.get('module_coefficient', 1),
+        confidence_level=other_data.get('confidence_level', 'medium'),
+        new_task_description=other_data.get('new_task_description', ''),
+    )
+
+def result_text(result):
+    """Raw text of a crew result (str() of a CrewOutput is its model's repr)"""
+    return str(getattr(result, 'raw', result))
+
+def structured_fields(outcome, text):
+    """
+    The extractedData / priority / recommendation fields of the mock_server.py
+    response shape, from whichever stage outputs are structured
+    """
+    fields = {}
+    planning_data = parse_task_output(outcome.get("planning_data"))
+    if isinstance(planning_data, dict):
+        fields["extractedData"] = planning_data
+    analysis = outcome.get("priority_analysis")
+    if isinstance(analysis, dict):
+        for key in ("topPriorityTask", "urgencyScore", "reasoning"):
+            if key in analysis:
+                fields[key] = analysis[key]
+        urgency = analysis.get("urgencyScore")
+        if isinstance(urgency, (int, float)):
+            fields["priority"] = "high" if urgency > 0.7 else "medium" if urgency > 0.4 else "low"
+    advice = parse_task_output(text)
+    if isinstance(advice, dict):
+        if isinstance(advice.get("recommendation"), str):
+            fields["recommendation"] = advice["recommendation"]
+        for key in ("actionableSteps", "estimatedDuration", "confidence"):
+            if key in advice:
+                fields[key] = advice[key]
+    return fields
+
+def inputs_used(inputs):
+    """The request inputs, without the PDF text, handoffs and file paths the pipeline adds to them"""
+    return {key: inputs[key] for key in REQUEST_INPUTS if key in inputs}
+
+def outcome_response(outcome, inputs):
+    """Response payload for a pipeline outcome"""
+    text = result_text(outcome["result"])
+    response = {
+        "success": True,
+        "recommendation": text,
+        "extraction_cached": outcome.get("extraction_cached", False),
+        "priority_mode": outcome["priority_mode"],
+        "recommendation_cached": outcome.get("recommendation_cached", False),
+        # Set when the local scorer stood in for an unavailable decision model
+        "degraded": outcome.get("degraded", False),
+        "inputs_used": inputs_used(inputs)
+    }
+    if "priority_analysis" in outcome:
+        response["priority_analysis"] = outcome["priority_analysis"]
+    if "timings" in outcome:
+        response["timings"] = outcome["timings"]
+    # The recommendation becomes the advice sentence when the output is structured
+    response.update(structured_fields(outcome, text))
+    return response
 
 @app.route('/run', methods=['POST'])
 def run_crew():
     """Run the Daily Student Priority Advisor Crew with provided inputs"""
     try:
-        # Check if request has the required parts
-        if 'file' not in request.files:
-            return jsonify({"success": False, "error": "No PDF file provided"}), 400
+        with trace_request('run'):
+            pdf_bytes, other_data = parse_run_request()
+            return jsonify(run_advisor(pdf_bytes, other_data)), 200
             
-        file = request.files['file']
-        
-        # Check if file is selected
-        if file.filename == '':
-            return jsonify({"success": False, "error": "No file selected"}), 400
+    except RequestError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except CrewPoolExhausted as e:
+        return jsonify({"success": False, "error": f"Server busy: {str(e)}"}), 503
+    except UpstreamUnavailable as e:
+        return jsonify({"success": False, "error": f"Model unavailable: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+
+@app.route('/run/delta', methods=['POST'])
+def run_crew_delta():
+    """
+    Re-prioritize after the student adds, edits or removes one of their tasks.
+    Reuses the planning data extracted by an earlier /run for the same student
+    and document, so only the priority ranking and the advice are recomputed.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "error": "Expected a JSON body"}), 400
+    
+    doc_id = payload.get('document_id')
+    other_data = payload.get('other_data') or {}
+    deltas = payload.get('deltas', [payload['delta']] if 'delta' in payload else [])
+    if not doc_id:
+        return jsonify({"success": False, "error": "No document_id provided"}), 400
+    if not isinstance(deltas, list) or not deltas:
+        return jsonify({"success": False, "error": "No delta provided"}), 400
+    priority_mode = other_data.get('priority_mode', 'local')
+    if priority_mode not in PRIORITY_MODES:
+        return jsonify({"success": False, "error": f"Invalid priority_mode, expected one of {', '.join(PRIORITY_MODES)}"}), 400
+    student = student_id(other_data)
+    if student is None:
+        return jsonify({"success": False, "error": "No student_id provided in other_data"}), 400
+    
+    try:
+        with trace_request('delta') as trace:
+            with planning_sessions.lock(student, doc_id):
+                session = planning_sessions.load(student, doc_id)
+                if session is None:
+                    return jsonify({"success": False, "error": "Unknown student or document; send the PDF to /run first"}), 404
+                tasks = session['tasks']
+                for delta in deltas:
+                    tasks = apply_delta(tasks, delta)
+                planning_sessions.save(student, doc_id, session['planning_data'], tasks)
+                planning_store.upsert(student, doc_id, None, tasks)
             
-        # Validate file type
-        if not allowed_file(file.filename):
-            return jsonify({"success": False, "error": "Invalid file type. Only PDF files are allowed"}), 400
+            inputs = request_inputs(other_data)
+            outcome = pipeline.decide(
+                session['planning_data'],
+                inputs,
+                priority_mode=priority_mode,
+                tasks=tasks,
+            )
+            with trace.span('serialize'):
+                response = outcome_response(outcome, inputs)
+            response["document_id"] = doc_id
+            response["tasks"] = tasks
+            response["timings"] = trace.summary()
+            save_snapshot(student, other_data, doc_id, inputs, response)
+        return jsonify(response), 200
         
-        # Get other data from form
-        other_data_str = request.form.get('other_data', '{}')
+    except DeltaError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except CrewPoolExhausted as e:
+        return jsonify({"success": False, "error": f"Server busy: {str(e)}"}), 503
+    except UpstreamUnavailable as e:
+        return jsonify({"success": False, "error": f"Model unavailable: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+
+@app.route('/priority/<student>', methods=['GET'])
+def get_priority(student):
+    """
+    Today's priority for a student (or ``?date=YYYY-MM-DD``), precomputed by
+    the morning refresh or by their last /run; computed live on a miss from
+    the planning data of their last /run.
+    """
+    date = request.args.get('date') or today()
+    try:
+        datetime.date.fromisoformat(date)
+    except ValueError:
+        return jsonify({"success": False, "error": "Invalid date, expected YYYY-MM-DD"}), 400
+
+    try:
+        response = priority_for(student, date)
+    except CrewPoolExhausted as e:
+        return jsonify({"success": False, "error": f"Server busy: {str(e)}"}), 503
+    except UpstreamUnavailable as e:
+        return jsonify({"success": False, "error": f"Model unavailable: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+    if response is None:
+        return jsonify({"success": False, "error": "Unknown student; send a PDF to /run first"}), 404
+    return jsonify(response), 200
+
+def deadlines_for(student, args):
+    """
+    The /deadlines response for a student from query ``args`` (from, days,
+    type, module), or None for unknown students. Raises RequestError for
+    invalid arguments.
+    """
+    start = args.get('from') or today()
+    try:
+        datetime.date.fromisoformat(start)
+    except ValueError:
+        raise RequestError("Invalid from date, expected YYYY-MM-DD")
+    try:
+        days = int(args.get('days') or 7)
+    except ValueError:
+        days = -1
+    if not 1 <= days <= DEADLINES_MAX_DAYS:
+        raise RequestError(f"days must be between 1 and {DEADLINES_MAX_DAYS}")
+    types = [t.strip() for t in (args.get('type') or '').split(',') if t.strip()]
+    if any(t not in ITEM_TYPES for t in types):
+        raise RequestError(f"Invalid type, expected any of {', '.join(ITEM_TYPES)}")
+
+    with trace_request('deadlines') as trace:
+        items = planning_store.upcoming(student, start, days, types=types, module=args.get('module'))
+        if not items and not planning_store.has_student(student):
+            return None
+        return {"success": True, "from": start, "days": days, "items": items, "timings": trace.summary()}
+
+@app.route('/deadlines/<student>', methods=['GET'])
+def get_deadlines(student):
+    """
+    A student's exams, assignments and tasks due in the next ``days`` days
+    (default 7) from ``from`` (YYYY-MM-DD, default today), soonest first,
+    read from the planning store filled by /run and /run/delta without
+    touching the crew. ``type`` (comma separated) and ``module`` filter them.
+    """
+    try:
+        response = deadlines_for(student, request.args)
+    except RequestError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+    if response is None:
+        return jsonify({"success": False, "error": "Unknown student; send a PDF to /run first"}), 404
+    return jsonify(response), 200
+
+@app.route('/run/stream', methods=['POST'])
+def run_crew_stream():
+    """
+    Same input as /run, but streams server-sent events: one ``stage`` event
+    per finished task (extraction, priority decision, recommendation) with its
+    partial output and duration, then a final ``result`` event.
+    """
+    try:
+        pdf_bytes, other_data = parse_run_request()
+        events = queue.Queue()
+        
+        def run():
+            try:
+                events.put(('result', run_advisor(pdf_bytes, other_data, on_stage=lambda e: events.put(('stage', e)))))
+            except Exception as e:
+                events.put(('error', {"success": False, "error": f"Server error: {str(e)}"}))
+        
+        # Run on the job pool so streaming requests share its backpressure
+        job_manager.submit(run)
+        
+    except RequestError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 429, {'Retry-After': '5'}
+    
+    def generate():
+        while True:
+            try:
+                event, data = events.get(timeout=15)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            if event != 'stage':
+                break
+    
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+def parse_batch_request():
+    """
+    Validate a /run/batch request and return its entries.
+
+    The ``entries`` field (form field in a multipart request, or the JSON body)
+    is a list of ``{"id", "other_data", "file" | "planning_data"}`` objects,
+    where ``file`` names the multipart field holding that entry's PDF.
+    """
+    if request.is_json:
+        payload = request.get_json(silent=True) or {}
+        raw_entries = payload.get('entries')
+    else:
         try:
-            other_data = json.loads(other_data_str)
+            raw_entries = json.loads(request.form.get('entries', '[]'))
         except json.JSONDecodeError:
-            return jsonify({"success": False, "error": "Invalid JSON in other_data field"}), 400
+            raise RequestError("Invalid JSON in entries field")
+    
+    if not isinstance(raw_entries, list) or not raw_entries:
+        raise RequestError("No batch entries provided")
+    if len(raw_entries) > BATCH_MAX_ENTRIES:
+        raise RequestError(f"Too many entries (maximum {BATCH_MAX_ENTRIES})", 413)
+    
+    pdfs = {}
+    entries = []
+    # Results are matched back to their entries by id
+    seen_ids = set()
+    for index, raw in enumerate(raw_entries):
+        if not isinstance(raw, dict):
+            raise RequestError(f"Entry {index} must be an object")
+        entry_id = raw.get('id', index)
+        if not isinstance(entry_id, (str, int, float)) or isinstance(entry_id, bool):
+            raise RequestError(f"Entry {index}: id must be a string or a number")
+        if entry_id in seen_ids:
+            raise RequestError(f"Entry {index}: duplicate id {entry_id!r}")
+        seen_ids.add(entry_id)
+        other_data = raw.get('other_data') or {}
+        entry = {'id': entry_id, 'inputs': request_inputs(other_data)}
         
-        # Create a temporary file to save the uploaded PDF
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            file.save(tmp_file.name)
-            tmp_filename = tmp_file.name
+        if raw.get('planning_data') is not None:
+            entry['planning_data'] = raw['planning_data']
+        elif raw.get('file'):
+            field = raw['file']
+            file = request.files.get(field)
+            if file is None or not allowed_file(file.filename):
+                raise RequestError(f"Entry {entry_id}: missing or invalid PDF file '{field}'")
+            # Several entries may point at the same upload field
+            if field not in pdfs:
+                pdfs[field] = file.read()
+            entry['pdf_bytes'] = pdfs[field]
+        else:
+            raise RequestError(f"Entry {entry_id}: provide either a file or planning_data")
+        entries.append(entry)
+    return entries
+
+@app.route('/run/batch', methods=['POST'])
+def run_crew_batch():
+    """
+    Prioritize many students in one call. Identical PDFs are extracted once,
+    per-student stages run concurrently, and one JSON result per entry is
+    streamed back as newline-delimited JSON in completion order.
+    """
+    try:
+        entries = parse_batch_request()
+    except RequestError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    
+    priority_mode = request.args.get('priority_mode')
+    concurrency = min(request.args.get('concurrency', BATCH_CONCURRENCY, type=int), BATCH_CONCURRENCY)
+    
+    def generate():
+        inputs_by_id = {entry['id']: entry['inputs'] for entry in entries}
+        for entry_id, outcome in pipeline.run_batch(entries, concurrency=concurrency, priority_mode=priority_mode):
+            if isinstance(outcome, Exception):
+                line = {"id": entry_id, "success": False, "error": f"Server error: {str(outcome)}"}
+            else:
+                line = {"id": entry_id, **outcome_response(outcome, inputs_by_id[entry_id])}
+            yield json.dumps(line) + "\n"
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/plan', methods=['POST'])
+def study_plan():
+    """
+    Multi-day study plans built locally from planning data, for one student
+    or many. The JSON body is one entry, or ``{"entries": [...]}``; each
+    entry is ``{"id", "other_data", "document_id" | "planning_data"}``, where
+    ``document_id`` reuses the planning data and tasks of the student's
+    earlier /run. ``days`` (default 7) and ``phrase`` (have the advisor's
+    model write each summary, default false) apply to every entry.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"success": False, "error": "Expected a JSON body"}), 400
+    raw_entries = payload['entries'] if 'entries' in payload else [payload]
+    if not isinstance(raw_entries, list) or not raw_entries:
+        return jsonify({"success": False, "error": "No entries provided"}), 400
+    if len(raw_entries) > BATCH_MAX_ENTRIES:
+        return jsonify({"success": False, "error": f"Too many entries (maximum {BATCH_MAX_ENTRIES})"}), 413
+    days = payload.get('days', 7)
+    if not isinstance(days, int) or not 1 <= days <= PLAN_MAX_DAYS:
+        return jsonify({"success": False, "error": f"days must be between 1 and {PLAN_MAX_DAYS}"}), 400
+    phrase = bool(payload.get('phrase', False))
+    if phrase and len(raw_entries) > PLAN_MAX_PHRASED:
+        return jsonify({"success": False,
+                        "error": f"Too many entries to phrase (maximum {PLAN_MAX_PHRASED})"}), 413
+
+    try:
+        with trace_request('plan') as trace:
+            plans = []
+            for index, raw in enumerate(raw_entries):
+                entry_id = raw.get('id', index) if isinstance(raw, dict) else index
+                if not isinstance(raw, dict):
+                    plans.append({"id": entry_id, "success": False, "error": "Entry must be an object"})
+                    continue
+                other_data = raw.get('other_data') or {}
+                tasks = None
+                planning_data = raw.get('planning_data')
+                if planning_data is None and raw.get('document_id'):
+                    student = student_id(other_data)
+                    if student is None:
+                        plans.append({"id": entry_id, "success": False,
+                                      "error": "No student_id provided in other_data"})
+                        continue
+                    session = planning_sessions.load(student, raw['document_id'])
+                    if session is not None:
+                        planning_data, tasks = session['planning_data'], session['tasks']
+                if planning_data is None:
+                    plans.append({"id": entry_id, "success": False,
+                                  "error": "Unknown student or document; send planning_data or the PDF to /run first"})
+                    continue
+                plan, summary = pipeline.plan(planning_data, request_inputs(other_data), days=days,
+                                              tasks=tasks, phrase=phrase)
+                plans.append({"id": entry_id, "success": True, "summary": summary, "plan": plan})
+            response = {"success": True, "plans": plans, "timings": trace.summary()}
+        return jsonify(response), 200
+
+    except CrewPoolExhausted as e:
+        return jsonify({"success": False, "error": f"Server busy: {str(e)}"}), 503
+    except Exception as e:
+        return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a /run request and return its job id immediately"""
+    try:
+        pdf_bytes, other_data = parse_run_request()
+        job = job_manager.submit(run_advisor, pdf_bytes, other_data)
+        return jsonify({"success": True, **job.to_dict()}), 202
         
-        try:
-            # Prepare inputs for the crew
-            inputs = {
-                'student_name': other_data.get('student_name', 'Student'),
-                'current_date': other_data.get('current_date', ''),
-                'task_deadline': other_data.get('task_deadline', ''),
-                'module_coefficient': other_data.get('module_coefficient', 1),
-                'confidence_level': other_data.get('confidence_level', 'medium'),
-                'new_task_description': other_data.get('new_task_description', ''),
-                'pdf_file_path': tmp_filename
-            }
-            
-            # Run the crew
-            crew = DailyStudentPriorityAdvisorCrew()
-            result = crew.crew().kickoff(inputs=inputs)
-            
-            # Return the result
-            response = {
-                "success": True,
-                "recommendation": str(result),
-                "inputs_used": inputs
-            }
-            return jsonify(response), 200
-            
-        finally:
-            # Clean up the temporary file
-            os.unlink(tmp_filename)
-            
+    except RequestError as e:
+        return jsonify({"success": False, "error": str(e)}), e.status
+    except JobQueueFull as e:
+        return jsonify({"success": False, "error": str(e)}), 429, {'Retry-After': '5'}
     except Exception as e:
         return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job. Pass ?wait=<seconds> to long-poll until it finishes."""
+    wait = min(request.args.get('wait', 0, type=float), JOB_MAX_WAIT)
+    # The job may have been submitted to another worker process
+    data = job_manager.wait_for(job_id, wait) if wait > 0 else job_manager.lookup(job_id)
+    if data is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    return jsonify({"success": True, **data}), 200
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events stream that emits the job result once it is ready"""
+    data = job_manager.lookup(job_id)
+    if data is None:
+        return jsonify({"success": False, "error": "Job not found"}), 404
+    
+    def generate():
+        nonlocal data
+        yield f"event: status\ndata: {json.dumps({'job_id': job_id, 'status': data['status']})}\n\n"
+        # Keep the connection alive with comments until the job finishes
+        while data['status'] not in FINISHED:
+            latest = job_manager.wait_for(job_id, 15)
+            if latest is None:
+                break
+            data = latest
+            if data['status'] not in FINISHED:
+                yield ": keep-alive\n\n"
+        yield f"event: result\ndata: {json.dumps(data)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a job that is still waiting in the queue"""
+    job = job_manager.get(job_id)
+    if job is None:
+        data = job_manager.lookup(job_id)
+        if data is None:
+            return jsonify({"success": False, "error": "Job not found"}), 404
+        if data['status'] in FINISHED:
+            return jsonify({"success": False, "error": f"Job is {data['status']} and can no longer be cancelled"}), 409
+        return jsonify({"success": False, "error": f"Job is {data['status']} on another worker and cannot be cancelled here"}), 409
+    if not job_manager.cancel(job_id):
+        return jsonify({"success": False, "error": f"Job is {job.status} and can no longer be cancelled"}), 409
+    return jsonify({"success": True, **job.to_dict()}), 200
+
 @app.route('/test', methods=['POST'])
 def test_crew():
     """Test endpoint with sample data"""
     try:
         # Sample inputs for testing
-        inputs = {
-            'student_name': 'Ahmed',
-            'current_date': '2024-12-20',
-            'pdf_content': 'Sample PDF content for testing purposes'
-        }
+        inputs = build_inputs(
+            student_name='Ahmed',
+            current_date='2024-12-20',
+            pdf_content='Sample PDF content for testing purposes'
+        )
         
-        # Run the crew
-        crew = DailyStudentPriorityAdvisorCrew()
-        result = crew.crew().kickoff(inputs=inputs)
-        
-        # Return the result
-        response = {
-            "success": True,
-            "result": str(result),
-            "inputs_used": inputs
-        }
+        with trace_request('test') as trace:
+            # Run the crew on a pre-built crew from the pool
+            result = crew_pool.kickoff(inputs)
+            
+            # Return the result
+            response = {
+                "success": True,
+                "result": result_text(result),
+                "inputs_used": inputs_used(inputs),
+                "timings": trace.summary()
+            }
         return jsonify(response), 200
         
+    except CrewPoolExhausted as e:
+        return jsonify({"success": False, "error": f"Server busy: {str(e)}"}), 503
+    except UpstreamUnavailable as e:
+        return jsonify({"success": False, "error": f"Model unavailable: {str(e)}"}), 503
     except Exception as e:
         return jsonify({"success": False, "error": f"Server error: {str(e)}"}), 500
 
 if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Daily Student Priority Advisor API server")
+    parser.add_argument('--warmup', action='store_true', help="Load CrewAI and build the crew pool before serving")
+    if parser.parse_args().warmup:
+        warmup()
+    start_scheduler()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,20 @@
+"""
+Tests for the token-budgeted handoffs between crew tasks
+"""
+from daily_student_priority_advisor.compaction import MAX_FIELD_CHARS, compact_json, fit_planning_data
+
+
+def test_long_exam_and_assignment_text_is_shortened_before_items_are_dropped():
+    notes = 'Covers chapters one to twelve, with worked examples. ' * 20
+    data = {
+        "exams": [{"name": f"Exam {i}", "date": f"2025-01-{10 + i}", "notes": notes} for i in range(3)],
+        "assignments": [{"name": f"Essay {i}", "deadline": f"2025-01-{20 + i}", "description": notes} for i in range(3)],
+    }
+
+    fitted = fit_planning_data(data, 1400, current_date='2025-01-01')
+
+    assert len(fitted['exams']) == 3
+    assert len(fitted['assignments']) == 3
+    assert all(len(item['notes']) <= MAX_FIELD_CHARS for item in fitted['exams'])
+    assert all(len(item['description']) <= MAX_FIELD_CHARS for item in fitted['assignments'])
+    assert len(compact_json(fitted)) <= 1400
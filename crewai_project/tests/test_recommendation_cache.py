@@ -0,0 +1,55 @@
+"""
+Tests for the recommendation cache key
+"""
+from daily_student_priority_advisor.recommendation_cache import analysis_features, fill_template, to_template
+
+PLANNING_DATA = {
+    "exams": [{"name": "Algebra midterm", "date": "2024-12-21", "module": "MATH101", "weight": 40}],
+    "assignments": [{"name": "Essay draft", "deadline": "2024-12-27", "module": "ENG101"}],
+}
+LLM_ANALYSIS = {
+    "topPriorityTask": "Algebra midterm",
+    "urgencyScore": 0.82,
+    "confidenceLevel": 0.8,
+    "moduleImportance": "high",
+}
+
+
+def test_llm_analysis_takes_deadline_and_module_from_planning_data():
+    features = analysis_features(LLM_ANALYSIS, {"current_date": "2024-12-20"}, PLANNING_DATA)
+
+    assert features['days_left'] == 1
+    assert features['module'] == 'math101'
+
+
+def test_same_task_on_a_later_day_has_another_key():
+    today = analysis_features(LLM_ANALYSIS, {"current_date": "2024-12-20"}, PLANNING_DATA)
+    earlier = analysis_features(LLM_ANALYSIS, {"current_date": "2024-12-18"}, PLANNING_DATA)
+
+    assert today['days_left'] != earlier['days_left']
+
+
+def test_paraphrased_top_task_matches_the_item_it_names():
+    analysis = dict(LLM_ANALYSIS, topPriorityTask="Revise for the Algebra midterm")
+
+    features = analysis_features(analysis, {"current_date": "2024-12-20"}, PLANNING_DATA)
+
+    assert features['days_left'] == 1
+
+
+def test_top_task_missing_from_planning_data_is_not_cached():
+    analysis = dict(LLM_ANALYSIS, topPriorityTask="Catch up on reading")
+
+    assert analysis_features(analysis, {"current_date": "2024-12-20"}, PLANNING_DATA) is None
+
+
+def test_weekdays_are_templated():
+    inputs = {"current_date": "2024-12-20"}
+    features = analysis_features(LLM_ANALYSIS, inputs, PLANNING_DATA)
+    template = to_template("Algebra midterm is on Saturday, so start today (Friday).", features, inputs)
+
+    later_inputs = {"current_date": "2024-12-26"}
+    later = analysis_features(LLM_ANALYSIS, later_inputs, dict(PLANNING_DATA, exams=[
+        {"name": "Algebra midterm", "date": "2024-12-27", "module": "MATH101"},
+    ]))
+    assert fill_template(template, later, later_inputs) == "Algebra midterm is on Friday, so start today (Thursday)."
@@ -0,0 +1,52 @@
+"""
+Tests for parsing recurring classes and commitments
+"""
+import datetime
+
+from daily_student_priority_advisor.recurrence import Schedule, parse_rule
+
+
+def test_plural_weekday_names():
+    rule = parse_rule('Lab', 'class', days='Saturdays', time='9am-1pm')
+
+    assert rule is not None
+    assert rule.weekdays == {5}
+    assert (rule.start, rule.end) == (9 * 60, 13 * 60)
+
+
+def test_several_plural_weekdays():
+    rule = parse_rule('Job', 'commitment', days='Tuesdays and Thursdays', time='18:00 - 22:00')
+
+    assert rule.weekdays == {1, 3}
+
+
+def test_hour_h_minute_times():
+    rule = parse_rule('Lecture', 'class', days='Mon, Wed', time='14h00 - 15h30')
+
+    assert (rule.start, rule.end) == (14 * 60, 15 * 60 + 30)
+
+
+def test_hours_without_minutes_are_a_duration_not_a_time():
+    assert parse_rule('Revision', 'commitment', days='Fri', time='3h') is None
+
+
+def test_weekday_ranges():
+    assert parse_rule('Job', 'commitment', days='Mon-Fri', time='9am').weekdays == {0, 1, 2, 3, 4}
+    assert parse_rule('Job', 'commitment', days='Monday to Wednesday', time='9am').weekdays == {0, 1, 2}
+    assert parse_rule('Job', 'commitment', days='Fri - Sun', time='9am').weekdays == {4, 5, 6}
+
+
+def test_only_day_names_are_read_as_plurals():
+    rule = parse_rule('Lab', 'class', days='Mon, thus also Sundays', time='9am')
+
+    assert rule.weekdays == {0, 6}
+
+
+def test_plural_day_class_counts_toward_schedule_load():
+    planning_data = {"classes": [{"name": "Lab", "days": "Saturdays", "time": "9am-1pm"}]}
+    saturday = datetime.date(2025, 3, 8)
+
+    schedule = Schedule.from_planning_data(planning_data, anchor=saturday)
+
+    assert schedule.busy_minutes(saturday) == 4 * 60
+    assert schedule.busy_minutes(saturday + datetime.timedelta(days=1)) == 0
@@ -0,0 +1,98 @@
+"""
+Tests for the LLM circuit breaker and retry policy
+"""
+import threading
+import time
+
+import pytest
+
+from daily_student_priority_advisor.resilience import LLMResilience, LLMSaturated, UpstreamUnavailable
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def failing(status_code):
+    def call():
+        raise ProviderError(status_code)
+    return call
+
+
+def resilience(**settings):
+    return LLMResilience(default=dict({
+        'max_retries': 0,
+        'timeout_seconds': 0,
+        'circuit_failures': 2,
+        'circuit_reset_seconds': 0.05,
+    }, **settings))
+
+
+def test_client_errors_do_not_open_the_circuit():
+    layer = resilience()
+    for _ in range(5):
+        with pytest.raises(ProviderError):
+            layer.call('agent', 'model', failing(400))
+
+    assert not layer.degraded('model')
+    assert layer.call('agent', 'model', lambda: 'ok') == 'ok'
+
+
+def test_unavailable_upstream_opens_the_circuit():
+    layer = resilience()
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            layer.call('agent', 'model', failing(503))
+
+    assert layer.degraded('model')
+    with pytest.raises(UpstreamUnavailable, match='circuit open'):
+        layer.call('agent', 'model', lambda: 'ok')
+
+
+def test_trial_refused_by_the_rate_limit_does_not_keep_the_circuit_open():
+    layer = resilience(requests_per_minute=60, burst=2, max_rate_wait_seconds=0.01)
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            layer.call('agent', 'model', failing(503))
+    time.sleep(0.06)
+
+    # The half-open trial cannot get a rate token in time
+    with pytest.raises(UpstreamUnavailable, match='Rate limit'):
+        layer.call('agent', 'model', lambda: 'ok')
+
+    layer._bucket('model', 'agent', layer.settings('agent'))._tokens = 1.0
+    assert layer.call('agent', 'model', lambda: 'ok') == 'ok'
+    assert not layer.degraded('model')
+
+
+def test_time_queued_for_a_call_thread_does_not_count_toward_the_timeout():
+    layer = resilience(timeout_seconds=0.2, max_rate_wait_seconds=5, burst=5)
+    layer.size_for(0)  # one call thread, no room for a second call
+    release = threading.Event()
+    first = threading.Thread(target=layer.call, args=('agent', 'model', lambda: release.wait(5)))
+    first.start()
+    time.sleep(0.05)
+
+    timer = threading.Timer(0.3, release.set)
+    timer.start()
+    # Queued behind the first call for longer than its own timeout, then answered at once
+    assert layer.call('agent', 'model', lambda: 'ok') == 'ok'
+    first.join()
+    assert not layer.degraded('model')
+
+
+def test_no_free_call_thread_fails_without_opening_the_circuit():
+    layer = resilience(timeout_seconds=5, max_rate_wait_seconds=0.05, burst=5, circuit_failures=1)
+    layer.size_for(0)
+    release = threading.Event()
+    first = threading.Thread(target=layer.call, args=('agent', 'model', lambda: release.wait(5)))
+    first.start()
+    time.sleep(0.05)
+
+    with pytest.raises(LLMSaturated):
+        layer.call('agent', 'model', lambda: 'ok')
+    release.set()
+    first.join()
+    assert not layer.degraded('model')
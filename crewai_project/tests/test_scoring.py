@@ -0,0 +1,64 @@
+"""
+Tests for the local priority scorer
+"""
+from daily_student_priority_advisor.scoring import score_priorities
+
+PLANNING_DATA = {
+    "exams": [
+        {"name": "Algebra midterm", "date": "2024-10-15", "module": "MATH101", "weight": 40},
+        {"name": "Physics quiz", "date": "2024-12-23", "module": "PHYS101", "weight": 10},
+    ],
+    "assignments": [
+        {"name": "Essay draft", "deadline": "2024-12-27", "module": "ENG101", "weight": 15},
+    ],
+    "modules": [
+        {"code": "MATH101", "importance": "high", "credits": 6},
+        {"code": "PHYS101", "importance": "medium", "credits": 4},
+        {"code": "ENG101", "importance": "low", "credits": 3},
+    ],
+}
+
+
+def test_past_exam_is_not_the_top_priority():
+    analysis = score_priorities(PLANNING_DATA, current_date='2024-12-20')
+
+    assert analysis['topPriorityTask'] == 'Physics quiz'
+    assert 'overdue' not in analysis['reasoning']['deadlineProximity']
+    past = analysis['ranking'][-1]
+    assert past['name'] == 'Algebra midterm'
+    assert past['urgencyScore'] == 0.0
+    assert past['factors']['deadline'] == 0.0
+
+
+def test_past_exam_is_not_counted_in_the_week():
+    analysis = score_priorities(PLANNING_DATA, current_date='2024-12-20')
+
+    assert analysis['reasoning']['workloadBalance'].startswith('2 deadlines in the next 7 days')
+
+
+def test_only_past_items_leave_nothing_to_prioritize():
+    planning_data = {"exams": [{"name": "Algebra midterm", "date": "2024-10-15", "weight": 40}]}
+
+    analysis = score_priorities(planning_data, current_date='2024-12-20')
+
+    assert analysis['topPriorityTask'] is None
+    assert analysis['needsReview'] is True
+    assert [item['name'] for item in analysis['ranking']] == ['Algebra midterm']
+
+
+def test_item_due_today_scores_full_deadline_pressure():
+    planning_data = {"assignments": [{"name": "Lab report", "deadline": "2024-12-20"}]}
+
+    analysis = score_priorities(planning_data, current_date='2024-12-20')
+
+    assert analysis['topPriorityTask'] == 'Lab report'
+    assert analysis['ranking'][0]['factors']['deadline'] == 1.0
+    assert analysis['reasoning']['deadlineProximity'] == 'Assignment is due today'
+
+
+def test_zero_tie_margin_gives_full_confidence():
+    analysis = score_priorities(PLANNING_DATA, current_date='2024-12-20', tie_margin=0)
+
+    assert analysis['topPriorityTask'] == 'Physics quiz'
+    assert analysis['confidenceLevel'] == 0.7
+    assert analysis['needsReview'] is False
@@ -0,0 +1,28 @@
+"""
+Tests for the server's startup budget (benchmarks/startup_budget.py)
+"""
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('flask')
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import startup_budget  # noqa: E402
+
+
+def test_server_import_stays_within_the_startup_budget():
+    defaults = startup_budget.parse_args([])
+    health = startup_budget.fastest(startup_budget.probe_health, defaults.runs, 'health_seconds',
+                                    startup_budget.child_env())
+
+    assert health['health_status'] == 200
+    assert health['health_seconds'] <= defaults.max_import_seconds
+    assert health['rss_peak_mb'] <= defaults.max_rss_mb
+
+
+def test_server_import_does_not_load_crewai_pypdf_or_litellm():
+    health = startup_budget.probe_health(startup_budget.child_env())
+
+    assert not {'crewai', 'pypdf', 'litellm'} & set(health['heavy_modules'])